@@ -0,0 +1,172 @@
+"""
+Admission control for upstream LLM streams.
+Each model gets a concurrency limit and a bounded wait queue that is served
+round-robin across clients, so one busy client cannot starve the others.
+"""
+
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+import asyncio
+import math
+import time
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full; carries a Retry-After hint in seconds"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionTicket:
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self.granted = asyncio.get_running_loop().create_future()
+
+    @property
+    def is_granted(self) -> bool:
+        return self.granted_at is not None
+
+
+class ModelAdmissionController:
+    """
+    Concurrency limit for one model with a bounded, per-client fair queue.
+
+    Must only be used from the event loop thread. Tickets that cannot start
+    immediately wait in a per-client FIFO; free slots go to clients in
+    round-robin order.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_queue_per_client: int,
+                 default_retry_after: int = 5):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.default_retry_after = default_retry_after
+        self.active = 0
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._queued = 0
+        # Running totals for metrics
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hold_seconds_total = 0.0
+        self.released_total = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def request(self, client_id: str) -> AdmissionTicket:
+        """Get a ticket, granted immediately when a slot is free; raises AdmissionRejected when full"""
+        ticket = AdmissionTicket(client_id)
+        if self.active < self.max_concurrent and self._queued == 0:
+            self._grant(ticket)
+            return ticket
+
+        client_queue = self._queues.get(client_id)
+        if self._queued >= self.max_queue:
+            self.rejected_total += 1
+            raise AdmissionRejected(self.retry_after(), "Chat queue is full")
+        if client_queue is not None and len(client_queue) >= self.max_queue_per_client:
+            self.rejected_total += 1
+            raise AdmissionRejected(self.retry_after(), "Too many queued chat requests for this client")
+
+        if client_queue is None:
+            client_queue = self._queues[client_id] = deque()
+        client_queue.append(ticket)
+        self._queued += 1
+        return ticket
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """1-based position of a waiting ticket in round-robin grant order (0 once granted)"""
+        if ticket.is_granted:
+            return 0
+        own_queue = self._queues.get(ticket.client_id)
+        if own_queue is None or ticket not in own_queue:
+            return 0
+        rank = own_queue.index(ticket)
+        ahead = rank
+        before = True
+        for client_id, client_queue in self._queues.items():
+            if client_id == ticket.client_id:
+                before = False
+                continue
+            # Clients earlier in the rotation are served once more in the ticket's round
+            ahead += min(len(client_queue), rank + 1 if before else rank)
+        return ahead + 1
+
+    async def wait(self, ticket: AdmissionTicket, timeout: float):
+        """Wait up to timeout seconds for the ticket to be granted"""
+        if ticket.is_granted:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.granted), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def release(self, ticket: AdmissionTicket):
+        """Give back a granted slot, or leave the queue; safe to call more than once"""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.is_granted:
+            self.active -= 1
+            self.released_total += 1
+            self.hold_seconds_total += time.monotonic() - ticket.granted_at
+        else:
+            client_queue = self._queues.get(ticket.client_id)
+            if client_queue is not None and ticket in client_queue:
+                client_queue.remove(ticket)
+                self._queued -= 1
+                if not client_queue:
+                    del self._queues[ticket.client_id]
+        self._grant_waiting()
+
+    def retry_after(self) -> int:
+        """Seconds until a queued request would likely start, from the average stream duration"""
+        if not self.released_total:
+            return self.default_retry_after
+        average_hold = self.hold_seconds_total / self.released_total
+        estimate = average_hold * (self._queued + 1) / max(1, self.max_concurrent)
+        return max(1, min(60, math.ceil(estimate)))
+
+    def _grant(self, ticket: AdmissionTicket):
+        ticket.granted_at = time.monotonic()
+        waited = ticket.granted_at - ticket.enqueued_at
+        self.active += 1
+        self.admitted_total += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if not ticket.granted.done():
+            ticket.granted.set_result(True)
+
+    def _grant_waiting(self):
+        while self.active < self.max_concurrent and self._queues:
+            client_id, client_queue = next(iter(self._queues.items()))
+            ticket = client_queue.popleft()
+            self._queued -= 1
+            # Rotate the client to the back so others go next
+            del self._queues[client_id]
+            if client_queue:
+                self._queues[client_id] = client_queue
+            self._grant(ticket)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queued": self._queued,
+            "max_queue": self.max_queue,
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.admitted_total, 3) if self.admitted_total else 0.0,
+        }
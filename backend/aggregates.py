@@ -0,0 +1,122 @@
+"""
+Inventory rollups: units, value and shipment counts per product, location,
+destination or status (or any combination of them).
+
+Each rollup is one vectorized group-by over the cached inventory snapshot,
+memoized per snapshot version, grouping and metrics, so the aggregate
+endpoint, dashboards and chat prompts share it instead of each iterating
+every row.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import threading
+
+import pandas as pd
+
+from columnar import frame_to_records
+
+# Columns a rollup can group by
+GROUP_COLUMNS = (
+    "product_name",
+    "current_location",
+    "destination",
+    "status_category",
+    "status",
+    "transit_status",
+)
+# qty: units, value: qty * unit_price, count: shipments (rows)
+METRICS = ("qty", "value", "count")
+
+# Rollups keyed by (snapshot version, grouping, metrics); frames without a
+# snapshot version are aggregated every time
+ROLLUP_CACHE_MAX_ENTRIES = 64
+_rollup_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_rollup_cache_lock = threading.Lock()
+
+
+def parse_fields(spec: str, allowed: Tuple[str, ...], kind: str) -> Tuple[str, ...]:
+    """Comma-separated names, in the order given; raises ValueError for unknown or missing ones"""
+    fields = tuple(dict.fromkeys(field.strip() for field in spec.split(",") if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"Unknown {kind} {unknown}; expected one or more of {list(allowed)}")
+    return fields
+
+
+def _column(df: pd.DataFrame, name: str, default: Any) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series(default, index=df.index)
+
+
+def delayed_mask(df: pd.DataFrame) -> pd.Series:
+    """Rows whose transit_status mentions a delay (any case); the one definition of delayed"""
+    status = _column(df, "transit_status", None)
+    # Few distinct statuses, so test each once and map back
+    is_delayed = {value: "delay" in str(value).lower() for value in status.dropna().unique()}
+    return status.map(is_delayed).fillna(False).astype(bool)
+
+
+def _compute_rollup(df: pd.DataFrame, group_by: Tuple[str, ...], metrics: Tuple[str, ...]) -> pd.DataFrame:
+    qty = pd.to_numeric(_column(df, "qty", 0), errors="coerce").fillna(0)
+    columns = {name: _column(df, name, None) for name in group_by}
+    columns["_qty"] = qty
+    if "value" in metrics:
+        columns["_value"] = qty * pd.to_numeric(_column(df, "unit_price", 0), errors="coerce").fillna(0)
+    aggregations = {
+        "qty": ("_qty", "sum"),
+        "value": ("_value", "sum"),
+        "count": ("_qty", "size"),
+    }
+    # Groups in order of first appearance, then by the leading metric (stable for ties)
+    result = (
+        pd.DataFrame(columns, index=df.index)
+        .groupby(list(group_by), sort=False, observed=True, dropna=False)
+        .agg(**{metric: aggregations[metric] for metric in metrics})
+    )
+    return result.sort_values(metrics[0], ascending=False, kind="stable")
+
+
+def rollup(df: pd.DataFrame, group_by: Tuple[str, ...], metrics: Tuple[str, ...] = METRICS) -> pd.DataFrame:
+    """
+    Metrics per group, indexed by the group columns and sorted by the first metric, descending (do not mutate).
+
+    Rows with a missing group value form their own group.
+    """
+    version = df.attrs.get("snapshot_version")
+    if version is None:
+        return _compute_rollup(df, group_by, metrics)
+
+    key = (version, group_by, metrics)
+    with _rollup_cache_lock:
+        result = _rollup_cache.get(key)
+        if result is not None:
+            _rollup_cache.move_to_end(key)
+            return result
+    result = _compute_rollup(df, group_by, metrics)
+    with _rollup_cache_lock:
+        _rollup_cache[key] = result
+        _rollup_cache.move_to_end(key)
+        while len(_rollup_cache) > ROLLUP_CACHE_MAX_ENTRIES:
+            _rollup_cache.popitem(last=False)
+    return result
+
+
+def rollup_response(df: pd.DataFrame, group_by: Tuple[str, ...], metrics: Tuple[str, ...],
+                    limit: Optional[int] = None) -> Dict[str, Any]:
+    """A rollup as JSON-ready groups plus totals over the whole snapshot"""
+    result = rollup(df, group_by, metrics)
+    groups = result.head(limit) if limit else result
+    totals = {}
+    for metric in metrics:
+        total = result[metric].sum()
+        totals[metric] = int(total) if metric != "value" else round(float(total), 2)
+    return {
+        "group_by": list(group_by),
+        "metrics": list(metrics),
+        "snapshot_version": df.attrs.get("snapshot_version"),
+        "total_groups": len(result),
+        "totals": totals,
+        "groups": frame_to_records(groups.reset_index(), nullable_columns=group_by),
+    }
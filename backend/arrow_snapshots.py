@@ -0,0 +1,137 @@
+"""
+Arrow IPC snapshot files shared by the workers on a host.
+One refresher writes each new snapshot of a table to <name>.arrow (into a
+temporary file that is then renamed over the old one) and every worker
+memory-maps the current file. Columns are read zero-copy from the page cache,
+so a host holds each snapshot once however many workers serve it.
+
+A worker that still uses an older snapshot keeps its mapping of the replaced
+file until it lets go of the frame; the rename never changes a file in place.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+import fcntl
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# How often a worker waiting on another worker's refresh checks the lock
+LOCK_POLL_SECONDS = 0.05
+
+
+class ArrowSnapshotStore:
+    """
+    Current snapshot per table name, as memory-mapped Arrow IPC files in a directory.
+
+    Frames read from the store carry df.attrs['snapshot_version'] (as written)
+    and must not be mutated: their columns are views of the mapped file.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # name -> (file identity, frame) of the mapping this process holds
+        self._mapped: Dict[str, Tuple[tuple, pd.DataFrame]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        return self.directory / f"{name}.arrow"
+
+    def write(self, name: str, df: pd.DataFrame, version: str) -> Path:
+        """Write a snapshot and atomically make it the current one"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"snapshot_version": version.encode(),
+        })
+        path = self.path(name)
+        tmp_path = self.directory / f".{name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with pa.OSFile(str(tmp_path), "wb") as sink:
+                with ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return path
+
+    def remove(self, name: str) -> bool:
+        """Drop the current snapshot, so the next read refreshes it (existing mappings stay valid)"""
+        try:
+            self.path(name).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def age_seconds(self, name: str) -> Optional[float]:
+        """Seconds since the current snapshot was written, or None if there is none"""
+        try:
+            return max(0.0, time.time() - self.path(name).stat().st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def read(self, name: str) -> Optional[pd.DataFrame]:
+        """Map the current snapshot (reusing this process's mapping while the file is unchanged)"""
+        path = self.path(name)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            mapped = self._mapped.get(name)
+        if mapped is not None and mapped[0] == identity:
+            return mapped[1]
+
+        try:
+            source = pa.memory_map(str(path), "r")
+        except FileNotFoundError:
+            # Replaced between stat and open; the next read maps the new file
+            return mapped[1] if mapped is not None else None
+        table = ipc.open_file(source).read_all()
+        metadata = table.schema.metadata or {}
+        # One block per column: consolidating same-typed columns into 2-D
+        # blocks would copy them out of the mapping into this worker
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        df.attrs["snapshot_version"] = metadata.get(b"snapshot_version", b"").decode() or None
+        with self._lock:
+            self._mapped[name] = (identity, df)
+        return df
+
+    def mapped_frames(self) -> Dict[str, pd.DataFrame]:
+        """Frames this process currently maps, by snapshot name"""
+        with self._lock:
+            return {name: df for name, (_, df) in self._mapped.items()}
+
+    @contextmanager
+    def refresh_lock(self, name: str, timeout: float) -> Iterator[bool]:
+        """
+        Hold the host-wide refresh lock for a snapshot (an flock on <name>.lock).
+
+        Yields False if another process still held it after timeout seconds.
+        """
+        with open(self.directory / f"{name}.lock", "a") as lock_file:
+            deadline = time.monotonic() + timeout
+            acquired = False
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(LOCK_POLL_SECONDS)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
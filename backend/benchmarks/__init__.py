@@ -0,0 +1,5 @@
+"""
+Benchmark suite for the backend.
+Micro-benchmarks and an HTTP load mix run against the local warehouse
+stand-in (local_warehouse.py) and a mock LLM/OSRM upstream. See README.md.
+"""
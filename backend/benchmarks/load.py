@@ -0,0 +1,328 @@
+"""
+HTTP load scenario.
+Starts the mock upstream and the API (uvicorn, DATA_BACKEND=local) as
+subprocesses, then drives a weighted mix of dashboard polling, batch lookups,
+route requests and SSE chat from concurrent clients.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+import local_warehouse
+
+# How often the staleness probe reads /api/inventory while the simulator writes
+STALENESS_PROBE_SECONDS = 2.0
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Scenario -> share of client iterations
+DEFAULT_MIX = {
+    "dashboard_poll": 0.5,
+    "batch_lookup": 0.25,
+    "route": 0.15,
+    "chat_sse": 0.10,
+}
+DASHBOARD_POLL_PATHS = [
+    "/api/inventory/summary",
+    "/api/dashboard/executive",
+    "/api/inventory",
+    "/api/batches",
+]
+CHAT_QUESTIONS = [
+    "Which shipments are delayed?",
+    "What is the total inventory value?",
+    "Which product has the most units in transit?",
+    "Summarize the status of shipments at the docks",
+    "How many batches are at distribution centers?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(module_app: str, port: int, env: Dict[str, str], log_path: Path):
+    """Run a uvicorn app in a subprocess for the duration of the block"""
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", module_app, "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            yield process
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def wait_until_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    values = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+class ScenarioStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.first_event: List[float] = []
+        self.status_counts: Dict[str, int] = {}
+        self.errors = 0
+
+    def record(self, status: str, elapsed: float, first_event: Optional[float] = None):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if status.startswith("2"):
+            self.latencies.append(elapsed)
+            if first_event is not None:
+                self.first_event.append(first_event)
+        else:
+            self.errors += 1
+
+    def report(self, duration: float) -> Dict:
+        total = sum(self.status_counts.values())
+        result = {
+            "requests": total,
+            "throughput_rps": round(total / duration, 2),
+            "errors": self.errors,
+            "status_counts": self.status_counts,
+            **percentiles(self.latencies),
+        }
+        if self.first_event:
+            result["first_token"] = percentiles(self.first_event)
+        return result
+
+
+async def probe_staleness(base_url: str, database_path: Path, deadline: float) -> List[float]:
+    """
+    Sample how far the API's data lags behind the store.
+
+    Compares the newest last_updated_cst the API serves with the newest one
+    in the store itself, which the simulator keeps moving forward.
+    """
+    lags = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        while time.perf_counter() < deadline:
+            with sqlite3.connect(database_path) as connection:
+                stored = connection.execute("SELECT MAX(last_updated_cst) FROM inventory_realtime_v1").fetchone()[0]
+            response = await client.get("/api/inventory")
+            if response.status_code == 200 and stored:
+                served = max((r.get("last_updated_cst") or "" for r in response.json()), default="")
+                if served:
+                    lag = (datetime.strptime(stored, local_warehouse.TIMESTAMP_FORMAT)
+                           - datetime.strptime(served, local_warehouse.TIMESTAMP_FORMAT))
+                    lags.append(max(0.0, lag.total_seconds()))
+            await asyncio.sleep(STALENESS_PROBE_SECONDS)
+    return lags
+
+
+async def run_scenarios(base_url: str, batch_ids: List[str], duration: float, concurrency: int,
+                        mix: Dict[str, float], seed: int = 0, staleness_store: Optional[Path] = None) -> Dict:
+    rng = random.Random(seed)
+    stats = {name: ScenarioStats() for name in mix}
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    locations = list(local_warehouse.KNOWN_LOCATIONS.values())
+    # A fixed set of legs, so routes behave like the app (repeat lookups of known legs)
+    legs = [(locations[i], locations[(i * 7 + 3) % len(locations)]) for i in range(len(locations))]
+
+    async def timed_get(client, name, path):
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            stats[name].record(str(response.status_code), time.perf_counter() - start)
+        except httpx.HTTPError as e:
+            stats[name].record(type(e).__name__, time.perf_counter() - start)
+
+    async def chat(client, client_id):
+        question = f"{rng.choice(CHAT_QUESTIONS)} (#{rng.randint(1, 1000)})"
+        start = time.perf_counter()
+        first_event = None
+        status = "error"
+        try:
+            async with client.stream(
+                "POST", "/api/chat/realtime-snapshot/stream",
+                json={"messages": [{"role": "user", "content": question}]},
+                headers={"X-Client-Id": client_id}
+            ) as response:
+                status = str(response.status_code)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = json.loads(line[6:])
+                    if "content" in data and first_event is None:
+                        first_event = time.perf_counter() - start
+                    if data.get("done") or data.get("error"):
+                        if data.get("error"):
+                            status = "stream_error"
+                        break
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        stats["chat_sse"].record(status, time.perf_counter() - start, first_event)
+
+    async def worker(worker_id: int, deadline: float):
+        async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                if name == "dashboard_poll":
+                    await timed_get(client, name, rng.choice(DASHBOARD_POLL_PATHS))
+                elif name == "batch_lookup":
+                    await timed_get(client, name, f"/api/batch/{rng.choice(batch_ids)}")
+                elif name == "route":
+                    (lat1, lon1), (lat2, lon2) = rng.choice(legs)
+                    await timed_get(client, name, f"/api/route?lat1={lat1}&lon1={lon1}&lat2={lat2}&lon2={lon2}")
+                elif name == "chat_sse":
+                    await chat(client, f"bench-{worker_id}")
+
+    start = time.perf_counter()
+    tasks = [worker(i, start + duration) for i in range(concurrency)]
+    if staleness_store is not None:
+        tasks.append(probe_staleness(base_url, staleness_store, start + duration))
+    outcomes = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    scenarios = {name: stats[name].report(elapsed) for name in names}
+    all_latencies = [t for s in stats.values() for t in s.latencies]
+    total_requests = sum(s["requests"] for s in scenarios.values())
+    result = {
+        "duration_s": round(elapsed, 2),
+        "concurrency": concurrency,
+        "mix": mix,
+        "overall": {
+            "requests": total_requests,
+            "throughput_rps": round(total_requests / elapsed, 2),
+            "errors": sum(s["errors"] for s in scenarios.values()),
+            **percentiles(all_latencies),
+        },
+        "scenarios": scenarios,
+    }
+    if staleness_store is not None:
+        lags = outcomes[-1]
+        result["staleness"] = {
+            "samples": len(lags),
+            "p50_s": round(float(np.percentile(lags, 50)), 2) if lags else None,
+            "p95_s": round(float(np.percentile(lags, 95)), 2) if lags else None,
+            "max_s": round(max(lags), 2) if lags else None,
+        }
+    return result
+
+
+@contextlib.contextmanager
+def simulate_writes(database_path: Path, rate: float, stats_path: Path, log_path: Path):
+    """Run event_simulator.py against the store for the duration of the block"""
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "event_simulator.py", "--path", str(database_path), "--rate", str(rate),
+             "--seed", "0", "--stats-output", str(stats_path)],
+            cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            yield process
+        finally:
+            # SIGINT lets the simulator write its final stats
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def run_load_benchmark(database_path: Path, duration: float = 30.0, concurrency: int = 16,
+                       mix: Optional[Dict[str, float]] = None, log_dir: Optional[Path] = None,
+                       extra_env: Optional[Dict[str, str]] = None, write_rate: float = 0.0) -> Dict:
+    """
+    Run the HTTP load mix against a freshly started API backed by database_path.
+
+    With write_rate > 0, event_simulator.py mutates a copy of the store at
+    that many updates per second during the run, and the result includes
+    the simulator's write stats and the staleness of the data served.
+    Server logs go to log_dir (default: next to the database).
+    """
+    log_dir = Path(log_dir or database_path.parent)
+    if write_rate > 0:
+        live_path = database_path.with_name(database_path.stem + "_live.db")
+        shutil.copyfile(database_path, live_path)
+        database_path = live_path
+    upstream_port = free_port()
+    api_port = free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    api_url = f"http://127.0.0.1:{api_port}"
+    api_env = {
+        "DATA_BACKEND": "local",
+        "LOCAL_WAREHOUSE_PATH": str(database_path),
+        "DATABRICKS_TOKEN": "benchmark",
+        "DATABRICKS_CHAT_ENDPOINT": upstream_url,
+        "DATABRICKS_CHAT_MODEL": "mock-model",
+        "DATABRICKS_GENERAL_MODEL": "mock-model",
+        "OSRM_BASE_URL": upstream_url,
+        **(extra_env or {}),
+    }
+
+    stats_path = log_dir / "simulator_stats.json"
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(serve("benchmarks.mock_upstream:app", upstream_port, {}, log_dir / "mock_upstream.log"))
+        stack.enter_context(serve("main:app", api_port, api_env, log_dir / "api.log"))
+        wait_until_ready(f"{upstream_url}/docs")
+        # Readiness includes the startup warm-up (STARTUP_WARMUP)
+        wait_until_ready(f"{api_url}/api/ready")
+        if write_rate > 0:
+            # Writes start before the cold fill, so every snapshot the API
+            # serves includes rows stamped around the time it was read
+            stack.enter_context(simulate_writes(database_path, write_rate, stats_path, log_dir / "simulator.log"))
+            time.sleep(1.0)
+
+        # Cold fill of the caches is reported separately from steady state
+        cold = {}
+        for path in ["/api/inventory", "/api/batches"]:
+            start = time.perf_counter()
+            response = httpx.get(f"{api_url}{path}", timeout=600)
+            cold[path] = {"status": response.status_code, "ms": round((time.perf_counter() - start) * 1000, 2)}
+        batch_ids = [b["batch_id"] for b in response.json()["batches"]]
+
+        result = asyncio.run(run_scenarios(
+            api_url, batch_ids, duration, concurrency, mix or DEFAULT_MIX,
+            staleness_store=database_path if write_rate > 0 else None
+        ))
+
+    if write_rate > 0:
+        result["simulator"] = json.loads(stats_path.read_text()) if stats_path.exists() else None
+    result["cold_requests"] = cold
+    return result
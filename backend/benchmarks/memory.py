@@ -0,0 +1,97 @@
+"""
+Per-host memory with several uvicorn workers.
+Starts the API with N workers, with and without ARROW_SNAPSHOT_DIR, has every
+worker load the inventory snapshot and sums the memory of the process tree
+from /proc/<pid>/smaps_rollup (Linux only).
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load import BACKEND_DIR, free_port, wait_until_ready
+
+# Summary requests per worker; uvicorn spreads connections over the workers
+REQUESTS_PER_WORKER = 6
+SMAPS_FIELDS = ("Rss", "Pss", "Anonymous")
+
+
+def process_tree(pid: int) -> List[int]:
+    output = subprocess.run(["ps", "-o", "pid=", "--ppid", str(pid)], capture_output=True, text=True).stdout
+    children = [int(child) for child in output.split()]
+    return [pid] + [p for child in children for p in process_tree(child)]
+
+
+def smaps_rollup(pid: int) -> Dict[str, float]:
+    """Rss, Pss and Anonymous memory of a process in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if parts[0].rstrip(":") in SMAPS_FIELDS:
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return values
+
+
+def measure_workers(database_path: Path, workers: int, snapshot_dir: Optional[Path], log_path: Path) -> Dict:
+    """Memory of an API process tree with `workers` workers after each has loaded the snapshot"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {
+        "DATA_BACKEND": "local",
+        "LOCAL_WAREHOUSE_PATH": str(database_path),
+        "STARTUP_WARMUP": "false",
+    }
+    if snapshot_dir is not None:
+        env["ARROW_SNAPSHOT_DIR"] = str(snapshot_dir)
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            wait_until_ready(f"{url}/api/statuses", timeout=120)
+            for _ in range(workers * REQUESTS_PER_WORKER):
+                httpx.get(f"{url}/api/inventory/summary", timeout=600)
+            time.sleep(1.0)
+            pids = process_tree(process.pid)
+            totals = {field: 0.0 for field in SMAPS_FIELDS}
+            for pid in pids:
+                for field, value in smaps_rollup(pid).items():
+                    totals[field] += value
+        finally:
+            # SIGINT shuts the uvicorn supervisor down together with its workers
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return {"processes": len(pids), **{f"{field.lower()}_mb": round(value, 1) for field, value in totals.items()}}
+
+
+def run_memory_benchmark(database_path: Path, worker_counts: List[int] = (1, 2, 4),
+                         log_dir: Optional[Path] = None) -> Dict:
+    """Process tree memory per worker count, with per-worker frames and with shared Arrow snapshots"""
+    log_dir = Path(log_dir or database_path.parent)
+    result = {"per_worker_frames": {}, "arrow_snapshots": {}}
+    for workers in worker_counts:
+        result["per_worker_frames"][str(workers)] = measure_workers(
+            database_path, workers, None, log_dir / "memory_api.log"
+        )
+        snapshot_dir = Path(tempfile.mkdtemp(prefix="arrow_snapshots_"))
+        try:
+            result["arrow_snapshots"][str(workers)] = measure_workers(
+                database_path, workers, snapshot_dir, log_dir / "memory_api.log"
+            )
+        finally:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+    return result
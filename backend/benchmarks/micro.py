@@ -0,0 +1,184 @@
+"""
+Micro-benchmarks for the request hot paths.
+Each benchmark runs in-process against synthetic frames from local_warehouse,
+repeating until a minimum time has passed, and reports per-call latency.
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import itertools
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from fastapi.encoders import jsonable_encoder
+
+from columnar import compact_frame
+import aggregates
+import compression
+import dwell
+import history
+import local_warehouse
+import main
+import system_prompts
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    values = np.array(samples) * 1000
+    return {
+        "runs": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "min_ms": round(float(values.min()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def measure(func: Callable[[], object], setup: Optional[Callable[[], object]] = None,
+            min_seconds: float = 1.0, min_runs: int = 3, max_runs: int = 200) -> Dict[str, float]:
+    """
+    Time func repeatedly; setup (untimed) runs before each call and its result is passed in.
+
+    Stops once min_runs calls and min_seconds of measured time have passed, or at max_runs.
+    """
+    samples = []
+    total = 0.0
+    while len(samples) < max_runs and (len(samples) < min_runs or total < min_seconds):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(argument) if setup is not None else func()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+    return summarize(samples)
+
+
+def prepare_frames(rows: int, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """Build the cached frames the endpoints would read, as the warehouse path does"""
+    inventory, batch_events = local_warehouse.generate_data(rows, seed)
+    snapshot = compact_frame(main.add_inventory_columns(compact_frame(inventory)))
+    snapshot.attrs["snapshot_version"] = main.frame_version(snapshot)
+    batches = inventory.drop_duplicates("batch_id")[["batch_id", "product_name", "transit_status"]].reset_index(drop=True)
+    batches = compact_frame(batches)
+    batches.attrs["snapshot_version"] = main.frame_version(batches)
+    batch_events = compact_frame(batch_events)
+    return {"inventory": inventory, "snapshot": snapshot, "batch_events": batch_events, "batches": batches}
+
+
+def seed_history(directory: Path, days: int = 180, points_per_day: int = 288) -> history.HistoryStore:
+    """A history store with days of raw points (one every 5 minutes by default), rolled up"""
+    rng = np.random.default_rng(0)
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(days, 0, -1):
+        day = end - timedelta(days=offset)
+        points = pd.DataFrame(rng.uniform(0, 100, (points_per_day, len(history.METRICS))), columns=history.METRICS)
+        points.insert(0, "at", pd.date_range(day, periods=points_per_day, freq=f"{86400 // points_per_day}s"))
+        partition = directory / "raw" / f"date={day:%Y-%m-%d}"
+        partition.mkdir(parents=True, exist_ok=True)
+        points.to_parquet(partition / "points.parquet", index=False)
+    # No rollup files yet: they are rebuilt from the raw points
+    return history.HistoryStore(directory, raw_retention_days=0)
+
+
+def run_micro_benchmarks(rows: int, min_seconds: float = 1.0, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """Run all micro-benchmarks at one scale; returns {benchmark name: latency summary}"""
+    frames = prepare_frames(rows, seed)
+    inventory = frames["inventory"]
+    snapshot = frames["snapshot"]
+    batches = frames["batches"]
+    selected_batch_id = batches["batch_id"].iloc[0]
+    selected_events = frames["batch_events"][frames["batch_events"]["batch_id"] == selected_batch_id]
+
+    # Endpoints read these from the cache, as they would between warehouse refreshes
+    main.clear_cache()
+    main.set_cache(main.queries.bind("inventory_snapshot").cache_key, snapshot, ttl_seconds=3600)
+    main.set_cache(main.queries.bind("batches_list").cache_key, batches, ttl_seconds=3600)
+    main.set_cache(main.queries.bind("batch_events", batch_id=selected_batch_id).cache_key,
+                   selected_events.reset_index(drop=True), ttl_seconds=3600)
+    records = main.inventory_records(main.get_inventory_snapshot())
+    encoded = jsonable_encoder(records)
+
+    results = {}
+
+    def bench(name, func, setup=None):
+        results[name] = measure(func, setup, min_seconds=min_seconds)
+
+    # Status categorization: distinct-value mapping vs. the row-wise apply it replaced
+    bench("status_categorization", lambda df: main.add_status_category(df), setup=lambda: inventory.copy())
+    bench("status_categorization_rowwise", lambda: inventory["status"].apply(main.get_status_category))
+    bench("snapshot_version_hash", lambda: main.frame_version(snapshot))
+    bench("compact_inventory", lambda: compact_frame(inventory))
+    # ETA stage of every snapshot refresh: destinations, haversine and ETAs for all in-transit rows
+    bench("eta_recompute", lambda df: main.add_eta_columns(df), setup=lambda: snapshot.copy())
+
+    # Summary aggregation
+    bench("inventory_summary", lambda: main.inventory_summary(main.get_inventory_snapshot()))
+    bench("aggregate_inventory", lambda: system_prompts.aggregate_inventory(snapshot))
+    # /api/inventory/aggregate, unmemoized (a frame without a snapshot version)
+    unversioned = snapshot.copy(deep=False)
+    unversioned.attrs = {}
+    bench("inventory_rollup", lambda: aggregates.rollup_response(
+        unversioned, ("product_name", "current_location"), aggregates.METRICS
+    ))
+
+    # Dwell statistics: the first load of all events, then an update of the latest 100
+    events = frames["batch_events"]
+    bench("dwell_ingest_all", lambda analytics: analytics.ingest(events), setup=lambda: dwell.DwellAnalytics())
+    primed = dwell.DwellAnalytics()
+    primed.ingest(events)
+    latest_events = events.nlargest(100, "record_id")
+    bench("dwell_ingest_update", lambda: primed.ingest(latest_events))
+    bench("dwell_summary", lambda: primed.summary())
+
+    # History: a summary point of the snapshot, its append, and the dashboard's trend reads over 6 months
+    bench("history_summary_point", lambda: history.summary_point(snapshot))
+    with tempfile.TemporaryDirectory() as directory:
+        store = seed_history(Path(directory))
+        point = history.summary_point(snapshot)
+        times = itertools.count()
+        bench("history_append", lambda: store.append(point, datetime.now() + timedelta(minutes=5 * next(times))))
+        months = [key for key, _ in history.last_months(6)]
+        bench("history_monthly_trend", lambda: [
+            store.monthly_values(months, metric) for metric in ("active_units", "delayed_pct", "on_time_pct")
+        ])
+
+    # Serialization: records, JSON-compatible encoding, JSON bytes
+    bench("inventory_to_records", lambda: main.inventory_records(main.get_inventory_snapshot()))
+    bench("inventory_filtered_to_records",
+          lambda: main.inventory_records(main.get_inventory_snapshot(), status="In Transit"))
+    bench("inventory_jsonable_encoder", lambda: jsonable_encoder(records))
+    bench("inventory_json_render", lambda: main.TimedJSONResponse(encoded).body)
+    bench("batches_to_records", lambda: main.batch_list(main.get_batches_frame()))
+    bench("batch_events_to_records",
+          lambda: main.batch_event_records(main.get_batch_events_frame(selected_batch_id)))
+
+    # Response compression per endpoint body: CPU per call and bytes on the wire
+    bodies = {
+        "inventory": main.TimedJSONResponse(encoded).body,
+        "batches": main.TimedJSONResponse(jsonable_encoder(main.batch_list(batches))).body,
+        "batch_events": main.TimedJSONResponse(jsonable_encoder(
+            main.batch_event_records(main.get_batch_events_frame(selected_batch_id))
+        )).body,
+    }
+    for endpoint, body in bodies.items():
+        for encoding, compress in compression.compressors(main.RESPONSE_COMPRESSION_LEVEL).items():
+            name = f"compress_{endpoint}_{encoding}"
+            bench(name, lambda: compress(body))
+            results[name].update(bytes_in=len(body), bytes_out=len(compress(body)))
+
+    # Prompt building, unmemoized (no snapshot version)
+    bench("prompt_realtime", lambda: system_prompts.build_realtime_snapshot_system_prompt(snapshot))
+    bench("prompt_shipment", lambda: system_prompts.build_shipment_tracking_system_prompt(
+        batches, selected_batch_id, selected_events
+    ))
+    bench("prompt_executive", lambda _: system_prompts.build_executive_dashboard_system_prompt(),
+          setup=lambda: system_prompts.clear_prompt_cache())
+    bench("executive_dashboard", main.executive_dashboard)
+
+    main.clear_cache()
+    return results
@@ -0,0 +1,127 @@
+"""
+Mock upstream services for load benchmarks.
+Serves an OpenAI-compatible chat completions / responses API that streams
+canned tokens, and an OSRM-compatible route endpoint.
+
+    uvicorn benchmarks.mock_upstream:app --port 9100
+
+Tune with MOCK_LLM_TTFT_MS, MOCK_LLM_TOKENS, MOCK_LLM_TOKEN_DELAY_MS and
+MOCK_OSRM_LATENCY_MS.
+"""
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import os
+import time
+
+app = FastAPI(title="Mock LLM and OSRM upstream")
+
+LLM_TTFT_SECONDS = float(os.getenv("MOCK_LLM_TTFT_MS", "300")) / 1000
+LLM_TOKENS = int(os.getenv("MOCK_LLM_TOKENS", "60"))
+LLM_TOKEN_DELAY_SECONDS = float(os.getenv("MOCK_LLM_TOKEN_DELAY_MS", "15")) / 1000
+OSRM_LATENCY_SECONDS = float(os.getenv("MOCK_OSRM_LATENCY_MS", "80")) / 1000
+ROUTE_POINTS = 200
+
+WORDS = "Based on the current snapshot three shipments are delayed at the Port of Houston".split()
+
+
+def _token(i: int) -> str:
+    return WORDS[i % len(WORDS)] + " "
+
+
+async def _stream_tokens(make_event):
+    await asyncio.sleep(LLM_TTFT_SECONDS)
+    for i in range(LLM_TOKENS):
+        yield make_event(_token(i))
+        await asyncio.sleep(LLM_TOKEN_DELAY_SECONDS)
+
+
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    created = int(time.time())
+
+    def chunk(content=None, finish_reason=None):
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "delta": {"content": content} if content is not None else {},
+                "finish_reason": finish_reason,
+            }],
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_TTFT_SECONDS + LLM_TOKENS * LLM_TOKEN_DELAY_SECONDS)
+        text = "".join(_token(i) for i in range(LLM_TOKENS))
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        }
+
+    async def events():
+        async for event in _stream_tokens(lambda token: chunk(token)):
+            yield event
+        yield chunk(finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/responses")
+async def responses(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_TTFT_SECONDS + LLM_TOKENS * LLM_TOKEN_DELAY_SECONDS)
+        text = "".join(_token(i) for i in range(LLM_TOKENS))
+        return {
+            "id": "resp-mock",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": model,
+            "status": "completed",
+            "output": [{
+                "type": "message",
+                "id": "msg-mock",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+        }
+
+    def delta_event(token):
+        payload = {
+            "type": "response.output_text.delta",
+            "item_id": "msg-mock",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": token,
+            "sequence_number": 0,
+        }
+        return f"event: response.output_text.delta\ndata: {json.dumps(payload)}\n\n"
+
+    return StreamingResponse(_stream_tokens(delta_event), media_type="text/event-stream")
+
+
+@app.get("/route/v1/driving/{coordinates}")
+async def route(coordinates: str):
+    await asyncio.sleep(OSRM_LATENCY_SECONDS)
+    (lon1, lat1), (lon2, lat2) = [tuple(map(float, point.split(","))) for point in coordinates.split(";")]
+    steps = ROUTE_POINTS - 1
+    points = [
+        [lon1 + (lon2 - lon1) * i / steps, lat1 + (lat2 - lat1) * i / steps]
+        for i in range(ROUTE_POINTS)
+    ]
+    return {"code": "Ok", "routes": [{"geometry": {"type": "LineString", "coordinates": points}}]}
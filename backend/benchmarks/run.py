@@ -0,0 +1,189 @@
+"""
+Run the benchmark suite and save the results as JSON.
+
+    cd backend
+    python -m benchmarks.run                        # 1k, 100k and 1M rows
+    python -m benchmarks.run --scales 1k,100k --duration 20 --concurrency 32
+    python -m benchmarks.run --skip-load --compare benchmarks/results/<earlier run>.json
+    python -m benchmarks.run --scales 100k --skip-micro --skip-load    # cold start only
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+import local_warehouse
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def parse_scales(value: str) -> Dict[str, int]:
+    scales = {}
+    for name in value.split(","):
+        name = name.strip().lower()
+        if name in SCALES:
+            scales[name] = SCALES[name]
+        else:
+            # Plain row counts are accepted too, e.g. 250000
+            scales[name] = int(name)
+    return scales
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata() -> Dict:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def warehouse_for(rows: int, seed: int, results_dir: Path) -> Path:
+    """Seeded local warehouse for a scale, reused across runs"""
+    path = results_dir / f"warehouse_{rows}_seed{seed}.db"
+    if not path.exists():
+        start = time.perf_counter()
+        local_warehouse.seed_database(path, rows, seed)
+        print(f"  seeded {path.name} in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """Lines describing p50 changes between two result files"""
+    lines = []
+    for scale, result in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if not base:
+            continue
+        for name, summary in result.get("micro", {}).items():
+            before = base.get("micro", {}).get(name)
+            if before and before["p50_ms"]:
+                change = (summary["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+                lines.append(f"{scale:>5} micro {name:<32} p50 {before['p50_ms']:>10.3f} -> {summary['p50_ms']:>10.3f} ms ({change:+.1f}%)")
+        for name, summary in result.get("load", {}).get("scenarios", {}).items():
+            before = base.get("load", {}).get("scenarios", {}).get(name)
+            if before and before.get("p50_ms") and summary.get("p50_ms"):
+                lines.append(
+                    f"{scale:>5} load  {name:<32} rps {before['throughput_rps']:>8.1f} -> {summary['throughput_rps']:>8.1f}, "
+                    f"p95 {before['p95_ms']:>9.1f} -> {summary['p95_ms']:>9.1f} ms"
+                )
+        for mode, summary in result.get("startup", {}).get("modes", {}).items():
+            before = base.get("startup", {}).get("modes", {}).get(mode)
+            if before:
+                lines.append(
+                    f"{scale:>5} start {mode:<32} ready {before['ready_ms']:>9.1f} -> {summary['ready_ms']:>9.1f} ms"
+                )
+        for mode, by_workers in result.get("memory", {}).items():
+            for workers, summary in by_workers.items():
+                before = base.get("memory", {}).get(mode, {}).get(workers)
+                if before:
+                    lines.append(
+                        f"{scale:>5} mem   {mode + ' x' + workers:<32} pss {before['pss_mb']:>9.1f} -> {summary['pss_mb']:>9.1f} MB"
+                    )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend benchmark suite")
+    parser.add_argument("--scales", default="1k,100k,1m", help="Comma-separated scales (1k, 100k, 1m or row counts)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="Minimum measured time per micro-benchmark")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per scale")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent load clients")
+    parser.add_argument("--write-rate", type=float, default=0.0,
+                        help="Simulated store updates per second during load (event_simulator.py)")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Cold starts per warm-up mode")
+    parser.add_argument("--skip-memory", action="store_true")
+    parser.add_argument("--memory-workers", default="1,2,4", help="Comma-separated uvicorn worker counts")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = {"meta": run_metadata(), "scales": {}}
+
+    for name, rows in parse_scales(args.scales).items():
+        print(f"[{name}] {rows} rows")
+        scale_result = {"rows": rows}
+        if not args.skip_micro:
+            from benchmarks.micro import run_micro_benchmarks
+
+            scale_result["micro"] = run_micro_benchmarks(rows, args.min_seconds, args.seed)
+            for bench, summary in scale_result["micro"].items():
+                line = f"  {bench:<32} p50 {summary['p50_ms']:>10.3f} ms  p99 {summary['p99_ms']:>10.3f} ms"
+                if "bytes_out" in summary:
+                    line += f"  {summary['bytes_in']} -> {summary['bytes_out']} bytes"
+                print(line)
+        if not args.skip_load:
+            from benchmarks.load import run_load_benchmark
+
+            database = warehouse_for(rows, args.seed, RESULTS_DIR)
+            scale_result["load"] = run_load_benchmark(
+                database, args.duration, args.concurrency, log_dir=RESULTS_DIR, write_rate=args.write_rate
+            )
+            overall = scale_result["load"]["overall"]
+            print(f"  load: {overall['throughput_rps']} req/s, p50 {overall['p50_ms']} ms, "
+                  f"p95 {overall['p95_ms']} ms, p99 {overall['p99_ms']} ms, errors {overall['errors']}")
+            if "staleness" in scale_result["load"]:
+                staleness = scale_result["load"]["staleness"]
+                print(f"  staleness: p50 {staleness['p50_s']} s, p95 {staleness['p95_s']} s, max {staleness['max_s']} s")
+        if not args.skip_startup:
+            from benchmarks.startup import run_startup_benchmark
+
+            database = warehouse_for(rows, args.seed, RESULTS_DIR)
+            scale_result["startup"] = run_startup_benchmark(database, args.startup_runs, log_dir=RESULTS_DIR)
+            print(f"  import main: {scale_result['startup']['imports']['main_ms']} ms")
+            for mode, summary in scale_result["startup"]["modes"].items():
+                first = max(summary["first_requests_ms"].values())
+                print(f"  startup {mode:<10} listening {summary['listening_ms']} ms, ready {summary['ready_ms']} ms, "
+                      f"slowest first request {first} ms")
+        if not args.skip_memory:
+            from benchmarks.memory import run_memory_benchmark
+
+            database = warehouse_for(rows, args.seed, RESULTS_DIR)
+            worker_counts = [int(count) for count in args.memory_workers.split(",")]
+            scale_result["memory"] = run_memory_benchmark(database, worker_counts, log_dir=RESULTS_DIR)
+            for workers in worker_counts:
+                frames = scale_result["memory"]["per_worker_frames"][str(workers)]
+                shared = scale_result["memory"]["arrow_snapshots"][str(workers)]
+                print(f"  memory {workers} workers: pss {frames['pss_mb']} MB, "
+                      f"with arrow snapshots {shared['pss_mb']} MB")
+        results["scales"][name] = scale_result
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        for line in compare(results, json.loads(args.compare.read_text())):
+            print(line)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
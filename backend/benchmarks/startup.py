@@ -0,0 +1,141 @@
+"""
+Cold start benchmark.
+Measures the import cost of the API module and, for fresh uvicorn processes
+with and without the startup warm-up, the time until the server answers,
+the time until /api/ready reports warm caches and the latency of the first
+request to each dashboard endpoint.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.load import BACKEND_DIR, free_port, serve, wait_until_ready
+
+# Endpoints a user hits first after opening the app
+FIRST_REQUEST_PATHS = [
+    "/api/inventory/summary",
+    "/api/dashboard/executive",
+    "/api/inventory",
+    "/api/batches",
+    "/api/products",
+]
+# Top-level modules reported in the import breakdown
+IMPORT_MODULES = ["fastapi", "pandas", "pyarrow", "prometheus_client", "yaml", "databricks.sql.client", "openai"]
+POLL_SECONDS = 0.01
+
+_IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_breakdown(env: Dict[str, str]) -> Dict:
+    """Cumulative import time of `main` and of the heavy modules it loads (python -X importtime)"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main, sys; print(','.join(sorted(sys.modules)))"],
+        cwd=BACKEND_DIR, env={**os.environ, **env}, capture_output=True, text=True, check=True
+    )
+    loaded = set(process.stdout.strip().split(","))
+    cumulative = {}
+    for line in process.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            # The first (outermost) import of a module carries its full cost
+            cumulative.setdefault(match.group(4), int(match.group(2)) / 1000)
+    return {
+        "main_ms": cumulative.get("main"),
+        "modules": {
+            name: {"loaded": name in loaded, "ms": cumulative.get(name) if name in loaded else None}
+            for name in IMPORT_MODULES
+        },
+    }
+
+
+def poll(url: str, accept, timeout: float = 120.0) -> float:
+    """Poll url until accept(status code) holds; returns the time it first did"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if accept(httpx.get(url, timeout=timeout).status_code):
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(POLL_SECONDS)
+    raise RuntimeError(f"{url} did not respond within {timeout}s")
+
+
+def cold_start(api_env: Dict[str, str], log_path: Path) -> Dict:
+    """Start one API process and time it until ready and through its first requests"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    with serve("main:app", port, api_env, log_path):
+        listening = poll(f"{url}/api/statuses", lambda status: status == 200)
+        ready = poll(f"{url}/api/ready", lambda status: status == 200)
+        readiness = httpx.get(f"{url}/api/ready").json()
+        first_requests = {}
+        for path in FIRST_REQUEST_PATHS:
+            request_start = time.perf_counter()
+            response = httpx.get(f"{url}{path}", timeout=600)
+            first_requests[path] = {
+                "status": response.status_code,
+                "ms": round((time.perf_counter() - request_start) * 1000, 2),
+            }
+    return {
+        "listening_ms": round((listening - start) * 1000, 2),
+        "ready_ms": round((ready - start) * 1000, 2),
+        "warmup_state": readiness.get("state"),
+        "first_requests": first_requests,
+    }
+
+
+def median_of(runs: List[Dict], *keys) -> Optional[float]:
+    values = []
+    for run in runs:
+        value = run
+        for key in keys:
+            value = value[key]
+        values.append(value)
+    return round(float(np.median(values)), 2) if values else None
+
+
+def run_startup_benchmark(database_path: Path, runs: int = 3, log_dir: Optional[Path] = None,
+                          extra_env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Cold start the API `runs` times with the warm-up on and off.
+
+    Each mode reports the median time until the server answers, until it is
+    ready, and of the first request per endpoint (after readiness).
+    """
+    log_dir = Path(log_dir or database_path.parent)
+    upstream_port = free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    api_env = {
+        "DATA_BACKEND": "local",
+        "LOCAL_WAREHOUSE_PATH": str(database_path),
+        "OSRM_BASE_URL": upstream_url,
+        **(extra_env or {}),
+    }
+
+    result = {"runs": runs, "imports": import_breakdown(api_env), "modes": {}}
+    with serve("benchmarks.mock_upstream:app", upstream_port, {}, log_dir / "mock_upstream.log"):
+        wait_until_ready(f"{upstream_url}/docs")
+        for mode, warm in [("warmup", "true"), ("no_warmup", "false")]:
+            samples = [
+                cold_start({**api_env, "STARTUP_WARMUP": warm}, log_dir / f"startup_{mode}.log")
+                for _ in range(runs)
+            ]
+            result["modes"][mode] = {
+                "listening_ms": median_of(samples, "listening_ms"),
+                "ready_ms": median_of(samples, "ready_ms"),
+                "warmup_state": samples[-1]["warmup_state"],
+                "first_requests_ms": {
+                    path: median_of(samples, "first_requests", path, "ms") for path in FIRST_REQUEST_PATHS
+                },
+            }
+    return result
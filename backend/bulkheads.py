@@ -0,0 +1,94 @@
+"""
+Bulkheads: separately sized thread pools for each kind of blocking work.
+Warehouse queries, outbound routing calls and pandas transforms each run in
+their own bounded pool, so a burst of slow work of one kind cannot take the
+threads the others (and cheap endpoints) need. A pool whose workers and wait
+queue are all taken rejects new work at once instead of queueing it.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+import asyncio
+import contextvars
+import threading
+import time
+
+
+class BulkheadRejected(Exception):
+    """Raised when a pool's workers and queue are all taken"""
+
+    def __init__(self, name: str, retry_after: int = 1):
+        super().__init__(f"The {name} pool is saturated")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    """A bounded thread pool for one kind of blocking work, with a bounded wait queue"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"bulkhead-{name}")
+        self.active = 0
+        self.queued = 0
+        # Running totals for metrics
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run func in the pool and await its result; raises BulkheadRejected when full.
+
+        func sees the caller's context variables (request spans and scope).
+        """
+        with self._lock:
+            if self.active + self.queued >= self.max_workers + self.max_queue:
+                self.rejected_total += 1
+                raise BulkheadRejected(self.name)
+            self.queued += 1
+        enqueued_at = time.monotonic()
+        context = contextvars.copy_context()
+
+        def call():
+            waited = time.monotonic() - enqueued_at
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed_total += 1
+
+        def release_if_cancelled(future: Future):
+            # A call cancelled before a worker picked it up (the caller's await
+            # was cancelled: a timeout or a disconnect) never runs call()
+            if future.cancelled():
+                with self._lock:
+                    self.queued -= 1
+
+        future = self.executor.submit(call)
+        future.add_done_callback(release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "max_queue": self.max_queue,
+                "saturated": self.active >= self.max_workers,
+                "completed_total": self.completed_total,
+                "rejected_total": self.rejected_total,
+                "wait_seconds_total": round(self.wait_seconds_total, 3),
+                "wait_seconds_max": round(self.wait_seconds_max, 3),
+            }
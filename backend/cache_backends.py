@@ -0,0 +1,515 @@
+"""
+Backends for the API's data cache.
+Warehouse results and routes are cached through one of:
+
+- memory: a dict in this process (default; each worker has its own copy)
+- sqlite: a file shared by all workers on a host
+- redis: a network cache shared by all instances (needs the redis package)
+
+Shared backends keep a per-process copy of each value next to the write stamp
+it was stored with, so a hit only deserializes when another worker has stored
+a newer value. Refresh locks give single-flight across processes: one worker
+queries the warehouse for a key while the others wait and then reuse its result.
+
+Entries can carry tags (e.g. "inventory", "batch:<id>", "route") so that
+everything derived from one table or entity can be found and dropped together.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# How often a worker waiting on another worker's refresh checks the lock
+LOCK_POLL_SECONDS = 0.05
+# A refresh lock left behind by a crashed worker expires after this long
+DEFAULT_LOCK_TTL_SECONDS = 300
+
+DEFAULT_SQLITE_PATH = Path(tempfile.gettempdir()) / "supply_chain_cache.db"
+
+
+class CacheItem:
+    def __init__(self, data, ttl_seconds=300, version=None, expires_at: Optional[float] = None):
+        self.data = data
+        self.version = version
+        self.ttl_seconds = ttl_seconds
+        # Wall-clock time, so entries written by other processes compare correctly
+        self.expires_at = expires_at if expires_at is not None else time.time() + ttl_seconds
+
+    def is_expired(self):
+        return time.time() > self.expires_at
+
+
+class MemoryCacheBackend:
+    """In-process cache; refresh locks only coalesce requests within this worker"""
+
+    name = "memory"
+    # Reads are dict lookups, safe to do on the event loop
+    nonblocking_reads = True
+
+    def __init__(self):
+        self._items: Dict[str, CacheItem] = {}
+        # Last seen content version per key, kept across expiry and clears
+        self._versions: Dict[str, str] = {}
+        # tag -> keys, and key -> its tags
+        self._tagged: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, Tuple[str, ...]] = {}
+        self._tags_lock = threading.Lock()
+        # key -> [its refresh lock, threads holding or waiting for it]; removed when none are left
+        self._locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheItem]:
+        """Get the entry for a key (possibly expired) or None"""
+        return self._items.get(key)
+
+    def _untag(self, keys: Iterable[str]):
+        for key in keys:
+            for tag in self._key_tags.pop(key, ()):
+                tagged = self._tagged.get(tag)
+                if tagged is not None:
+                    tagged.discard(key)
+                    if not tagged:
+                        del self._tagged[tag]
+
+    def set(self, key: str, data, ttl_seconds=300, version=None, tags: Iterable[str] = (),
+            expires_at: Optional[float] = None) -> Optional[str]:
+        """Store a value; returns the key's previous version if a version is given"""
+        self._items[key] = CacheItem(data, ttl_seconds, version, expires_at)
+        with self._tags_lock:
+            self._untag([key])
+            tags = tuple(tags)
+            if tags:
+                self._key_tags[key] = tags
+                for tag in tags:
+                    self._tagged.setdefault(tag, set()).add(key)
+        if version is None:
+            return None
+        previous_version = self._versions.get(key)
+        self._versions[key] = version
+        return previous_version
+
+    def evict(self, key: str) -> bool:
+        """Remove a key if its entry has expired"""
+        item = self._items.get(key)
+        if item is not None and item.is_expired():
+            self._items.pop(key, None)
+            with self._tags_lock:
+                self._untag([key])
+            return True
+        return False
+
+    def keys_with_tags(self, tags: Iterable[str]) -> List[str]:
+        """Keys of the entries tagged with any of tags"""
+        with self._tags_lock:
+            return sorted({key for tag in tags for key in self._tagged.get(tag, ())})
+
+    def drop(self, keys: Iterable[str]) -> List[str]:
+        """Remove entries whether or not they have expired; returns the removed keys"""
+        removed = [key for key in keys if self._items.pop(key, None) is not None]
+        with self._tags_lock:
+            self._untag(removed)
+        return removed
+
+    def clear(self) -> List[str]:
+        """Remove all entries; returns the removed keys"""
+        keys = list(self._items)
+        self._items.clear()
+        with self._tags_lock:
+            self._tagged.clear()
+            self._key_tags.clear()
+        return keys
+
+    def local_items(self) -> List[Tuple[str, Any]]:
+        """Values held in this process's memory, as (key, value)"""
+        return [(key, item.data) for key, item in list(self._items.items())]
+
+    def entries(self) -> List[Tuple[str, CacheItem, Tuple[str, ...]]]:
+        """Every entry with its tags, as (key, item, tags)"""
+        with self._tags_lock:
+            return [(key, item, self._key_tags.get(key, ())) for key, item in list(self._items.items())]
+
+    @contextmanager
+    def refresh_lock(self, key: str, timeout: float) -> Iterator[bool]:
+        """Hold the refresh lock for a key; yields False if it was not acquired in time"""
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        lock = entry[0]
+        acquired = lock.acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+class SharedCacheBackend:
+    """Per-process copies of shared values, validated by their write stamp"""
+
+    # Reads go to a file or the network
+    nonblocking_reads = False
+
+    def __init__(self):
+        # key -> (stamp, expires_at, value)
+        self._copies: Dict[str, Tuple[str, float, Any]] = {}
+        self._copies_lock = threading.Lock()
+
+    def _local_copy(self, key: str, stamp: str, expires_at: float, load) -> Any:
+        with self._copies_lock:
+            copy = self._copies.get(key)
+        if copy is not None and copy[0] == stamp:
+            return copy[2]
+        data = pickle.loads(load())
+        self._keep_copy(key, stamp, expires_at, data)
+        return data
+
+    def _keep_copy(self, key: str, stamp: str, expires_at: float, data):
+        now = time.time()
+        with self._copies_lock:
+            # Expired values are never served, so drop their copies rather than wait for a get of their key
+            for expired_key in [k for k, (_, expiry, _) in self._copies.items() if expiry < now]:
+                del self._copies[expired_key]
+            self._copies[key] = (stamp, expires_at, data)
+
+    def local_items(self) -> List[Tuple[str, Any]]:
+        """Values held in this process's memory (its copies of shared values), as (key, value)"""
+        with self._copies_lock:
+            return [(key, data) for key, (_, _, data) in self._copies.items()]
+
+    def _drop_copies(self, keys: Optional[List[str]] = None):
+        with self._copies_lock:
+            if keys is None:
+                self._copies.clear()
+            else:
+                for key in keys:
+                    self._copies.pop(key, None)
+
+    @staticmethod
+    def _new_owner() -> str:
+        return f"{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex[:8]}"
+
+
+class SQLiteCacheBackend(SharedCacheBackend):
+    """
+    Cache in a SQLite file that every worker on the host opens.
+
+    Values are pickled. Refresh locks are rows with an owner and an expiry, so
+    a lock held by a worker that died is taken over once it expires.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path = DEFAULT_SQLITE_PATH, lock_ttl_seconds: float = DEFAULT_LOCK_TTL_SECONDS):
+        super().__init__()
+        self.path = Path(path)
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, expires_at REAL, version TEXT, stamp TEXT, value BLOB
+                );
+                CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version TEXT);
+                CREATE TABLE IF NOT EXISTS tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key));
+                CREATE INDEX IF NOT EXISTS tags_by_key ON tags (key);
+                CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT, expires_at REAL);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; endpoints run in a thread pool
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[CacheItem]:
+        connection = self._connect()
+        row = connection.execute("SELECT expires_at, version, stamp FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._drop_copies([key])
+            return None
+        expires_at, version, stamp = row
+        if time.time() > expires_at:
+            self._drop_copies([key])
+            return CacheItem(None, version=version, expires_at=expires_at)
+
+        def load():
+            value = connection.execute("SELECT value FROM entries WHERE key = ? AND stamp = ?", (key, stamp)).fetchone()
+            if value is None:
+                raise KeyError(key)
+            return value[0]
+
+        try:
+            data = self._local_copy(key, stamp, expires_at, load)
+        except KeyError:
+            # Replaced between the two reads; treat as a miss
+            return None
+        return CacheItem(data, version=version, expires_at=expires_at)
+
+    def set(self, key: str, data, ttl_seconds=300, version=None, tags: Iterable[str] = ()) -> Optional[str]:
+        stamp = uuid.uuid4().hex
+        value = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = time.time() + ttl_seconds
+        connection = self._connect()
+        previous_version = None
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, expires_at, version, stamp, value)
+            )
+            connection.execute("DELETE FROM tags WHERE key = ?", (key,))
+            connection.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)", [(tag, key) for tag in tags])
+            if version is not None:
+                row = connection.execute("SELECT version FROM versions WHERE key = ?", (key,)).fetchone()
+                previous_version = row[0] if row else None
+                connection.execute("INSERT OR REPLACE INTO versions VALUES (?, ?)", (key, version))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._keep_copy(key, stamp, expires_at, data)
+        return previous_version
+
+    def evict(self, key: str) -> bool:
+        # Only if still expired: another worker may have refreshed it meanwhile
+        connection = self._connect()
+        cursor = connection.execute("DELETE FROM entries WHERE key = ? AND expires_at < ?", (key, time.time()))
+        if cursor.rowcount:
+            connection.execute("DELETE FROM tags WHERE key = ?", (key,))
+            self._drop_copies([key])
+        return cursor.rowcount > 0
+
+    def keys_with_tags(self, tags: Iterable[str]) -> List[str]:
+        tags = list(tags)
+        if not tags:
+            return []
+        placeholders = ", ".join("?" for _ in tags)
+        rows = self._connect().execute(
+            f"SELECT DISTINCT key FROM tags WHERE tag IN ({placeholders}) ORDER BY key", tags
+        )
+        return [row[0] for row in rows]
+
+    def drop(self, keys: Iterable[str]) -> List[str]:
+        connection = self._connect()
+        removed = []
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for key in keys:
+                if connection.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount:
+                    removed.append(key)
+                connection.execute("DELETE FROM tags WHERE key = ?", (key,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._drop_copies(removed)
+        return removed
+
+    def clear(self) -> List[str]:
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            keys = [row[0] for row in connection.execute("SELECT key FROM entries")]
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM tags")
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._drop_copies()
+        return keys
+
+    @contextmanager
+    def refresh_lock(self, key: str, timeout: float) -> Iterator[bool]:
+        connection = self._connect()
+        owner = self._new_owner()
+        deadline = time.monotonic() + timeout
+        acquired = False
+        while True:
+            now = time.time()
+            cursor = connection.execute(
+                """
+                INSERT INTO locks VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE locks.expires_at < ?
+                """,
+                (key, owner, now + self.lock_ttl_seconds, now)
+            )
+            if cursor.rowcount == 1:
+                acquired = True
+                break
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+
+
+# Deletes the lock only if this worker still owns it
+_REDIS_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCacheBackend(SharedCacheBackend):
+    """
+    Cache in Redis, shared by every worker and instance using the same URL.
+
+    Entries are hashes that Redis expires itself, and each tag is a set of
+    keys (members whose entry has expired are dropped when the tag is read);
+    refresh locks use SET NX with an expiry. Any Redis-protocol server works, e.g. a local container:
+
+        docker run --rm -p 6379:6379 redis:7
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "supply-chain:cache:",
+                 lock_ttl_seconds: float = DEFAULT_LOCK_TTL_SECONDS):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+
+        super().__init__()
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self._release = self.client.register_script(_REDIS_RELEASE_SCRIPT)
+
+    def _key(self, kind: str, key: str) -> str:
+        return f"{self.prefix}{kind}:{key}"
+
+    def get(self, key: str) -> Optional[CacheItem]:
+        entry_key = self._key("entry", key)
+        expires_at, version, stamp = self.client.hmget(entry_key, "expires_at", "version", "stamp")
+        if stamp is None:
+            self._drop_copies([key])
+            return None
+
+        def load():
+            value = self.client.hget(entry_key, "value")
+            if value is None or self.client.hget(entry_key, "stamp") != stamp:
+                raise KeyError(key)
+            return value
+
+        try:
+            data = self._local_copy(key, stamp.decode(), float(expires_at), load)
+        except KeyError:
+            return None
+        return CacheItem(data, version=version.decode() if version else None, expires_at=float(expires_at))
+
+    def set(self, key: str, data, ttl_seconds=300, version=None, tags: Iterable[str] = ()) -> Optional[str]:
+        stamp = uuid.uuid4().hex
+        entry_key = self._key("entry", key)
+        tags = list(tags)
+        expires_at = time.time() + ttl_seconds
+        mapping = {
+            "expires_at": expires_at,
+            "version": version or "",
+            "stamp": stamp,
+            "tags": ",".join(tags),
+            "value": pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL),
+        }
+        pipeline = self.client.pipeline()
+        pipeline.delete(entry_key)
+        pipeline.hset(entry_key, mapping=mapping)
+        pipeline.pexpire(entry_key, max(1, int(ttl_seconds * 1000)))
+        for tag in tags:
+            pipeline.sadd(self._key("tag", tag), key)
+        if version is not None:
+            pipeline.getset(self._key("version", key), version)
+        results = pipeline.execute()
+        self._keep_copy(key, stamp, expires_at, data)
+        if version is None or results[-1] is None:
+            return None
+        return results[-1].decode()
+
+    def evict(self, key: str) -> bool:
+        # Redis expires entries itself
+        return False
+
+    def keys_with_tags(self, tags: Iterable[str]) -> List[str]:
+        keys = set()
+        for tag in tags:
+            tag_key = self._key("tag", tag)
+            members = [member.decode() for member in self.client.smembers(tag_key)]
+            expired = [member for member in members if not self.client.exists(self._key("entry", member))]
+            if expired:
+                self.client.srem(tag_key, *expired)
+            keys.update(member for member in members if member not in expired)
+        return sorted(keys)
+
+    def drop(self, keys: Iterable[str]) -> List[str]:
+        removed = []
+        for key in keys:
+            entry_key = self._key("entry", key)
+            tags = self.client.hget(entry_key, "tags")
+            if self.client.delete(entry_key):
+                removed.append(key)
+            for tag in (tags.decode().split(",") if tags else []):
+                self.client.srem(self._key("tag", tag), key)
+        self._drop_copies(removed)
+        return removed
+
+    def clear(self) -> List[str]:
+        entry_prefix = self._key("entry", "")
+        entry_keys = list(self.client.scan_iter(match=f"{entry_prefix}*"))
+        tag_keys = list(self.client.scan_iter(match=f"{self._key('tag', '')}*"))
+        if entry_keys or tag_keys:
+            self.client.delete(*entry_keys, *tag_keys)
+        self._drop_copies()
+        return [k.decode()[len(entry_prefix):] for k in entry_keys]
+
+    @contextmanager
+    def refresh_lock(self, key: str, timeout: float) -> Iterator[bool]:
+        lock_key = self._key("lock", key)
+        owner = self._new_owner()
+        deadline = time.monotonic() + timeout
+        acquired = False
+        while True:
+            if self.client.set(lock_key, owner, nx=True, px=int(self.lock_ttl_seconds * 1000)):
+                acquired = True
+                break
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._release(keys=[lock_key], args=[owner])
+
+
+def create_cache_backend(name: str = "memory", sqlite_path: Optional[str] = None, redis_url: Optional[str] = None):
+    """Create the cache backend selected by name (memory, sqlite or redis)"""
+    name = (name or "memory").lower()
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "sqlite":
+        return SQLiteCacheBackend(Path(sqlite_path) if sqlite_path else DEFAULT_SQLITE_PATH)
+    if name == "redis":
+        return RedisCacheBackend(redis_url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown CACHE_BACKEND '{name}' (expected memory, sqlite or redis)")
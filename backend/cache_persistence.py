@@ -0,0 +1,180 @@
+"""
+Cache snapshots on local disk, so a restarted instance starts with warm caches.
+A save writes every cacheable entry with its expiry, content version and tags:
+
+- DataFrames as Parquet files (keeping their compact dtypes and attrs), one
+  per key and content version, so an unchanged frame is not written again
+- other values (routes and other JSON-like payloads) pickled together
+- a manifest.json naming the files and holding the entries' metadata
+
+Every file is written to a temporary name and renamed into place, and the
+manifest is replaced last, so a crash mid-save leaves the previous snapshot
+readable. Files no manifest refers to any more are deleted after a save.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import time
+import uuid
+
+import pandas as pd
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = 1
+
+
+class PersistedEntry:
+    """A cache entry as saved: value, wall-clock expiry, content version, tags and TTL"""
+
+    def __init__(self, key: str, data: Any, expires_at: float, version: Optional[str] = None,
+                 tags: Iterable[str] = (), ttl_seconds: float = 300):
+        self.key = key
+        self.data = data
+        self.expires_at = expires_at
+        self.version = version
+        self.tags = tuple(tags)
+        self.ttl_seconds = ttl_seconds
+
+    def remaining_seconds(self) -> float:
+        return self.expires_at - time.time()
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class CachePersistence:
+    """Saves and loads cache snapshots in a directory (one current snapshot per directory)"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Workers sharing the directory save and load one at a time
+        with open(self.directory / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _replace(self, name: str, write) -> None:
+        """Write a file through write(path) under a temporary name, then rename it into place"""
+        tmp_path = self.directory / f".{name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, self.directory / name)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def save(self, entries: Iterable[PersistedEntry], table_versions: Optional[Dict[str, str]] = None) -> dict:
+        """Save entries as the current snapshot, with the table versions they were read at"""
+        start = time.perf_counter()
+        manifest_entries = []
+        payloads: Dict[str, Any] = {}
+        frames_written = 0
+        with self._locked():
+            for entry in entries:
+                record = {
+                    "key": entry.key,
+                    "expires_at": entry.expires_at,
+                    "ttl_s": entry.ttl_seconds,
+                    "version": entry.version,
+                    "tags": list(entry.tags),
+                }
+                if isinstance(entry.data, pd.DataFrame):
+                    # Content-versioned name: an unchanged frame keeps its file
+                    version = entry.version or uuid.uuid4().hex
+                    name = f"{_digest(entry.key)}-{_digest(version)}.parquet"
+                    if not (self.directory / name).exists():
+                        self._replace(name, lambda path: entry.data.to_parquet(path, index=False))
+                        frames_written += 1
+                    record.update(kind="parquet", file=name)
+                else:
+                    payloads[entry.key] = entry.data
+                    record.update(kind="pickle")
+                manifest_entries.append(record)
+
+            payload_name = None
+            if payloads:
+                payload_name = f"payloads-{uuid.uuid4().hex[:12]}.pkl"
+                data = pickle.dumps(payloads, protocol=pickle.HIGHEST_PROTOCOL)
+                self._replace(payload_name, lambda path: path.write_bytes(data))
+
+            manifest = {
+                "format": MANIFEST_FORMAT,
+                "saved_at": time.time(),
+                "table_versions": table_versions or {},
+                "payloads": payload_name,
+                "entries": manifest_entries,
+            }
+            self._replace(MANIFEST_NAME, lambda path: path.write_text(json.dumps(manifest)))
+            removed = self._remove_unreferenced(manifest)
+
+        return {
+            "entries": len(manifest_entries),
+            "frames_written": frames_written,
+            "files_removed": removed,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def _remove_unreferenced(self, manifest: dict) -> int:
+        referenced = {entry["file"] for entry in manifest["entries"] if entry["kind"] == "parquet"}
+        referenced.add(manifest["payloads"])
+        removed = 0
+        for path in list(self.directory.glob("*.parquet")) + list(self.directory.glob("payloads-*.pkl")):
+            if path.name not in referenced:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def load(self) -> Tuple[List[PersistedEntry], Dict[str, str]]:
+        """
+        Load the current snapshot as (entries, table versions).
+
+        A missing or unreadable manifest gives no entries; an entry whose file
+        is missing or unreadable is skipped.
+        """
+        with self._locked():
+            try:
+                manifest = json.loads((self.directory / MANIFEST_NAME).read_text())
+            except FileNotFoundError:
+                return [], {}
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable cache snapshot manifest: {e}")
+                return [], {}
+            if manifest.get("format") != MANIFEST_FORMAT:
+                return [], {}
+
+            payloads: Dict[str, Any] = {}
+            if manifest.get("payloads"):
+                try:
+                    payloads = pickle.loads((self.directory / manifest["payloads"]).read_bytes())
+                except Exception as e:
+                    print(f"Ignoring unreadable cache snapshot payloads: {e}")
+
+            entries = []
+            for record in manifest.get("entries", []):
+                if record["kind"] == "parquet":
+                    try:
+                        data = pd.read_parquet(self.directory / record["file"])
+                    except Exception as e:
+                        print(f"Skipping cache snapshot entry {record['key']}: {e}")
+                        continue
+                elif record["key"] in payloads:
+                    data = payloads[record["key"]]
+                else:
+                    continue
+                entries.append(PersistedEntry(
+                    record["key"], data, record["expires_at"], record.get("version"),
+                    record.get("tags", ()), record.get("ttl_s", 300)
+                ))
+        return entries, manifest.get("table_versions", {})
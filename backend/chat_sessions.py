@@ -0,0 +1,126 @@
+"""
+Server-side chat sessions.
+Clients create a session once and then post only their new message; the
+server keeps a bounded, trimmed history per session.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+import threading
+import uuid
+
+from system_prompts import estimate_message_tokens
+
+
+# How many earlier questions are kept in the recap of trimmed turns
+RECAP_MAX_QUESTIONS = 5
+RECAP_QUESTION_CHARS = 120
+
+
+class ChatSession:
+    def __init__(self, context: str, selected_batch_id: Optional[str] = None):
+        self.session_id = uuid.uuid4().hex
+        self.context = context
+        self.selected_batch_id = selected_batch_id
+        self.messages: List[Dict[str, str]] = []
+        self.trimmed_questions: List[str] = []
+        self.in_flight = False
+        self.created_at = datetime.now()
+        self.last_active = self.created_at
+
+    def history(self, new_message: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Get the history to send upstream, optionally followed by a new user message.
+
+        Trimmed turns are recapped in front of the first retained user message,
+        so the system prompt stays the first and unchanged part of the request.
+        """
+        messages = [dict(m) for m in self.messages]
+        if new_message is not None:
+            messages.append({"role": "user", "content": new_message})
+        if self.trimmed_questions and messages:
+            recap = "; ".join(self.trimmed_questions)
+            messages[0]["content"] = (
+                f"[Earlier in this conversation I asked about: {recap}]\n\n{messages[0]['content']}"
+            )
+        return messages
+
+
+class ChatSessionStore:
+    """
+    Bounded in-memory session store.
+
+    Sessions are evicted least-recently-used once max_sessions is reached and
+    expire after idle_ttl_seconds without activity. Each session keeps at most
+    max_messages messages / max_history_tokens estimated tokens; older turns
+    are dropped and replaced by a short recap of the questions asked.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl_seconds: int = 3600,
+                 max_messages: int = 20, max_history_tokens: int = 6000):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_messages = max_messages
+        self.max_history_tokens = max_history_tokens
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_expired(self, session: ChatSession) -> bool:
+        return datetime.now() - session.last_active > timedelta(seconds=self.idle_ttl_seconds)
+
+    def create(self, context: str, selected_batch_id: Optional[str] = None) -> ChatSession:
+        """Create a session, evicting expired and least recently used ones"""
+        session = ChatSession(context, selected_batch_id)
+        with self._lock:
+            for session_id in [k for k, s in self._sessions.items() if self._is_expired(s)]:
+                del self._sessions[session_id]
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Get a live session and mark it as recently used"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self._is_expired(session):
+                del self._sessions[session_id]
+                return None
+            session.last_active = datetime.now()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """Delete a session; returns whether it existed"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def record_turn(self, session: ChatSession, user_message: str, assistant_message: str):
+        """Append a completed question/answer pair and trim the history"""
+        with self._lock:
+            session.messages.append({"role": "user", "content": user_message})
+            session.messages.append({"role": "assistant", "content": assistant_message})
+            session.last_active = datetime.now()
+            self._trim(session)
+
+    def _trim(self, session: ChatSession):
+        """Drop the oldest turns until the history fits both limits"""
+        while len(session.messages) > 2 and (
+            len(session.messages) > self.max_messages
+            or estimate_message_tokens(session.messages) > self.max_history_tokens
+        ):
+            dropped = session.messages[:2]
+            session.messages = session.messages[2:]
+            question = next((m["content"] for m in dropped if m["role"] == "user"), None)
+            if question:
+                question = " ".join(question.split())
+                if len(question) > RECAP_QUESTION_CHARS:
+                    question = question[:RECAP_QUESTION_CHARS - 3] + "..."
+                session.trimmed_questions.append(question)
+                session.trimmed_questions = session.trimmed_questions[-RECAP_MAX_QUESTIONS:]
+
+    def __len__(self):
+        return len(self._sessions)
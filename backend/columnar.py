@@ -0,0 +1,124 @@
+"""
+Compact in-memory representation of warehouse tables.
+Query results are converted once, before they are cached:
+
+- repetitive string columns become categoricals
+- integer columns are downcast to the smallest type that holds their values
+- timestamp strings are parsed into datetime64 columns and formatted back to
+  the same text when records are serialized
+
+Float columns stay float64 so values serialize exactly as stored.
+"""
+
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# Text format of the warehouse's timestamp columns
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Columns with few distinct values relative to their rows, across both tables
+CATEGORY_COLUMNS = {
+    "product_id",
+    "product_name",
+    "status",
+    "status_category",
+    "transit_status",
+    "current_location",
+    "destination",
+    "batch_id",
+    "event",
+    "entity_involved",
+    "entity_name",
+    "entity_location",
+}
+
+# Timestamp columns and the exact format their text is parsed from and written back in
+DATETIME_COLUMNS = {
+    "last_updated_cst": TIMESTAMP_FORMAT,
+    "expected_arrival_time": TIMESTAMP_FORMAT,
+    "event_time_cst": TIMESTAMP_FORMAT,
+}
+
+
+def _is_text(column: pd.Series) -> bool:
+    return pd.api.types.is_string_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype)
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a query result to its compact representation.
+
+    Columns already converted are left as they are, so this can run again
+    after a transform adds columns.
+    """
+    converted = {}
+    for name, column in df.items():
+        if name in DATETIME_COLUMNS and _is_text(column):
+            try:
+                converted[name] = pd.to_datetime(column, format=DATETIME_COLUMNS[name])
+            except (ValueError, TypeError):
+                # Text that does not match the format exactly stays text
+                pass
+        elif name in CATEGORY_COLUMNS and _is_text(column):
+            converted[name] = column.astype("category")
+        elif pd.api.types.is_integer_dtype(column.dtype) and isinstance(column.dtype, np.dtype):
+            # Nullable (extension) integers are left as they are
+            converted[name] = pd.to_numeric(column, downcast="integer")
+    if not converted:
+        return df
+    result = df.assign(**converted)
+    result.attrs = dict(df.attrs)
+    return result
+
+
+def format_datetimes(column: pd.Series, fmt: str = TIMESTAMP_FORMAT) -> pd.Series:
+    """Format a datetime column as text (None where missing), formatting each distinct value once"""
+    codes, uniques = pd.factorize(column)
+    formatted = np.append(np.asarray(uniques.strftime(fmt), dtype=object), None)
+    # Missing values have code -1, which picks the trailing None
+    return pd.Series(formatted[codes], index=column.index, dtype=object)
+
+
+def frame_to_records(df: pd.DataFrame, nullable_columns: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Convert a frame to JSON-ready records.
+
+    Timestamp columns are written in their source format. Missing values
+    become '' or, in nullable_columns, None.
+    """
+    nullable_columns = set(nullable_columns)
+    columns = {}
+    for name, column in df.items():
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            column = format_datetimes(column, DATETIME_COLUMNS.get(name, TIMESTAMP_FORMAT))
+        if column.hasnans:
+            fill = None if name in nullable_columns else ''
+            column = column.astype(object).where(column.notna(), fill)
+        columns[name] = column
+    return pd.DataFrame(columns, index=df.index, copy=False).to_dict('records')
+
+
+def memory_report(frames: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+    """
+    Rows and bytes of one table's frames, per column and in total.
+
+    source_bytes is the size of the Arrow results the frames were built from,
+    where known (df.attrs['source_bytes']).
+    """
+    report = {"frames": 0, "rows": 0, "bytes": 0, "source_bytes": 0, "columns": {}}
+    for df in frames:
+        usage = df.memory_usage(deep=True, index=True)
+        report["frames"] += 1
+        report["rows"] += len(df)
+        report["bytes"] += int(usage.sum())
+        report["source_bytes"] += int(df.attrs.get("source_bytes", 0))
+        for name, column in df.items():
+            entry = report["columns"].setdefault(name, {"dtype": str(column.dtype), "bytes": 0})
+            entry["bytes"] += int(usage[name])
+    if report["source_bytes"]:
+        report["compression_ratio"] = round(report["source_bytes"] / report["bytes"], 2) if report["bytes"] else None
+    else:
+        del report["source_bytes"]
+    return report
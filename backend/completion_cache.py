@@ -0,0 +1,123 @@
+"""
+Cache for chat completions.
+Answers are keyed by model, endpoint, system-prompt version and the normalized
+message history, and replayed over the same SSE protocol as live streams.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+import hashlib
+import json
+import threading
+
+
+def prompt_version(system_prompt: str) -> str:
+    """Version a system prompt by its content"""
+    return hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[List[str]]:
+    """Normalize message history so trivially different phrasings share a key"""
+    return [
+        [m.get("role", ""), " ".join(str(m.get("content", "")).split()).casefold()]
+        for m in messages
+    ]
+
+
+class CompletionCacheItem:
+    def __init__(self, text: str, namespace: str, ttl_seconds: int):
+        self.text = text
+        self.namespace = namespace
+        self.expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
+
+    def is_expired(self):
+        return datetime.now() > self.expires_at
+
+
+class CompletionCache:
+    """
+    Bounded LRU cache of completed chat answers with a TTL.
+
+    Entries are grouped by namespace (the chat context they were generated
+    for) so they can be invalidated together when the underlying data changes.
+    """
+
+    def __init__(self, ttl_seconds: int = 900, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, CompletionCacheItem]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    @staticmethod
+    def make_key(model: str, endpoint: str, namespace: str, system_prompt: str,
+                 history: List[Dict[str, str]]) -> str:
+        """
+        Build a cache key.
+
+        Args:
+            model: Serving model name
+            endpoint: Serving endpoint URL
+            namespace: Chat context, e.g. "realtime"
+            system_prompt: Rendered system prompt (hashed into its version)
+            history: Conversation messages without the system prompt
+        """
+        payload = json.dumps(
+            [model, endpoint, namespace, prompt_version(system_prompt), normalize_messages(history)],
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached answer if present and not expired"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item.is_expired():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item.text
+
+    def set(self, key: str, text: str, namespace: str):
+        """Store an answer, evicting the least recently used entries"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._items[key] = CompletionCacheItem(text, namespace, self.ttl_seconds)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, namespace: Optional[str] = None) -> int:
+        """Drop all answers for a namespace (or everything); returns the number dropped"""
+        with self._lock:
+            if namespace is None:
+                dropped = len(self._items)
+                self._items.clear()
+                return dropped
+            keys = [k for k, item in self._items.items() if item.namespace == namespace]
+            for key in keys:
+                del self._items[key]
+            return len(keys)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def iter_replay_chunks(text: str, chunk_size: int = 48):
+    """Split a cached answer into stream-sized chunks on word boundaries"""
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_size)
+        if end < len(text):
+            space = text.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        yield text[start:end]
+        start = end
@@ -0,0 +1,202 @@
+"""
+Compression of API response bodies, negotiated by Accept-Encoding.
+
+The large JSON payloads (inventory rows, batch lists and timelines) repeat
+the same product, location and status strings on every row and shrink by an
+order of magnitude. Compressed bodies are kept in a small LRU keyed by a
+digest of the uncompressed body, so a payload served from the data cache is
+compressed once rather than on every request.
+
+gzip is always available; zstd and brotli are offered when the zstandard or
+brotli package is installed (both are in requirements.txt). Event streams, streamed bodies, responses
+that already carry a Content-Encoding and responses whose strong ETag
+already varies by Accept-Encoding (the static files, which negotiate their
+own variants and 304s) pass through untouched.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import gzip
+import hashlib
+import threading
+import time
+
+from static_assets import accepted_encodings
+import telemetry
+from telemetry import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies this large are compressed in a worker thread instead of on the event loop
+THREAD_MIN_BYTES = 64 * 1024
+
+# Media types worth compressing (text/event-stream never is: it must not be buffered)
+COMPRESSIBLE_TYPES = (b"application/json", b"text/plain", b"text/html", b"text/csv")
+
+
+def _varies_by_encoding(vary: bytes) -> bool:
+    return any(token.strip().lower() in (b"accept-encoding", b"*") for token in vary.split(b","))
+
+
+def zstd_compress(level: int) -> Callable[[bytes], bytes]:
+    """zstd compression with a ZstdCompressor per thread (they must not be shared between threads)"""
+    local = threading.local()
+
+    def compress(data: bytes) -> bytes:
+        compressor = getattr(local, "compressor", None)
+        if compressor is None:
+            compressor = local.compressor = zstandard.ZstdCompressor(level=level)
+        return compressor.compress(data)
+
+    return compress
+
+
+def compressors(level: int) -> Dict[str, Callable[[bytes], bytes]]:
+    """Compressor per content coding available here, in order of preference"""
+    available = {}
+    if zstandard is not None:
+        available["zstd"] = zstd_compress(min(level, 22))
+    if brotli is not None:
+        available["br"] = lambda data: brotli.compress(data, quality=min(level, 11))
+    available["gzip"] = lambda data: gzip.compress(data, min(level, 9), mtime=0)
+    return available
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by (digest of the body, content coding)"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[bytes, str]) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key: Tuple[bytes, str], body: bytes):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CompressionMiddleware:
+    """
+    Plain ASGI middleware compressing complete response bodies of minimum_size bytes or more.
+
+    Records bytes in and out and compression time per route (compression_*
+    metrics) and a compress span for Server-Timing.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, level: int = 6, cache_entries: int = 64):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressors = compressors(level)
+        self.cache = CompressedBodyCache(cache_entries)
+
+    def _negotiate(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accepted = accepted_encodings(value.decode("latin-1"))
+                return next((coding for coding in self.compressors if accepted.get(coding, 0) > 0), None)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._negotiate(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                etag = headers.get(b"etag", b"")
+                if (b"content-encoding" in headers
+                        or b"no-transform" in headers.get(b"cache-control", b"")
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        # The app chose this representation's coding and revalidates its ETag itself
+                        or (etag and not etag.startswith(b"W/") and _varies_by_encoding(headers.get(b"vary", b"")))):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held until the body shows whether it is complete and large enough
+                    start_message = message
+                return
+
+            body = message.get("body", b"")
+            passthrough = True
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streamed or small: sent as is
+                await send(start_message)
+                await send(message)
+                return
+            if len(body) >= THREAD_MIN_BYTES:
+                compressed = await asyncio.to_thread(self._compress, scope, body, encoding)
+            else:
+                compressed = self._compress(scope, body, encoding)
+            headers = [
+                (name, value) for name, value in start_message.get("headers", [])
+                if name not in (b"content-length", b"etag", b"vary")
+            ]
+            vary_values = [value for name, value in start_message.get("headers", []) if name == b"vary"]
+            if not any(_varies_by_encoding(value) for value in vary_values):
+                vary_values.append(b"Accept-Encoding")
+            vary = b", ".join(vary_values)
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", vary),
+            ]
+            for name, value in start_message.get("headers", []):
+                if name == b"etag":
+                    # A different representation needs a different entity tag
+                    headers.append((b"etag", value[:-1] + b"-" + encoding.encode() + b'"'
+                                    if value.endswith(b'"') else value))
+            await send({**start_message, "headers": headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _compress(self, scope, body: bytes, encoding: str) -> bytes:
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        compressed = self.cache.get(key)
+        if compressed is not None:
+            telemetry.COMPRESSION_CACHE_EVENTS.labels("hit").inc()
+        else:
+            telemetry.COMPRESSION_CACHE_EVENTS.labels("miss").inc()
+            with span("compress", encoding):
+                start = time.perf_counter()
+                compressed = self.compressors[encoding](body)
+                telemetry.COMPRESSION_SECONDS.labels(route, encoding).observe(time.perf_counter() - start)
+            self.cache.put(key, compressed)
+        telemetry.COMPRESSION_BYTES.labels(route, encoding, "in").inc(len(body))
+        telemetry.COMPRESSION_BYTES.labels(route, encoding, "out").inc(len(compressed))
+        return compressed
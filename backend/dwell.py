@@ -0,0 +1,261 @@
+"""
+Dwell-time and bottleneck statistics over batch events, maintained incrementally.
+
+Consecutive events of a batch bound one interval of its journey. When both
+events name the same entity ("At Dock" then "In Transit to DC" at one port)
+the interval is time spent at that entity; when they differ it is a leg
+between two entities. Intervals are accumulated per entity, per entity type
+(entity_involved), per leg and per leg type.
+
+Each statistic is a quantile sketch in the style of DDSketch: values fall in
+logarithmic buckets, so any quantile is reported within a fixed relative
+error using a few hundred counters, however many values were added. Only
+events newer than the last one consumed are read (by record_id), and each
+batch's latest event is kept to pair with its next one, so an update costs
+O(new events) rather than a rescan of the events table.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Quantiles reported for every statistic
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+# Events after which a batch has no further intervals (its state is dropped)
+TERMINAL_EVENTS = ("Delivered",)
+# Intervals shorter than this (hours) are counted as zero
+MIN_HOURS = 1e-3
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy (DDSketch-style).
+
+    A positive value v goes to bucket ceil(log_gamma(v)), gamma = (1 + a) / (1 - a);
+    a quantile is answered with its bucket's midpoint, within a relative error a.
+    When there are more than max_buckets buckets the lowest ones are collapsed,
+    so only the smallest values lose accuracy.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: Iterable[float]):
+        """Add values (an array or any iterable of non-negative numbers)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > MIN_HOURS]
+        self.zero_count += len(values) - len(positive)
+        indexes, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        """Add another sketch's values (same relative accuracy)"""
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        indexes = sorted(self.buckets)
+        excess = indexes[:len(indexes) - self.max_buckets + 1]
+        collapsed = sum(self.buckets.pop(index) for index in excess)
+        self.buckets[excess[-1]] = collapsed
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile (0..1) of the values added, or None when there are none"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                # The bucket midpoint can overshoot the extremes actually seen
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, quantiles and maximum, in the sketch's unit (hours here)"""
+        result = {"count": self.count, "mean_hours": round(self.sum / self.count, 2) if self.count else None}
+        for name, q in QUANTILES.items():
+            value = self.quantile(q)
+            result[f"{name}_hours"] = round(value, 2) if value is not None else None
+        result["max_hours"] = round(self.max, 2) if self.count else None
+        return result
+
+
+# Statistic groups: name -> the interval columns that key them
+GROUPS = {
+    "entities": ("entity_involved", "entity_name"),
+    "entity_types": ("entity_involved",),
+    "legs": ("from_entity", "to_entity"),
+    "leg_types": ("from_type", "to_type"),
+}
+
+
+class DwellAnalytics:
+    """
+    Dwell and leg time statistics, updated with each new chunk of batch events.
+
+    ingest() takes events newer than last_record_id, in any order; summary()
+    reports every statistic, the slowest (by p90) first. Thread-safe.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[str, Dict[tuple, QuantileSketch]] = {group: {} for group in GROUPS}
+        # batch_id -> (time, entity name, entity type) of its latest event
+        self._latest: Dict[str, Tuple[np.datetime64, str, str]] = {}
+        self.last_record_id: int = -1
+        self.events_consumed = 0
+        self.intervals = 0
+        self.out_of_order = 0
+        # Monotonic time of the last update (consumed events or not)
+        self.updated_at: Optional[float] = None
+        self.updated_at_text: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        """Changes whenever new events were consumed"""
+        return f"{self.last_record_id}:{self.events_consumed}"
+
+    def ingest(self, events: Optional[pd.DataFrame]) -> int:
+        """
+        Consume new batch events (record_id, batch_id, event, event_time_cst,
+        entity_involved, entity_name); returns the number of intervals added
+        """
+        with self._lock:
+            self.updated_at = time.monotonic()
+            self.updated_at_text = datetime.now().isoformat(timespec="seconds")
+            if events is None or events.empty:
+                return 0
+            return self._ingest(events)
+
+    def _ingest(self, events: pd.DataFrame) -> int:
+        times = events["event_time_cst"]
+        if not pd.api.types.is_datetime64_any_dtype(times.dtype):
+            times = pd.to_datetime(times, errors="coerce")
+        frame = pd.DataFrame({
+            "record_id": events["record_id"].to_numpy(),
+            "batch_id": events["batch_id"].astype(object).to_numpy(),
+            "event": events["event"].astype(object).to_numpy(),
+            "time": times.to_numpy(dtype="datetime64[s]"),
+            "entity_name": events["entity_name"].astype(object).fillna("Unknown").to_numpy(),
+            "entity_involved": events["entity_involved"].astype(object).fillna("Unknown").to_numpy(),
+        }).dropna(subset=["batch_id", "time"])
+        frame = frame.sort_values(["batch_id", "time", "record_id"], kind="stable").reset_index(drop=True)
+        self.last_record_id = max(self.last_record_id, int(events["record_id"].max()))
+        self.events_consumed += len(events)
+        if frame.empty:
+            return 0
+
+        # Each event's predecessor: the previous row of its batch, or the
+        # batch's latest event from earlier chunks for its first row here
+        batch = frame["batch_id"].to_numpy()
+        first = np.ones(len(frame), dtype=bool)
+        first[1:] = batch[1:] != batch[:-1]
+        prev_time = np.roll(frame["time"].to_numpy(), 1)
+        prev_name = np.roll(frame["entity_name"].to_numpy(), 1)
+        prev_type = np.roll(frame["entity_involved"].to_numpy(), 1)
+        has_prev = ~first
+        for position in np.flatnonzero(first):
+            latest = self._latest.get(batch[position])
+            if latest is not None:
+                prev_time[position], prev_name[position], prev_type[position] = latest
+                has_prev[position] = True
+
+        hours = (frame["time"].to_numpy() - prev_time) / np.timedelta64(1, "h")
+        # An event older than its predecessor arrived late; it cannot be placed in an interval
+        backwards = has_prev & (hours < 0)
+        self.out_of_order += int(backwards.sum())
+        valid = has_prev & ~backwards
+        intervals = pd.DataFrame({
+            "hours": hours[valid],
+            "from_entity": prev_name[valid],
+            "to_entity": frame["entity_name"].to_numpy()[valid],
+            "from_type": prev_type[valid],
+            "to_type": frame["entity_involved"].to_numpy()[valid],
+        })
+        at_entity = (intervals["from_entity"] == intervals["to_entity"]).to_numpy()
+        dwells = intervals[at_entity].rename(columns={"from_entity": "entity_name", "from_type": "entity_involved"})
+        legs = intervals[~at_entity]
+        for group, columns in GROUPS.items():
+            self._add(group, dwells if group.startswith("entit") else legs, columns)
+        self.intervals += len(intervals)
+
+        # Remember each batch's latest event; finished batches need no state
+        last = np.ones(len(frame), dtype=bool)
+        last[:-1] = batch[:-1] != batch[1:]
+        for row in frame[last].itertuples(index=False):
+            if row.event in TERMINAL_EVENTS:
+                self._latest.pop(row.batch_id, None)
+                continue
+            latest = self._latest.get(row.batch_id)
+            if latest is None or row.time >= latest[0]:
+                self._latest[row.batch_id] = (row.time, row.entity_name, row.entity_involved)
+        return len(intervals)
+
+    def _add(self, group: str, intervals: pd.DataFrame, columns: Tuple[str, ...]):
+        if intervals.empty:
+            return
+        sketches = self.sketches[group]
+        for key, values in intervals.groupby(list(columns), sort=False)["hours"]:
+            key = key if isinstance(key, tuple) else (key,)
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = QuantileSketch(self.relative_accuracy)
+            sketch.add(values.to_numpy())
+
+    def summary(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Every statistic as JSON-ready rows, slowest p90 first, with the consumption state"""
+        with self._lock:
+            result: Dict[str, Any] = {
+                "updated_at": self.updated_at_text,
+                "version": self.version,
+                "last_record_id": self.last_record_id,
+                "events_consumed": self.events_consumed,
+                "intervals": self.intervals,
+                "out_of_order_events": self.out_of_order,
+                "batches_in_progress": len(self._latest),
+                "relative_accuracy": self.relative_accuracy,
+            }
+            for group, columns in GROUPS.items():
+                rows: List[Dict[str, Any]] = [
+                    {**dict(zip(columns, key)), **sketch.summary()} for key, sketch in self.sketches[group].items()
+                ]
+                rows.sort(key=lambda row: (-(row["p90_hours"] or 0), -row["count"]))
+                result[group] = rows[:limit] if limit else rows
+            return result
@@ -0,0 +1,176 @@
+"""
+Fresh ETAs for in-transit shipments, recomputed on every snapshot refresh.
+
+time_remaining_to_destination_hours and expected_arrival_time are written
+upstream and go stale between its updates. Each refresh recomputes, for all
+in-transit rows in one NumPy pass:
+
+- the great-circle (haversine) distance from the reported position to the
+  destination, scaled by a road factor: the detour of the cached OSRM routes
+  to that destination when there are any, a fixed factor otherwise
+- the hours left at an average speed, counted from the position's timestamp
+- the ETA, how many hours it is away or already overdue, and whether the
+  shipment will arrive later than promised
+
+Destination coordinates are learned from the snapshot itself (delivered
+rows report their position at the destination) and remembered across
+refreshes, so no location table is needed.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import threading
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Columns the stage adds (missing / False outside in-transit rows)
+ETA_COLUMNS = ("remaining_distance_km", "eta_hours", "eta_time", "overdue_hours", "at_risk_of_delay")
+
+# Route endpoints within this distance of a destination count as ending there
+ROUTE_MATCH_KM = 2.0
+# Bounds of a plausible road detour
+MIN_ROAD_FACTOR = 1.0
+MAX_ROAD_FACTOR = 3.0
+
+# Destination name -> (latitude, longitude), as learned from earlier snapshots
+_destinations: Dict[str, Tuple[float, float]] = {}
+_destinations_lock = threading.Lock()
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km between arrays (or scalars) of points in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def route_length_km(coordinates: Sequence[Sequence[float]]) -> float:
+    """Length of a [[lat, lon], ...] polyline in km"""
+    points = np.asarray(coordinates, dtype=np.float64)
+    if len(points) < 2:
+        return 0.0
+    return float(haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1]).sum())
+
+
+def learn_destinations(df: pd.DataFrame) -> Dict[str, Tuple[float, float]]:
+    """
+    Coordinates per destination: the median position of rows located at it,
+    merged into the ones remembered from earlier snapshots
+    """
+    if not {"current_location", "destination", "latitude", "longitude"} <= set(df.columns):
+        return dict(_destinations)
+    destinations = set(df["destination"].dropna().unique())
+    at_destination = df["current_location"].isin(destinations)
+    learned = (
+        df.loc[at_destination, ["current_location", "latitude", "longitude"]]
+        .astype({"current_location": object})
+        .groupby("current_location")
+        .median()
+    )
+    with _destinations_lock:
+        for name, row in learned.iterrows():
+            if np.isfinite(row["latitude"]) and np.isfinite(row["longitude"]):
+                _destinations[name] = (float(row["latitude"]), float(row["longitude"]))
+        return dict(_destinations)
+
+
+def road_factors(routes: Iterable[Sequence[Sequence[float]]],
+                 destinations: Dict[str, Tuple[float, float]]) -> Tuple[Dict[str, float], Optional[float]]:
+    """
+    Road distance over straight-line distance of cached routes, as
+    (median per destination the routes end at, median over all routes)
+    """
+    names = list(destinations)
+    dest_coords = np.array([destinations[name] for name in names], dtype=np.float64).reshape(-1, 2)
+    per_destination: Dict[str, List[float]] = {}
+    factors = []
+    for coordinates in routes:
+        # Two points are the straight-line fallback of a failed OSRM call, not a road
+        if len(coordinates) < 3:
+            continue
+        (lat1, lon1), (lat2, lon2) = coordinates[0], coordinates[-1]
+        straight = float(haversine_km(lat1, lon1, lat2, lon2))
+        if straight < 1.0:
+            continue
+        factor = min(max(route_length_km(coordinates) / straight, MIN_ROAD_FACTOR), MAX_ROAD_FACTOR)
+        factors.append(factor)
+        if len(names):
+            distances = haversine_km(lat2, lon2, dest_coords[:, 0], dest_coords[:, 1])
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= ROUTE_MATCH_KM:
+                per_destination.setdefault(names[nearest], []).append(factor)
+    return (
+        {name: float(np.median(values)) for name, values in per_destination.items()},
+        float(np.median(factors)) if factors else None,
+    )
+
+
+def _as_datetimes(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(column.dtype):
+        return column
+    return pd.to_datetime(column, errors="coerce")
+
+
+def add_eta(df: pd.DataFrame, destinations: Dict[str, Tuple[float, float]], speed_kmh: float = 65.0,
+            road_factor: float = 1.3, destination_factors: Optional[Dict[str, float]] = None,
+            risk_margin_hours: float = 1.0, now: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    Add ETA_COLUMNS for the in-transit rows of an inventory frame (in place).
+
+    destination_factors overrides road_factor per destination. ETAs are
+    counted from each row's last_updated_cst; eta_hours is the time left
+    until the ETA and overdue_hours the time since it, for rows still in
+    transit past it. A row is at risk when it cannot arrive (at its ETA, or
+    now if that has passed) within risk_margin_hours of its
+    expected_arrival_time.
+    """
+    rows = len(df)
+    now = np.datetime64((now or datetime.now()).replace(microsecond=0), "s")
+    if "status_category" in df.columns:
+        in_transit = (df["status_category"] == "In Transit").to_numpy(dtype=bool, na_value=False)
+    else:
+        in_transit = df["status"].astype(str).str.contains("transit", case=False).to_numpy()
+
+    # Per-destination lookups, indexed by the destination's code
+    codes, names = pd.factorize(df["destination"])
+    dest_lat = np.full(len(names) + 1, np.nan)
+    dest_lon = np.full(len(names) + 1, np.nan)
+    factor = np.full(len(names) + 1, road_factor)
+    destination_factors = destination_factors or {}
+    for index, name in enumerate(names):
+        if name in destinations:
+            dest_lat[index], dest_lon[index] = destinations[name]
+        factor[index] = destination_factors.get(name, road_factor)
+    # Missing destinations have code -1, which picks the trailing NaN
+    distance = haversine_km(
+        df["latitude"].to_numpy(dtype=np.float64, na_value=np.nan),
+        df["longitude"].to_numpy(dtype=np.float64, na_value=np.nan),
+        dest_lat[codes], dest_lon[codes]
+    ) * factor[codes]
+    distance = np.where(in_transit, distance, np.nan)
+
+    travel_seconds = distance / speed_kmh * 3600
+    updated = _as_datetimes(df["last_updated_cst"]).to_numpy(dtype="datetime64[s]")
+    known = np.isfinite(travel_seconds) & ~np.isnat(updated)
+    arrival = updated + np.where(known, travel_seconds, 0).astype("timedelta64[s]")
+    # Minute resolution, like the source timestamps
+    eta = np.where(known, arrival.astype("datetime64[m]"), np.datetime64("NaT"))
+    hours_to_eta = np.where(known, (eta - now) / np.timedelta64(1, "h"), np.nan)
+
+    at_risk = np.zeros(rows, dtype=bool)
+    if "expected_arrival_time" in df.columns:
+        expected = _as_datetimes(df["expected_arrival_time"]).to_numpy(dtype="datetime64[s]")
+        # Still in transit past its ETA, a shipment arrives no earlier than now
+        earliest = np.maximum(eta.astype("datetime64[s]"), now)
+        late = earliest - expected > np.timedelta64(int(risk_margin_hours * 3600), "s")
+        at_risk = known & ~np.isnat(expected) & late
+
+    df["remaining_distance_km"] = np.round(distance, 1)
+    df["eta_hours"] = np.round(np.maximum(hours_to_eta, 0), 1)
+    df["eta_time"] = eta.astype("datetime64[s]")
+    df["overdue_hours"] = np.round(np.maximum(-hours_to_eta, 0), 1)
+    df["at_risk_of_delay"] = at_risk
+    return df
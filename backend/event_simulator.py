@@ -0,0 +1,288 @@
+"""
+Live event simulator for the local warehouse.
+Advances shipments through the status lifecycle at a steady rate, writing to
+the SQLite stand-in the API reads with DATA_BACKEND=local:
+
+- status transitions update the batch's inventory rows and append a
+  matching batch_events_v1 row
+- position updates move in-transit batches along their current leg
+- last_updated_cst, time remaining and expected arrival follow each write
+- delivered batches are relaunched as new shipments to keep the churn steady
+
+    python event_simulator.py --rate 50 --duration 300
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import random
+import sqlite3
+import time
+
+import numpy as np
+
+from local_warehouse import (
+    DEFAULT_PATH,
+    LOCATION_TABLES,
+    READABLE_FORMAT,
+    STATUS_LIFECYCLE,
+    STEP_ENTITIES,
+    TIMESTAMP_FORMAT,
+)
+
+DELIVERED_STEP = len(STATUS_LIFECYCLE) - 1
+# Steps that are legs between two sites, as (from location table, to location table)
+TRANSIT_LEGS = {0: ("supplier", "dock"), 2: ("dock", "dc"), 4: ("dc", "customer")}
+# Share of updates that are status transitions; the rest are position updates
+DEFAULT_TRANSITION_SHARE = 0.3
+# Hours of travel left per remaining lifecycle step, for time remaining estimates
+HOURS_PER_STEP = 18
+# Updates are written in small transactions this often
+TICK_SECONDS = 0.1
+
+
+class SimulatedBatch:
+    def __init__(self, batch_id: str, step: int, sites: Dict[str, str], product_id: str, product_name: str):
+        self.batch_id = batch_id
+        self.step = step
+        self.sites = sites
+        self.product_id = product_id
+        self.product_name = product_name
+        # Progress along the current leg, for in-transit steps
+        self.progress = 0.0
+
+
+class EventSimulator:
+    """
+    Mutates the local warehouse at a configurable number of updates per second.
+
+    State (each batch's step and route) is loaded from the store at start, so
+    the simulator can be stopped and restarted against the same file.
+    """
+
+    def __init__(self, path: Path = DEFAULT_PATH, rate: float = 10.0,
+                 transition_share: float = DEFAULT_TRANSITION_SHARE, seed: Optional[int] = None):
+        self.path = Path(path)
+        self.rate = rate
+        self.transition_share = transition_share
+        self.rng = random.Random(seed)
+        self.connection = sqlite3.connect(self.path)
+        # WAL lets the API keep reading while the simulator writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.batches: Dict[str, SimulatedBatch] = {}
+        self.next_event_id = 1
+        self.next_batch_number = 0
+        self.updates = 0
+        self.transitions = 0
+        self.moves = 0
+        self.relaunches = 0
+        self.write_seconds: List[float] = []
+        self.started_at = time.monotonic()
+        self._load_state()
+
+    def _load_state(self):
+        step_of = {status: step for step, status in enumerate(STATUS_LIFECYCLE)}
+        batch_rows = self.connection.execute(
+            "SELECT batch_id, MIN(status), MIN(destination), MIN(product_id), MIN(product_name) "
+            "FROM inventory_realtime_v1 GROUP BY batch_id"
+        ).fetchall()
+        sites_by_batch: Dict[str, Dict[str, str]] = {}
+        for batch_id, event, entity_name in self.connection.execute(
+            "SELECT batch_id, event, entity_name FROM batch_events_v1"
+        ):
+            step = step_of.get(event)
+            if step is not None:
+                sites_by_batch.setdefault(batch_id, {})[STEP_ENTITIES[step][1]] = entity_name
+
+        for batch_id, status, destination, product_id, product_name in batch_rows:
+            sites = self._random_route()
+            sites.update(sites_by_batch.get(batch_id, {}))
+            if destination in LOCATION_TABLES["customer"]:
+                sites["customer"] = destination
+            self.batches[batch_id] = SimulatedBatch(batch_id, step_of.get(status, 0), sites, product_id, product_name)
+
+        self.next_event_id = (self.connection.execute("SELECT MAX(record_id) FROM batch_events_v1").fetchone()[0] or 0) + 1
+        self.next_batch_number = len(self.batches)
+
+    def _random_route(self) -> Dict[str, str]:
+        return {name: self.rng.choice(list(table)) for name, table in LOCATION_TABLES.items()}
+
+    def _site_coords(self, batch: SimulatedBatch, table_name: str):
+        return LOCATION_TABLES[table_name][batch.sites[table_name]]
+
+    def _update_rows(self, batch: SimulatedBatch, now: datetime, latitude: float, longitude: float,
+                     current_location: str):
+        if batch.step == DELIVERED_STEP:
+            remaining, expected = None, None
+        else:
+            remaining = round((DELIVERED_STEP - batch.step - batch.progress) * HOURS_PER_STEP, 1)
+            expected = (now + timedelta(hours=remaining)).strftime(TIMESTAMP_FORMAT)
+        self.connection.execute(
+            """
+            UPDATE inventory_realtime_v1 SET
+                status = ?,
+                current_location = ?,
+                -- Small jitter so records of one batch do not stack on the map
+                latitude = ? + ((abs(random()) % 2001) - 1000) / 50000.0,
+                longitude = ? + ((abs(random()) % 2001) - 1000) / 50000.0,
+                time_remaining_to_destination_hours = ?,
+                expected_arrival_time = ?,
+                last_updated_cst = ?
+            WHERE batch_id = ?
+            """,
+            (STATUS_LIFECYCLE[batch.step], current_location, latitude, longitude, remaining, expected,
+             now.strftime(TIMESTAMP_FORMAT), batch.batch_id)
+        )
+
+    def _append_event(self, batch: SimulatedBatch, now: datetime):
+        entity_type, table_name = STEP_ENTITIES[batch.step]
+        entity_name = batch.sites[table_name]
+        latitude, longitude = LOCATION_TABLES[table_name][entity_name]
+        self.connection.execute(
+            "INSERT INTO batch_events_v1 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.next_event_id, batch.batch_id, batch.product_id, batch.product_name,
+             STATUS_LIFECYCLE[batch.step], now.strftime(TIMESTAMP_FORMAT), entity_type, entity_name,
+             entity_name.split(" - ")[-1], latitude, longitude, now.strftime(READABLE_FORMAT))
+        )
+        self.next_event_id += 1
+
+    def advance(self, batch: SimulatedBatch, now: datetime):
+        """Move a batch to its next lifecycle step"""
+        batch.step += 1
+        batch.progress = 0.0
+        table_name = STEP_ENTITIES[batch.step][1]
+        latitude, longitude = self._site_coords(batch, table_name)
+        self._update_rows(batch, now, latitude, longitude, batch.sites[table_name])
+        self._append_event(batch, now)
+        self.transitions += 1
+
+    def move(self, batch: SimulatedBatch, now: datetime):
+        """Move an in-transit batch further along its current leg"""
+        origin, target = TRANSIT_LEGS[batch.step]
+        batch.progress = min(0.95, batch.progress + self.rng.uniform(0.05, 0.25))
+        lat1, lon1 = self._site_coords(batch, origin)
+        lat2, lon2 = self._site_coords(batch, target)
+        latitude = lat1 + (lat2 - lat1) * batch.progress
+        longitude = lon1 + (lon2 - lon1) * batch.progress
+        self._update_rows(batch, now, latitude, longitude, batch.sites[origin])
+        self.moves += 1
+
+    def relaunch(self, delivered: List[SimulatedBatch], now: datetime):
+        """Turn a delivered batch into a new shipment leaving its supplier"""
+        batch = self.rng.choice(delivered)
+        del self.batches[batch.batch_id]
+        new_id = f"SIM-{self.next_batch_number:06d}"
+        self.next_batch_number += 1
+        sites = self._random_route()
+        self.connection.execute(
+            "UPDATE inventory_realtime_v1 SET batch_id = ?, destination = ? WHERE batch_id = ?",
+            (new_id, sites["customer"], batch.batch_id)
+        )
+        batch.batch_id = new_id
+        batch.sites = sites
+        batch.step = 0
+        batch.progress = 0.0
+        latitude, longitude = self._site_coords(batch, "supplier")
+        self._update_rows(batch, now, latitude, longitude, batch.sites["supplier"])
+        self._append_event(batch, now)
+        self.batches[new_id] = batch
+        self.relaunches += 1
+
+    def apply_updates(self, count: int):
+        """Apply count updates in one transaction"""
+        if count <= 0:
+            return
+        start = time.perf_counter()
+        now = datetime.now()
+        active = [b for b in self.batches.values() if b.step < DELIVERED_STEP]
+        in_transit = [b for b in active if b.step in TRANSIT_LEGS]
+        with self.connection:
+            for _ in range(count):
+                if not active:
+                    break
+                if in_transit and self.rng.random() >= self.transition_share:
+                    self.move(self.rng.choice(in_transit), now)
+                else:
+                    batch = self.rng.choice(active)
+                    self.advance(batch, now)
+                    if batch.step == DELIVERED_STEP:
+                        active.remove(batch)
+                        if batch in in_transit:
+                            in_transit.remove(batch)
+                        # Keep the number of shipments in flight steady
+                        delivered = [b for b in self.batches.values() if b.step == DELIVERED_STEP and b is not batch]
+                        if delivered:
+                            self.relaunch(delivered, now)
+                    elif batch.step in TRANSIT_LEGS:
+                        if batch not in in_transit:
+                            in_transit.append(batch)
+                    elif batch in in_transit:
+                        in_transit.remove(batch)
+                self.updates += 1
+        self.write_seconds.append(time.perf_counter() - start)
+
+    def run(self, duration: Optional[float] = None, report_every: float = 10.0):
+        """Write at self.rate updates per second until duration passes (or forever)"""
+        started = self.started_at = time.monotonic()
+        last_report = started
+        owed = 0.0
+        next_tick = started
+        while duration is None or time.monotonic() - started < duration:
+            owed += self.rate * TICK_SECONDS
+            count = int(owed)
+            owed -= count
+            self.apply_updates(count)
+            next_tick += TICK_SECONDS
+            now = time.monotonic()
+            if now - last_report >= report_every:
+                stats = self.stats()
+                print(f"{stats['updates']} updates ({stats['achieved_rate']}/s), "
+                      f"write p50 {stats['write_p50_ms']} ms, p99 {stats['write_p99_ms']} ms")
+                last_report = now
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+        return self.stats()
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self.started_at
+        writes = np.array(self.write_seconds or [0.0]) * 1000
+        return {
+            "target_rate": self.rate,
+            "achieved_rate": round(self.updates / elapsed, 2) if elapsed > 0 else 0.0,
+            "updates": self.updates,
+            "transitions": self.transitions,
+            "moves": self.moves,
+            "relaunches": self.relaunches,
+            "write_p50_ms": round(float(np.percentile(writes, 50)), 3),
+            "write_p99_ms": round(float(np.percentile(writes, 99)), 3),
+        }
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate live shipment updates in the local warehouse")
+    parser.add_argument("--path", type=Path, default=DEFAULT_PATH, help="Local warehouse SQLite file")
+    parser.add_argument("--rate", type=float, default=10.0, help="Updates per second")
+    parser.add_argument("--duration", type=float, help="Seconds to run (default: until interrupted)")
+    parser.add_argument("--transition-share", type=float, default=DEFAULT_TRANSITION_SHARE,
+                        help="Share of updates that are status transitions (the rest move in-transit batches)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stats-output", type=Path, help="Write final stats as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        raise SystemExit(f"{args.path} does not exist; seed it with: python local_warehouse.py --rows 1000")
+
+    simulator = EventSimulator(args.path, args.rate, args.transition_share, args.seed)
+    try:
+        final_stats = simulator.run(args.duration)
+    except KeyboardInterrupt:
+        final_stats = simulator.stats()
+    finally:
+        simulator.close()
+    print(json.dumps(final_stats))
+    if args.stats_output:
+        args.stats_output.write_text(json.dumps(final_stats, indent=2))
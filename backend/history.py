@@ -0,0 +1,282 @@
+"""
+History of inventory summaries on local disk, with daily and monthly rollups.
+
+A summary point (shipments and units per status category, delayed and
+at-risk shipments, on-time share) is appended periodically to a
+date-partitioned Parquet store:
+
+    raw/date=2026-10-19/points.parquet     one row per snapshot taken that day
+    rollups/daily.parquet                  one row per day
+    rollups/monthly.parquet                one row per calendar month
+
+An append rewrites only its own day's partition, recomputes that day's
+rollup from it and that month's rollup from the month's daily rows, so its
+cost does not grow with the history. The rollups (a row per day, a few
+hundred rows a year) are held in memory, and trend queries read them
+without touching the raw points or the warehouse. Raw partitions older than
+the retention are deleted; their rollups are kept.
+"""
+
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import fcntl
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from aggregates import delayed_mask
+
+# Metrics of a summary point
+METRICS = (
+    "shipments",
+    "units",
+    "value",
+    "in_transit",
+    "at_dock",
+    "at_dc",
+    "delivered",
+    "active_shipments",
+    "active_units",
+    "delayed_shipments",
+    "at_risk_shipments",
+    "delayed_pct",
+    "on_time_pct",
+)
+# Statistics of each metric in the rollups, as <metric>_<stat> columns
+STATS = ("mean", "min", "max", "last")
+GRANULARITIES = ("daily", "monthly")
+
+
+def summary_point(df: pd.DataFrame) -> Dict[str, float]:
+    """One history point from an inventory snapshot (status categories, and ETAs when present)"""
+    qty = pd.to_numeric(df["qty"], errors="coerce").fillna(0)
+    price = pd.to_numeric(df["unit_price"], errors="coerce").fillna(0) if "unit_price" in df.columns else 0
+    category = df["status_category"].astype(object) if "status_category" in df.columns else pd.Series("", index=df.index)
+    active = (category != "Delivered").to_numpy()
+    delayed = active & delayed_mask(df).to_numpy()
+    at_risk = np.zeros(len(df), dtype=bool)
+    if "at_risk_of_delay" in df.columns:
+        at_risk = active & df["at_risk_of_delay"].to_numpy(dtype=bool, na_value=False)
+    counts = category.value_counts()
+    active_shipments = int(active.sum())
+    return {
+        "shipments": len(df),
+        "units": int(qty.sum()),
+        "value": round(float((qty * price).sum()), 2),
+        "in_transit": int(counts.get("In Transit", 0)),
+        "at_dock": int(counts.get("At Dock", 0)),
+        "at_dc": int(counts.get("At DC", 0)),
+        "delivered": int(counts.get("Delivered", 0)),
+        "active_shipments": active_shipments,
+        "active_units": int(qty[active].sum()),
+        "delayed_shipments": int(delayed.sum()),
+        "at_risk_shipments": int(at_risk.sum()),
+        "delayed_pct": round(100 * delayed.sum() / active_shipments, 2) if active_shipments else 0.0,
+        "on_time_pct": round(100 * (1 - (delayed | at_risk).sum() / active_shipments), 2) if active_shipments else 100.0,
+    }
+
+
+def last_months(count: int, today: Optional[date] = None) -> List[Tuple[str, str]]:
+    """The last count calendar months up to the current one, oldest first, as ("YYYY-MM", "Mon")"""
+    today = today or date.today()
+    months = []
+    for offset in range(count - 1, -1, -1):
+        year, month = divmod(today.year * 12 + today.month - 1 - offset, 12)
+        first_day = date(year, month + 1, 1)
+        months.append((first_day.strftime("%Y-%m"), first_day.strftime("%b")))
+    return months
+
+
+def _rollup_points(points: pd.DataFrame, period: str) -> Dict[str, Any]:
+    """A daily rollup row from one day's points (ordered by time)"""
+    row: Dict[str, Any] = {
+        "period": period,
+        "snapshots": len(points),
+        "first_at": points["at"].iloc[0],
+        "last_at": points["at"].iloc[-1],
+    }
+    for metric in METRICS:
+        values = points[metric].astype(float)
+        row.update({
+            f"{metric}_mean": float(values.mean()),
+            f"{metric}_min": float(values.min()),
+            f"{metric}_max": float(values.max()),
+            f"{metric}_last": float(values.iloc[-1]),
+        })
+    return row
+
+
+def _rollup_days(days: pd.DataFrame, period: str) -> Dict[str, Any]:
+    """A monthly rollup row from its daily rows (ordered by day); means are weighted by snapshots"""
+    weights = days["snapshots"].astype(float)
+    row: Dict[str, Any] = {
+        "period": period,
+        "snapshots": int(weights.sum()),
+        "first_at": days["first_at"].iloc[0],
+        "last_at": days["last_at"].iloc[-1],
+    }
+    for metric in METRICS:
+        row.update({
+            f"{metric}_mean": float(np.average(days[f"{metric}_mean"], weights=weights)),
+            f"{metric}_min": float(days[f"{metric}_min"].min()),
+            f"{metric}_max": float(days[f"{metric}_max"].max()),
+            f"{metric}_last": float(days[f"{metric}_last"].iloc[-1]),
+        })
+    return row
+
+
+def _upsert(rollups: pd.DataFrame, row: Dict[str, Any]) -> pd.DataFrame:
+    rollups = rollups[rollups["period"] != row["period"]] if len(rollups) else rollups
+    return pd.concat([rollups, pd.DataFrame([row])], ignore_index=True).sort_values("period", ignore_index=True)
+
+
+class HistoryStore:
+    """The history directory: raw points per day and the rollups, loaded into memory. Thread-safe."""
+
+    def __init__(self, directory: Path, raw_retention_days: int = 90):
+        self.directory = Path(directory)
+        self.raw_directory = self.directory / "raw"
+        self.rollup_directory = self.directory / "rollups"
+        self.raw_directory.mkdir(parents=True, exist_ok=True)
+        self.rollup_directory.mkdir(parents=True, exist_ok=True)
+        self.raw_retention_days = raw_retention_days
+        self._rollups: Dict[str, pd.DataFrame] = {}
+        # Modification time of each rollup file as loaded; another worker's append changes it
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._lock = threading.Lock()
+        with self._locked():
+            if not (self.rollup_directory / "daily.parquet").exists() and any(self.raw_directory.iterdir()):
+                self.rebuild()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Workers sharing the directory append one at a time
+        with self._lock, open(self.directory / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, df: pd.DataFrame, path: Path):
+        """Write a frame to a temporary name, then rename it into place"""
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def _partition(self, day: str) -> Path:
+        return self.raw_directory / f"date={day}" / "points.parquet"
+
+    def _rollup_path(self, granularity: str) -> Path:
+        return self.rollup_directory / f"{granularity}.parquet"
+
+    def _load_rollups(self, granularity: str) -> pd.DataFrame:
+        """The rollups held in memory, reloaded when the file changed since they were read"""
+        path = self._rollup_path(granularity)
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if granularity not in self._rollups or self._mtimes.get(granularity) != mtime:
+            self._rollups[granularity] = pd.read_parquet(path) if mtime is not None else pd.DataFrame()
+            self._mtimes[granularity] = mtime
+        return self._rollups[granularity]
+
+    def _store_rollups(self, granularity: str, rollups: pd.DataFrame):
+        path = self._rollup_path(granularity)
+        self._write(rollups, path)
+        self._rollups[granularity] = rollups
+        self._mtimes[granularity] = path.stat().st_mtime
+
+    def append(self, point: Dict[str, float], at: Optional[datetime] = None, min_interval_seconds: float = 0) -> bool:
+        """
+        Append a summary point taken at a time (default now) and update its day's and month's rollups.
+
+        Skipped, returning False, when the day's latest point is less than
+        min_interval_seconds older (another worker recorded it).
+        """
+        at = (at or datetime.now()).replace(microsecond=0)
+        day = at.strftime("%Y-%m-%d")
+        row = pd.DataFrame([{"at": pd.Timestamp(at), **{metric: float(point[metric]) for metric in METRICS}}])
+        with self._locked():
+            partition = self._partition(day)
+            if partition.exists():
+                points = pd.read_parquet(partition)
+                if min_interval_seconds and (at - points["at"].max()).total_seconds() < min_interval_seconds:
+                    return False
+                points = pd.concat([points, row], ignore_index=True).sort_values("at", ignore_index=True)
+            else:
+                partition.parent.mkdir(parents=True, exist_ok=True)
+                points = row
+            self._write(points, partition)
+            self._update_rollups(day, points)
+            self._prune(at.date())
+        return True
+
+    def _update_rollups(self, day: str, points: pd.DataFrame):
+        daily = _upsert(self._load_rollups("daily"), _rollup_points(points, day))
+        self._store_rollups("daily", daily)
+        month = day[:7]
+        days = daily[daily["period"].str.startswith(month)]
+        self._store_rollups("monthly", _upsert(self._load_rollups("monthly"), _rollup_days(days, month)))
+
+    def _prune(self, today: date):
+        if self.raw_retention_days <= 0:
+            return
+        for path in self.raw_directory.glob("date=*"):
+            try:
+                day = date.fromisoformat(path.name[len("date="):])
+            except ValueError:
+                continue
+            if (today - day).days > self.raw_retention_days:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def rebuild(self):
+        """Recompute every rollup from the raw partitions (when the rollup files are missing)"""
+        daily = pd.DataFrame()
+        for partition in sorted(self.raw_directory.glob("date=*/points.parquet")):
+            points = pd.read_parquet(partition).sort_values("at", ignore_index=True)
+            if len(points):
+                daily = _upsert(daily, _rollup_points(points, partition.parent.name[len("date="):]))
+        if daily.empty:
+            return
+        monthly = pd.DataFrame()
+        for month, days in daily.groupby(daily["period"].str[:7], sort=True):
+            monthly = _upsert(monthly, _rollup_days(days, month))
+        self._store_rollups("daily", daily)
+        self._store_rollups("monthly", monthly)
+        print(f"Rebuilt history rollups from {len(daily)} days of raw points")
+
+    def rollups(self, granularity: str, limit: Optional[int] = None) -> pd.DataFrame:
+        """Rollup rows, oldest first (the latest limit periods); do not mutate"""
+        with self._lock:
+            rollups = self._load_rollups(granularity)
+        return rollups.tail(limit) if limit else rollups
+
+    def monthly_values(self, months: List[str], metric: str, stat: str = "mean") -> Dict[str, float]:
+        """A metric's statistic for each of the given months ("YYYY-MM") that has history"""
+        rollups = self.rollups("monthly")
+        if rollups.empty:
+            return {}
+        rows = rollups[rollups["period"].isin(months)]
+        return dict(zip(rows["period"], rows[f"{metric}_{stat}"].astype(float)))
+
+    def status(self) -> Dict[str, Any]:
+        daily = self.rollups("daily")
+        return {
+            "directory": str(self.directory),
+            "raw_days": sum(1 for _ in self.raw_directory.glob("date=*")),
+            "raw_retention_days": self.raw_retention_days,
+            "daily_rollups": len(daily),
+            "monthly_rollups": len(self.rollups("monthly")),
+            "last_snapshot_at": daily["last_at"].iloc[-1].isoformat() if len(daily) else None,
+        }
@@ -0,0 +1,397 @@
+"""
+Local stand-in for the Databricks SQL warehouse.
+A SQLite file seeded with synthetic inventory_realtime_v1 and batch_events_v1
+data, exposed through the subset of the databricks-sql connection API that
+main.py uses (connect → cursor → execute → fetchall_arrow).
+
+Enable it with DATA_BACKEND=local. Seed a database of a given size with:
+    python local_warehouse.py --rows 100000
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import re
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+DEFAULT_PATH = Path(__file__).parent / "local_warehouse.db"
+
+# Shipment lifecycle, in order; batch_events rows use these as event names
+STATUS_LIFECYCLE = [
+    "In Transit from Supplier",
+    "At Dock",
+    "In Transit to DC",
+    "At DC",
+    "In Transit to Customer",
+    "Delivered",
+]
+
+# Known locations: name -> (latitude, longitude)
+SUPPLIERS: Dict[str, Tuple[float, float]] = {
+    "Supplier Alpha - Monterrey, MX": (25.6866, -100.3161),
+    "Supplier Beta - Toronto, ON": (43.6532, -79.3832),
+    "Supplier Gamma - San Jose, CA": (37.3382, -121.8863),
+    "Supplier Delta - Detroit, MI": (42.3314, -83.0458),
+    "Supplier Epsilon - Guadalajara, MX": (20.6597, -103.3496),
+}
+DOCKS: Dict[str, Tuple[float, float]] = {
+    "Port of Long Beach": (33.7542, -118.2165),
+    "Port of Houston": (29.7283, -95.2683),
+    "Port of Savannah": (32.0835, -81.0998),
+    "Port of New York and New Jersey": (40.6681, -74.1514),
+    "Port of Seattle": (47.5801, -122.3459),
+}
+DISTRIBUTION_CENTERS: Dict[str, Tuple[float, float]] = {
+    "DC Dallas": (32.7767, -96.7970),
+    "DC Chicago": (41.8781, -87.6298),
+    "DC Atlanta": (33.7490, -84.3880),
+    "DC Reno": (39.5296, -119.8138),
+    "DC Columbus": (39.9612, -82.9988),
+}
+CUSTOMERS: Dict[str, Tuple[float, float]] = {
+    "Customer - Denver, CO": (39.7392, -104.9903),
+    "Customer - Phoenix, AZ": (33.4484, -112.0740),
+    "Customer - Miami, FL": (25.7617, -80.1918),
+    "Customer - Boston, MA": (42.3601, -71.0589),
+    "Customer - Minneapolis, MN": (44.9778, -93.2650),
+    "Customer - Nashville, TN": (36.1627, -86.7816),
+    "Customer - Portland, OR": (45.5152, -122.6784),
+    "Customer - Charlotte, NC": (35.2271, -80.8431),
+}
+KNOWN_LOCATIONS: Dict[str, Tuple[float, float]] = {
+    **SUPPLIERS, **DOCKS, **DISTRIBUTION_CENTERS, **CUSTOMERS
+}
+
+# Product name -> unit price
+PRODUCTS: Dict[str, float] = {
+    "Industrial Pump Assembly": 1250.00,
+    "Hydraulic Valve Kit": 340.50,
+    "Steel Bearing Set": 85.25,
+    "Control Panel Module": 2150.00,
+    "Copper Wiring Spool": 120.75,
+    "Pressure Sensor Unit": 410.00,
+    "Conveyor Belt Segment": 675.40,
+    "Electric Motor 5HP": 980.00,
+    "Filter Cartridge Pack": 45.90,
+    "Gearbox Housing": 1540.00,
+    "Thermal Insulation Roll": 62.30,
+    "Safety Relay Switch": 150.10,
+}
+
+# Average number of inventory records per batch
+RECORDS_PER_BATCH = 20
+DELAYED_FRACTION = 0.15
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+READABLE_FORMAT = "%b %d, %Y %I:%M %p"
+
+LOCATION_TABLES = {
+    "supplier": SUPPLIERS,
+    "dock": DOCKS,
+    "dc": DISTRIBUTION_CENTERS,
+    "customer": CUSTOMERS,
+}
+
+# Entity involved at each lifecycle step, as (entity type, LOCATION_TABLES key)
+STEP_ENTITIES = [
+    ("Supplier", "supplier"),
+    ("Dock", "dock"),
+    ("Dock", "dock"),
+    ("Distribution Center", "dc"),
+    ("Distribution Center", "dc"),
+    ("Customer", "customer"),
+]
+
+INVENTORY_COLUMNS = [
+    ("record_id", "INTEGER"),
+    ("reference_number", "TEXT"),
+    ("product_id", "TEXT"),
+    ("product_name", "TEXT"),
+    ("status", "TEXT"),
+    ("qty", "INTEGER"),
+    ("unit_price", "REAL"),
+    ("current_location", "TEXT"),
+    ("latitude", "REAL"),
+    ("longitude", "REAL"),
+    ("destination", "TEXT"),
+    ("time_remaining_to_destination_hours", "REAL"),
+    ("last_updated_cst", "TEXT"),
+    ("expected_arrival_time", "TEXT"),
+    ("batch_id", "TEXT"),
+    ("transit_status", "TEXT"),
+]
+BATCH_EVENT_COLUMNS = [
+    ("record_id", "INTEGER"),
+    ("batch_id", "TEXT"),
+    ("product_id", "TEXT"),
+    ("product_name", "TEXT"),
+    ("event", "TEXT"),
+    ("event_time_cst", "TEXT"),
+    ("entity_involved", "TEXT"),
+    ("entity_name", "TEXT"),
+    ("entity_location", "TEXT"),
+    ("entity_latitude", "REAL"),
+    ("entity_longitude", "REAL"),
+    ("event_time_cst_readable", "TEXT"),
+]
+
+
+def _pick(rng: np.random.Generator, names: List[str], size: int) -> np.ndarray:
+    return np.array(names, dtype=object)[rng.integers(0, len(names), size)]
+
+
+def _coords(names: np.ndarray, table: Dict[str, Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+    lookup = {name: i for i, name in enumerate(table)}
+    points = np.array(list(table.values()))
+    index = np.array([lookup[name] for name in names], dtype=np.int64)
+    return points[index, 0], points[index, 1]
+
+
+def generate_data(rows: int, seed: int = 0, now: Optional[datetime] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Generate synthetic inventory and batch event tables.
+
+    Records are grouped into batches of about RECORDS_PER_BATCH; every record
+    in a batch shares its product, route and lifecycle status. Each batch has
+    one event per lifecycle step it has reached.
+
+    Args:
+        rows: Number of inventory records
+        seed: Random seed, so runs are reproducible
+        now: Reference time for timestamps (default: now, rounded to the minute)
+
+    Returns:
+        (inventory, batch_events) DataFrames with the warehouse column names
+    """
+    rng = np.random.default_rng(seed)
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    batch_count = max(1, rows // RECORDS_PER_BATCH)
+
+    # Per-batch attributes
+    product_names = list(PRODUCTS)
+    batch_product = rng.integers(0, len(product_names), batch_count)
+    batch_supplier = _pick(rng, list(SUPPLIERS), batch_count)
+    batch_dock = _pick(rng, list(DOCKS), batch_count)
+    batch_dc = _pick(rng, list(DISTRIBUTION_CENTERS), batch_count)
+    batch_customer = _pick(rng, list(CUSTOMERS), batch_count)
+    batch_step = rng.integers(0, len(STATUS_LIFECYCLE), batch_count)
+    batch_delayed = rng.random(batch_count) < DELAYED_FRACTION
+    # Hours from the previous lifecycle step to each step, and since the latest one
+    step_hours = rng.uniform(6, 48, (batch_count, len(STATUS_LIFECYCLE)))
+    step_hours[:, 0] = 0
+    hours_to_latest = np.take_along_axis(np.cumsum(step_hours, axis=1), batch_step[:, None], axis=1)[:, 0]
+    hours_since_update = rng.uniform(0.5, 12, batch_count)
+    last_updated = [now - timedelta(hours=float(h)) for h in hours_since_update]
+    batch_start = [last_updated[b] - timedelta(hours=float(hours_to_latest[b])) for b in range(batch_count)]
+    batch_ids = np.array([f"BATCH-{i:06d}" for i in range(batch_count)], dtype=object)
+
+    locations = {
+        "supplier": batch_supplier,
+        "dock": batch_dock,
+        "dc": batch_dc,
+        "customer": batch_customer,
+    }
+    # Current location per batch: the entity of its latest lifecycle step
+    current_location = np.empty(batch_count, dtype=object)
+    for step, (_, table_name) in enumerate(STEP_ENTITIES):
+        mask = batch_step == step
+        current_location[mask] = locations[table_name][mask]
+    current_lat, current_lon = _coords(current_location, KNOWN_LOCATIONS)
+
+    # Per-record attributes
+    record_batch = np.sort(rng.integers(0, batch_count, rows))
+    statuses = np.array(STATUS_LIFECYCLE, dtype=object)
+    record_step = batch_step[record_batch]
+    delivered = record_step == len(STATUS_LIFECYCLE) - 1
+    remaining_hours = np.round(
+        np.where(delivered, np.nan, (len(STATUS_LIFECYCLE) - 1 - record_step) * 18 + rng.uniform(0, 12, rows)), 1
+    )
+    remaining_hours = np.where(batch_delayed[record_batch] & ~delivered, remaining_hours + 24, remaining_hours)
+    last_updated_text = np.array([t.strftime(TIMESTAMP_FORMAT) for t in last_updated], dtype=object)
+    expected_arrival = np.array(
+        [None if np.isnan(h) else (now + timedelta(hours=float(h))).strftime(TIMESTAMP_FORMAT) for h in remaining_hours],
+        dtype=object
+    )
+    product_index = batch_product[record_batch]
+    product_prices = np.array(list(PRODUCTS.values()))
+
+    inventory = pd.DataFrame({
+        "record_id": np.arange(1, rows + 1, dtype=np.int64),
+        "reference_number": [f"REF-{i:08d}" for i in range(1, rows + 1)],
+        "product_id": [f"PRD-{i:03d}" for i in product_index],
+        "product_name": np.array(product_names, dtype=object)[product_index],
+        "status": statuses[record_step],
+        "qty": rng.integers(1, 500, rows),
+        "unit_price": product_prices[product_index],
+        "current_location": current_location[record_batch],
+        # Small jitter so records at one site do not stack on the map
+        "latitude": np.round(current_lat[record_batch] + rng.normal(0, 0.02, rows), 6),
+        "longitude": np.round(current_lon[record_batch] + rng.normal(0, 0.02, rows), 6),
+        "destination": batch_customer[record_batch],
+        "time_remaining_to_destination_hours": remaining_hours,
+        "last_updated_cst": last_updated_text[record_batch],
+        "expected_arrival_time": expected_arrival,
+        "batch_id": batch_ids[record_batch],
+        "transit_status": np.where(batch_delayed[record_batch], "Delayed", "On Time").astype(object),
+    })
+
+    # One event per lifecycle step reached, per batch
+    event_rows = []
+    record_id = 1
+    for b in range(batch_count):
+        event_time = batch_start[b]
+        product_name = product_names[batch_product[b]]
+        for step in range(batch_step[b] + 1):
+            event_time = event_time + timedelta(hours=float(step_hours[b, step]))
+            entity_type, table_name = STEP_ENTITIES[step]
+            entity_name = locations[table_name][b]
+            latitude, longitude = LOCATION_TABLES[table_name][entity_name]
+            event_rows.append((
+                record_id,
+                batch_ids[b],
+                f"PRD-{batch_product[b]:03d}",
+                product_name,
+                STATUS_LIFECYCLE[step],
+                event_time.strftime(TIMESTAMP_FORMAT),
+                entity_type,
+                entity_name,
+                entity_name.split(" - ")[-1],
+                latitude,
+                longitude,
+                event_time.strftime(READABLE_FORMAT),
+            ))
+            record_id += 1
+    batch_events = pd.DataFrame(event_rows, columns=[name for name, _ in BATCH_EVENT_COLUMNS])
+
+    return inventory, batch_events
+
+
+def _rows(df: pd.DataFrame):
+    """Rows as plain Python tuples with NaN as None"""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def seed_database(path: Path = DEFAULT_PATH, rows: int = 1000, seed: int = 0) -> Path:
+    """Create (or replace) the local warehouse file with synthetic data"""
+    inventory, batch_events = generate_data(rows, seed)
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        for table, columns, df in [
+            ("inventory_realtime_v1", INVENTORY_COLUMNS, inventory),
+            ("batch_events_v1", BATCH_EVENT_COLUMNS, batch_events),
+        ]:
+            column_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in columns)
+            connection.execute(f"CREATE TABLE {table} ({column_sql})")
+            placeholders = ", ".join("?" for _ in columns)
+            connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", _rows(df))
+        connection.execute("CREATE INDEX idx_inventory_batch ON inventory_realtime_v1 (batch_id)")
+        connection.execute("CREATE INDEX idx_batch_events_batch ON batch_events_v1 (batch_id, event_time_cst)")
+        connection.commit()
+    finally:
+        connection.close()
+    tmp_path.replace(path)
+    return path
+
+
+# catalog.schema.table -> table; the local file has no catalogs
+_QUALIFIED_TABLE = re.compile(r"\b[\w`]+\.[\w`]+\.(inventory_realtime_v1|batch_events_v1)\b")
+# Delta's DESCRIBE HISTORY, for the table version checks
+_DESCRIBE_HISTORY = re.compile(r"^\s*DESCRIBE\s+HISTORY\s+(\w+)\s+LIMIT\s+1\s*$", re.IGNORECASE)
+# The file keeps no table history: the version is derived from the rows. Every
+# inventory write sets last_updated_cst and events are only appended, so these
+# change with each write (inventory writes within the same second excepted)
+_TABLE_VERSIONS = {
+    "inventory_realtime_v1": "SELECT COUNT(*) || ':' || MAX(last_updated_cst) AS version FROM inventory_realtime_v1",
+    "batch_events_v1": "SELECT COUNT(*) || ':' || MAX(record_id) AS version FROM batch_events_v1",
+}
+
+
+class LocalCursor:
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self._cursor = connection.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def execute(self, operation: str, parameters=None):
+        operation = _QUALIFIED_TABLE.sub(r"\1", operation)
+        history = _DESCRIBE_HISTORY.match(operation)
+        if history:
+            operation = _TABLE_VERSIONS[history.group(1)]
+        self._cursor.execute(operation, parameters or ())
+        return self
+
+    def fetchall_arrow(self) -> pa.Table:
+        names = [column[0] for column in self._cursor.description or []]
+        rows = self._cursor.fetchall()
+        if not rows:
+            return pa.table({name: pa.array([], pa.string()) for name in names})
+        columns = list(zip(*rows))
+        return pa.table({name: pa.array(values) for name, values in zip(names, columns)})
+
+    def cancel(self):
+        """Abort the running statement (callable from another thread)"""
+        self._connection.interrupt()
+
+    def close(self):
+        self._cursor.close()
+
+
+class LocalConnection:
+    def __init__(self, path: Path):
+        self._connection = sqlite3.connect(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def cursor(self) -> LocalCursor:
+        return LocalCursor(self._connection)
+
+    def close(self):
+        self._connection.close()
+
+
+_seed_lock = threading.Lock()
+
+
+def connect(path: Path = DEFAULT_PATH, rows: int = 1000, **_ignored) -> LocalConnection:
+    """
+    Open the local warehouse, seeding it with `rows` records if the file is missing.
+
+    Accepts (and ignores) the databricks-sql connection arguments.
+    """
+    path = Path(path)
+    if not path.exists():
+        # Concurrent first queries (e.g. the startup warm-up) seed the file once
+        with _seed_lock:
+            if not path.exists():
+                seed_database(path, rows)
+    return LocalConnection(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the local warehouse with synthetic data")
+    parser.add_argument("--rows", type=int, default=1000, help="Number of inventory records")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--path", type=Path, default=DEFAULT_PATH, help="SQLite file to write")
+    args = parser.parse_args()
+    seed_database(args.path, args.rows, args.seed)
+    print(f"Seeded {args.path} with {args.rows} inventory records")
@@ -1,44 +1,169 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from databricks import sql
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 from functools import lru_cache
-import yaml
+from urllib.parse import parse_qsl
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import json
+import asyncio
+import importlib
+import re
+import tempfile
+import threading
+import time
 
 from system_prompts import (
+    DEFAULT_PROMPT_TOKEN_BUDGET,
     build_executive_dashboard_system_prompt,
     build_realtime_snapshot_system_prompt,
-    build_shipment_tracking_system_prompt
+    build_shipment_tracking_system_prompt,
+    estimate_message_tokens,
+    estimate_tokens
 )
+from completion_cache import CompletionCache, iter_replay_chunks
+from chat_sessions import ChatSessionStore
+from admission import AdmissionRejected, AdmissionTicket, ModelAdmissionController
+from cache_backends import create_cache_backend
+from cache_persistence import CachePersistence, PersistedEntry
+from compression import CompressionMiddleware
+from static_assets import StaticAssetServer
+from aggregates import GROUP_COLUMNS, METRICS, parse_fields, rollup_response
+from arrow_snapshots import ArrowSnapshotStore
+from bulkheads import Bulkhead, BulkheadRejected
+from columnar import compact_frame, frame_to_records, memory_report
+from dwell import DwellAnalytics
+from history import GRANULARITIES, HistoryStore, last_months, summary_point
+import eta
+from queries import TABLE_VERSION_QUERIES, BoundQuery, QueryRegistry, parse_timeouts, query_name, table_tag
+from resilience import CircuitBreaker, CircuitOpenError, RequestScopeMiddleware, guarded_statement, mark_stale
+import telemetry
+from telemetry import LLMStreamTimer, TimedJSONResponse, mark_span, record_cache_event, span, stage_timer
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Supply Chain Tracking API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the caches in the background; /api/ready reports when they are warm"""
+    # Persisted cache entries first, so the warm-up finds them
+    await cache_persister.restore()
+    warmup.start()
+    table_watcher.start()
+    cache_persister.start()
+    history_recorder.start()
+    static_variants_task = None
+    if static_assets is not None and STATIC_PRECOMPRESS:
+        # Compress the build's files once, off the request path; served uncompressed until then
+        static_variants_task = asyncio.create_task(asyncio.to_thread(static_assets.generate_variants))
+    yield
+    if static_variants_task is not None:
+        # The thread cannot be cancelled: stop it after the file it is on (writes are atomic)
+        static_assets.stop_generating()
+        try:
+            await static_variants_task
+        except Exception as e:
+            print(f"Error compressing static files: {e}")
+    await history_recorder.stop()
+    await cache_persister.stop()
+    await table_watcher.stop()
+    await warmup.stop()
+
+app = FastAPI(title="Supply Chain Tracking API", default_response_class=TimedJSONResponse, lifespan=lifespan)
 
 # Get the path to Flutter web build
 FLUTTER_BUILD_PATH = Path(__file__).parent.parent / "supply_chain_tracker" / "build" / "web"
+# Generate missing gzip (and, with the brotli package, brotli) variants of the build's files
+STATIC_PRECOMPRESS = os.getenv("STATIC_PRECOMPRESS", "true").lower() == "true"
+# The build's files, indexed once with their ETags and compressed variants
+static_assets = StaticAssetServer(FLUTTER_BUILD_PATH, generate=STATIC_PRECOMPRESS) if FLUTTER_BUILD_PATH.exists() else None
+
+# How long the full inventory snapshot is reused by the inventory endpoints and chat
+INVENTORY_SNAPSHOT_TTL_SECONDS = int(os.getenv("INVENTORY_SNAPSHOT_TTL_SECONDS", "30"))
+
+# Fresh ETAs for in-transit rows, recomputed on every inventory snapshot refresh
+# (see eta.py): average speed, road distance over straight-line distance (taken
+# from cached OSRM routes when ETA_ROUTE_SCALING is on and there are any), and
+# how far past the expected arrival an ETA must fall to count as at risk
+ETA_ENABLED = os.getenv("ETA_ENABLED", "true").lower() == "true"
+ETA_AVERAGE_SPEED_KMH = float(os.getenv("ETA_AVERAGE_SPEED_KMH", "65"))
+ETA_ROAD_FACTOR = float(os.getenv("ETA_ROAD_FACTOR", "1.3"))
+ETA_ROUTE_SCALING = os.getenv("ETA_ROUTE_SCALING", "true").lower() == "true"
+ETA_RISK_MARGIN_HOURS = float(os.getenv("ETA_RISK_MARGIN_HOURS", "1"))
+
+# Data cache with TTL: "memory" (per worker), "sqlite" (shared by the workers
+# on a host) or "redis" (shared by all instances); see cache_backends.py
+cache_backend = create_cache_backend(
+    os.getenv("CACHE_BACKEND", "memory"),
+    sqlite_path=os.getenv("CACHE_SQLITE_PATH"),
+    redis_url=os.getenv("CACHE_REDIS_URL")
+)
 
-# In-memory cache with TTL
-class CacheItem:
-    def __init__(self, data, ttl_seconds=300):
-        self.data = data
-        self.expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
+# How long a request waits for another worker's refresh of the same key
+# before querying the warehouse itself
+CACHE_REFRESH_LOCK_TIMEOUT_SECONDS = float(os.getenv("CACHE_REFRESH_LOCK_TIMEOUT_SECONDS", "60"))
 
-    def is_expired(self):
-        return datetime.now() > self.expires_at
+# Tags that cache entries carry, for POST /api/cache/invalidate
+CACHE_TAGS = ("inventory", "batch_events", "batch:<id>", "route", "dashboard")
 
-# Cache storage
-_cache: Dict[str, CacheItem] = {}
+# How to recompute each key this worker has cached, for refresh-in-place invalidation
+_refreshers: Dict[str, Callable[[], object]] = {}
+# Refreshes in place run here, in the background of the requests still served the old values
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CACHE_REFRESH_WORKERS", "2")), thread_name_prefix="cache-refresh"
+)
+
+# Poll the source tables' versions this often (0 disables) and invalidate what
+# was derived from a table whose version changed, refreshing in place or dropping
+TABLE_VERSION_POLL_SECONDS = float(os.getenv("TABLE_VERSION_POLL_SECONDS", "60"))
+TABLE_VERSION_INVALIDATION = os.getenv("TABLE_VERSION_INVALIDATION", "refresh").lower()
+
+# Host-wide Arrow snapshots of the inventory and batch events tables: one
+# worker writes each refresh, every worker memory-maps it (unset: per-worker frames)
+ARROW_SNAPSHOT_DIR = os.getenv("ARROW_SNAPSHOT_DIR", "")
+snapshot_store = ArrowSnapshotStore(Path(ARROW_SNAPSHOT_DIR)) if ARROW_SNAPSHOT_DIR else None
+BATCH_EVENTS_SNAPSHOT_TTL_SECONDS = int(os.getenv("BATCH_EVENTS_SNAPSHOT_TTL_SECONDS", "60"))
+
+# Version of the snapshot each name was last served at, to detect changes
+_snapshot_versions: Dict[str, str] = {}
+# Query and transform each snapshot name is built from
+_snapshot_sources: Dict[str, tuple] = {}
+
+# Completed chat answers, replayed for repeat questions against the same data
+completion_cache = CompletionCache(
+    ttl_seconds=int(os.getenv("CHAT_COMPLETION_CACHE_TTL_SECONDS", "900")),
+    max_entries=int(os.getenv("CHAT_COMPLETION_CACHE_MAX_ENTRIES", "256"))
+)
+
+# Bulkheads: each kind of blocking work runs in its own bounded pool (workers,
+# wait queue), so slow warehouse queries or OSRM calls cannot take the threads
+# of pandas work or cache hits. A full pool answers 503 at once.
+bulkheads = {
+    "warehouse": Bulkhead(
+        "warehouse",
+        max_workers=int(os.getenv("WAREHOUSE_POOL_SIZE", "8")),
+        max_queue=int(os.getenv("WAREHOUSE_POOL_QUEUE", "32"))
+    ),
+    "routing": Bulkhead(
+        "routing",
+        max_workers=int(os.getenv("ROUTING_POOL_SIZE", "16")),
+        max_queue=int(os.getenv("ROUTING_POOL_QUEUE", "64"))
+    ),
+    "transforms": Bulkhead(
+        "transforms",
+        max_workers=int(os.getenv("TRANSFORM_POOL_SIZE", "4")),
+        max_queue=int(os.getenv("TRANSFORM_POOL_QUEUE", "64"))
+    ),
+}
+telemetry.register_collector(telemetry.BulkheadCollector(lambda: bulkheads))
 
 # CORS configuration
 app.add_middleware(
@@ -47,8 +172,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Prompt-Tokens", "Retry-After", "Server-Timing", "X-Data-Stale", "Warning"],
 )
 
+# gzip (zstd, brotli with their packages) for response bodies of at least
+# RESPONSE_COMPRESSION_MIN_BYTES; event streams pass through unbuffered.
+# Compressed bodies of cached payloads are reused (0 entries disables reuse).
+RESPONSE_COMPRESSION_LEVEL = int(os.getenv("RESPONSE_COMPRESSION_LEVEL", "6"))
+if os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true":
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")),
+        level=RESPONSE_COMPRESSION_LEVEL,
+        cache_entries=int(os.getenv("RESPONSE_COMPRESSION_CACHE_ENTRIES", "64"))
+    )
+
+# Server-Timing spans for /api responses; requests slower than
+# SLOW_REQUEST_LOG_MS get their span tree printed (0 disables)
+app.add_middleware(
+    telemetry.ServerTimingMiddleware,
+    slow_request_ms=float(os.getenv("SLOW_REQUEST_LOG_MS", "0"))
+)
+
+# Cancels a request's warehouse statements when its client disconnects and
+# marks responses served from stale data (X-Data-Stale, Warning)
+app.add_middleware(RequestScopeMiddleware)
+
 # Middleware to prevent buffering for streaming responses
 @app.middleware("http")
 async def disable_buffering(request, call_next):
@@ -58,6 +207,10 @@ async def disable_buffering(request, call_next):
         response.headers["X-Accel-Buffering"] = "no"
     return response
 
+# Per-route latency histograms (plain ASGI, registered last so it is the
+# outermost middleware and sees every request)
+app.add_middleware(telemetry.RouteMetricsMiddleware)
+
 # Models
 class InventoryItem(BaseModel):
     record_id: int
@@ -75,6 +228,12 @@ class InventoryItem(BaseModel):
     last_updated_cst: str
     expected_arrival_time: Optional[str] = None
     batch_id: str
+    # Recomputed on each snapshot refresh, for in-transit rows only
+    remaining_distance_km: Optional[float] = None
+    eta_hours: Optional[float] = None
+    eta_time: Optional[str] = None
+    overdue_hours: Optional[float] = None
+    at_risk_of_delay: bool = False
 
 class BatchEvent(BaseModel):
     record_id: int
@@ -103,30 +262,174 @@ class StatusSummary(BaseModel):
 # Cache helper functions
 def get_from_cache(key: str):
     """Get data from cache if not expired"""
-    if key in _cache:
-        item = _cache[key]
+    item = cache_backend.get(key)
+    if item is not None:
         if not item.is_expired():
+            record_cache_event(key, "hit")
+            mark_span("cache", "hit")
             return item.data
-        else:
-            del _cache[key]
+        elif cache_backend.evict(key):
+            record_cache_event(key, "evict")
+            _refreshers.pop(key, None)
+    record_cache_event(key, "miss")
+    mark_span("cache", "miss")
     return None
 
-def set_cache(key: str, data, ttl_seconds=300):
-    """Set data in cache with TTL"""
-    _cache[key] = CacheItem(data, ttl_seconds)
+def peek_cache(key: str):
+    """Get data from cache if fresh, recording only hits (the full lookup records the miss)"""
+    item = cache_backend.get(key)
+    if item is None or item.is_expired():
+        return None
+    record_cache_event(key, "hit")
+    mark_span("cache", "hit")
+    return item.data
+
+def set_cache(key: str, data, ttl_seconds=300, version=None, tags=()):
+    """Set data in cache with TTL, an optional content version and invalidation tags"""
+    previous_version = cache_backend.set(key, data, ttl_seconds, version, tags)
+    if previous_version is not None and previous_version != version:
+        on_snapshot_changed(key)
+
+def on_snapshot_changed(key: str):
+    """Drop cached chat answers that were generated from an older snapshot"""
+    name = query_name(key)
+    if name == "inventory_snapshot":
+        completion_cache.invalidate("realtime")
+    elif name in ("batches_list", "batch_events", "batch_events_snapshot"):
+        completion_cache.invalidate("shipment")
 
 def clear_cache():
     """Clear all cache entries"""
-    _cache.clear()
+    for key in cache_backend.clear():
+        record_cache_event(key, "evict")
+    _refreshers.clear()
+    with _last_good_lock:
+        _last_good.clear()
+
+def refresh_cache_entry(key: str):
+    """Recompute a cached key in place; skipped if it is already being refreshed"""
+    refresher = _refreshers.get(key)
+    if refresher is None:
+        return
+    with cache_backend.refresh_lock(key, 0) as acquired:
+        if not acquired:
+            return
+        try:
+            refresher()
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            print(f"Error refreshing {key}: {detail}")
+
+def refresh_shared_snapshot(name: str):
+    """Write the next Arrow snapshot of a name in place; skipped if another worker is writing it"""
+    query, transform = _snapshot_sources[name]
+    with snapshot_store.refresh_lock(name, 0) as acquired:
+        if not acquired:
+            return
+        try:
+            write_shared_snapshot(name, query, transform)
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            print(f"Error refreshing the {name} snapshot: {detail}")
 
-# Database connection helper
-def get_databricks_data(query: str, cache_key: Optional[str] = None, ttl_seconds=300):
-    """Fetch data from Databricks with optional caching"""
-    # Check cache first
-    if cache_key:
-        cached_data = get_from_cache(cache_key)
-        if cached_data is not None:
-            return cached_data
+def invalidate_cache_tags(tags: List[str], refresh: bool = False) -> dict:
+    """
+    Drop the cache entries and Arrow snapshots tagged with any of tags.
+
+    With refresh, entries are recomputed in the background instead and the
+    current values keep being served until they are replaced. Entries this
+    worker has no way to recompute (stored by another worker) are dropped.
+    """
+    keys = cache_backend.keys_with_tags(tags)
+    refreshing = [key for key in keys if key in _refreshers] if refresh else []
+    dropped = cache_backend.drop([key for key in keys if key not in refreshing])
+    for key in dropped:
+        record_cache_event(key, "evict")
+        _refreshers.pop(key, None)
+    for key in refreshing:
+        _refresh_executor.submit(refresh_cache_entry, key)
+
+    snapshots = []
+    if snapshot_store is not None:
+        table_tags = {table_tag(tag) for tag in tags}
+        for name, (query, _) in list(_snapshot_sources.items()):
+            if table_tags.intersection(query.tags):
+                snapshots.append(name)
+                if refresh:
+                    _refresh_executor.submit(refresh_shared_snapshot, name)
+                else:
+                    snapshot_store.remove(name)
+
+    return {
+        "tags": sorted(tags),
+        "mode": "refresh" if refresh else "drop",
+        "dropped": dropped,
+        "refreshing": refreshing,
+        "snapshots": snapshots,
+    }
+
+def frame_version(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame, used to version cached snapshots"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    return f"{len(df):x}-{int(row_hashes.sum()):016x}"
+
+# Warehouse backend: "databricks" (default) or "local" for the synthetic SQLite
+# stand-in used by benchmarks and offline development
+DATA_BACKEND = os.getenv("DATA_BACKEND", "databricks").lower()
+
+# Registered warehouse queries, with table names resolved for the configured
+# catalog and schema; WAREHOUSE_QUERY_TIMEOUTS overrides per-query statement
+# timeouts as "name=seconds,..."
+queries = QueryRegistry(
+    catalog=os.getenv("DATABRICKS_CATALOG", ""),
+    schema=os.getenv("DATABRICKS_SCHEMA", ""),
+    timeouts=parse_timeouts(os.getenv("WAREHOUSE_QUERY_TIMEOUTS", ""))
+)
+
+# Statements still running after this long are cancelled on the warehouse
+WAREHOUSE_QUERY_TIMEOUT_SECONDS = float(os.getenv("WAREHOUSE_QUERY_TIMEOUT_SECONDS", "45"))
+
+# After this many failed or timed-out queries in a row, queries fail fast for
+# the reset period and requests get the last good result, marked stale
+warehouse_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("WAREHOUSE_BREAKER_FAILURES", "5")),
+    reset_seconds=float(os.getenv("WAREHOUSE_BREAKER_RESET_SECONDS", "30"))
+)
+
+# Last good result per cache key, served when the warehouse is failing
+STALE_FALLBACK_MAX_ENTRIES = int(os.getenv("STALE_FALLBACK_MAX_ENTRIES", "512"))
+_last_good: "OrderedDict[str, object]" = OrderedDict()
+_last_good_lock = threading.Lock()
+
+def remember_last_good(key: str, data):
+    with _last_good_lock:
+        _last_good[key] = data
+        _last_good.move_to_end(key)
+        while len(_last_good) > STALE_FALLBACK_MAX_ENTRIES:
+            _last_good.popitem(last=False)
+
+def stale_fallback(key: str, error: HTTPException):
+    """The last good result for a key if error is a warehouse failure (marking the response stale), else None"""
+    if error.status_code not in (500, 503, 504):
+        return None
+    with _last_good_lock:
+        data = _last_good.get(key)
+    if data is None:
+        return None
+    telemetry.STALE_RESPONSES.labels(telemetry.cache_namespace(key)).inc()
+    mark_span("cache", "stale")
+    mark_stale()
+    return data
+
+def connect_warehouse():
+    """Open a connection to the configured warehouse backend"""
+    if DATA_BACKEND == "local":
+        import local_warehouse
+
+        return local_warehouse.connect(
+            path=os.getenv("LOCAL_WAREHOUSE_PATH", str(local_warehouse.DEFAULT_PATH)),
+            rows=int(os.getenv("LOCAL_WAREHOUSE_ROWS", "1000"))
+        )
 
     databricks_host = os.getenv("DATABRICKS_HOST")
     databricks_token = os.getenv("DATABRICKS_TOKEN")
@@ -135,24 +438,193 @@ def get_databricks_data(query: str, cache_key: Optional[str] = None, ttl_seconds
     if not all([databricks_host, databricks_token, databricks_http_path]):
         raise HTTPException(status_code=500, detail="Databricks credentials not configured")
 
+    # Imported here: the connector is only needed once the first query runs
+    from databricks import sql
+
+    return sql.connect(
+        server_hostname=databricks_host.replace("https://", ""),
+        http_path=databricks_http_path,
+        access_token=databricks_token
+    )
+
+# Database connection helper
+def get_databricks_data(query: BoundQuery, ttl_seconds=300, transform=None, cache_only=False):
+    """
+    Fetch data from Databricks, cached under the query's cache key.
+
+    Cached frames carry the version of their warehouse columns in df.attrs['snapshot_version'].
+    An optional transform is applied once before the result is cached.
+    With cache_only, returns None instead of querying on a miss.
+    """
+    # Check cache first
+    cache_key = query.cache_key
+    if cache_only:
+        return peek_cache(cache_key)
+    cached_data = get_from_cache(cache_key)
+    if cached_data is not None:
+        return cached_data
+
+    # Single-flight: one request (in any worker sharing the cache backend)
+    # queries the warehouse for a key; the others wait and reuse its result
+    try:
+        with cache_backend.refresh_lock(cache_key, CACHE_REFRESH_LOCK_TIMEOUT_SECONDS):
+            item = cache_backend.get(cache_key)
+            if item is not None and not item.is_expired():
+                record_cache_event(cache_key, "coalesced")
+                mark_span("cache", "coalesced")
+                return item.data
+            _refreshers[cache_key] = lambda: query_warehouse(query, cache_key, ttl_seconds, transform)
+            return query_warehouse(query, cache_key, ttl_seconds, transform)
+    except HTTPException as e:
+        stale = stale_fallback(cache_key, e)
+        if stale is None:
+            raise
+        return stale
+
+def fetch_arrow(query: BoundQuery):
+    """
+    Execute a query on the warehouse and fetch the result as an Arrow table.
+
+    Fails fast with 503 while the circuit breaker is open. The statement is
+    cancelled on the warehouse after its timeout (504) or when the client of
+    the request disconnects (499).
+    """
+    query_label = query.name
+    try:
+        warehouse_breaker.before_call()
+    except CircuitOpenError as e:
+        telemetry.WAREHOUSE_FAILURES.labels(query_label, "circuit_open").inc()
+        raise HTTPException(status_code=503, detail=f"Warehouse unavailable: {e}",
+                            headers={"Retry-After": str(int(e.retry_after))})
+
+    timeout = query.timeout_seconds or WAREHOUSE_QUERY_TIMEOUT_SECONDS
+    guard = None
     try:
-        with sql.connect(
-            server_hostname=databricks_host.replace("https://", ""),
-            http_path=databricks_http_path,
-            access_token=databricks_token
-        ) as connection:
+        start = time.perf_counter()
+        with span("db_connect", query_label):
+            connection = connect_warehouse()
+        with connection:
             with connection.cursor() as cursor:
-                cursor.execute(query)
-                df = cursor.fetchall_arrow().to_pandas()
+                with span("db_query", query_label), guarded_statement(cursor, timeout) as guard:
+                    query.execute(cursor)
+                    table = cursor.fetchall_arrow()
+    except HTTPException:
+        # Configuration errors say nothing about the warehouse's health
+        warehouse_breaker.release()
+        raise
+    except Exception as e:
+        reason = guard.reason if guard is not None and guard.reason else "error"
+        telemetry.WAREHOUSE_FAILURES.labels(query_label, reason).inc()
+        if reason == "disconnect":
+            warehouse_breaker.release()
+            raise HTTPException(status_code=499, detail="Client closed request")
+        warehouse_breaker.record_failure()
+        if reason == "timeout":
+            raise HTTPException(status_code=504, detail=f"Warehouse query timed out after {timeout:g}s")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    warehouse_breaker.record_success()
+    telemetry.WAREHOUSE_QUERY_SECONDS.labels(query_label).observe(time.perf_counter() - start)
+    telemetry.WAREHOUSE_ROWS.labels(query_label).observe(table.num_rows)
+    telemetry.WAREHOUSE_ARROW_BYTES.labels(query_label).observe(table.nbytes)
+    return table
 
-                # Cache the result if cache_key provided
-                if cache_key:
-                    set_cache(cache_key, df, ttl_seconds)
+def query_warehouse(query: BoundQuery, cache_key: Optional[str] = None, ttl_seconds=300, transform=None):
+    """Run a query against the warehouse, transform the result and cache it under cache_key"""
+    query_label = query.name
+    table = fetch_arrow(query)
 
-                return df
+    try:
+        with stage_timer("arrow_to_pandas", query_label):
+            df = table.to_pandas()
+        with stage_timer("compact", query_label):
+            df = compact_frame(df)
+        # Versioned by the warehouse columns only: transforms may add columns
+        # relative to the current time (ETAs), which change on every refresh
+        version = frame_version(df)
+        if transform is not None:
+            with stage_timer("transform", query_label):
+                # Compact again for any columns the transform added
+                df = compact_frame(transform(df))
+        df.attrs['source_bytes'] = table.nbytes
+        df.attrs['snapshot_version'] = version
+
+        # Cache the result if cache_key provided
+        if cache_key:
+            with span("cache", "store"):
+                set_cache(cache_key, df, ttl_seconds, version, query.tags)
+                remember_last_good(cache_key, df)
+
+        return df
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def get_shared_snapshot(name: str, query: BoundQuery, ttl_seconds: float, transform=None,
+                        cache_only=False) -> Optional[pd.DataFrame]:
+    """
+    Get a table snapshot from the host's Arrow snapshot store (do not mutate).
+
+    While the current file is younger than ttl_seconds it is mapped as is;
+    otherwise one worker on the host queries the warehouse and writes the next
+    snapshot while the others wait for it (with cache_only, None is returned
+    instead). Mapped frames stay out of the cache backend, which would copy
+    them into every worker.
+    """
+    cache_key = f"{name}_snapshot"
+    _snapshot_sources[name] = (query, transform)
+
+    def current_snapshot():
+        age = snapshot_store.age_seconds(name)
+        if age is None or age >= ttl_seconds:
+            return None
+        df = snapshot_store.read(name)
+        if df is not None:
+            version = df.attrs.get('snapshot_version')
+            previous_version = _snapshot_versions.get(name)
+            _snapshot_versions[name] = version
+            if previous_version is not None and previous_version != version:
+                on_snapshot_changed(cache_key)
+        return df
+
+    df = current_snapshot()
+    if df is not None:
+        record_cache_event(cache_key, "hit")
+        mark_span("cache", "hit")
+        return df
+    if cache_only:
+        return None
+    record_cache_event(cache_key, "miss")
+    mark_span("cache", "miss")
+
+    with snapshot_store.refresh_lock(name, CACHE_REFRESH_LOCK_TIMEOUT_SECONDS):
+        df = current_snapshot()
+        if df is not None:
+            record_cache_event(cache_key, "coalesced")
+            mark_span("cache", "coalesced")
+            return df
+
+        try:
+            df = write_shared_snapshot(name, query, transform)
+        except HTTPException as e:
+            # The current file, however old, is the last good snapshot
+            stale = snapshot_store.read(name) if e.status_code in (500, 503, 504) else None
+            if stale is None:
+                raise
+            telemetry.STALE_RESPONSES.labels(cache_key).inc()
+            mark_span("cache", "stale")
+            mark_stale()
+            return stale
+        # Serve the mapped file, so this worker's query result can be freed
+        mapped = current_snapshot()
+        return mapped if mapped is not None else df
+
+def write_shared_snapshot(name: str, query: BoundQuery, transform=None) -> pd.DataFrame:
+    """Query the warehouse and make the result the current snapshot (hold the snapshot's refresh lock)"""
+    df = query_warehouse(query, transform=transform)
+    with span("snapshot", "write"):
+        snapshot_store.write(name, df, df.attrs['snapshot_version'])
+    return df
+
 def get_status_category(status: str) -> str:
     """Map detailed status to broad category"""
     status_lower = status.lower()
@@ -167,83 +639,149 @@ def get_status_category(status: str) -> str:
     else:
         return status
 
+def add_status_category(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the broad status category, mapping each distinct status only once"""
+    categories = {status: get_status_category(status) for status in df['status'].dropna().unique()}
+    df['status_category'] = df['status'].map(categories)
+    return df
+
+def add_eta_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Add fresh ETAs and at-risk flags for the in-transit rows (see eta.py)"""
+    destinations = eta.learn_destinations(df)
+    road_factor, destination_factors = ETA_ROAD_FACTOR, {}
+    if ETA_ROUTE_SCALING:
+        routes = [
+            data["coordinates"] for key, data in cache_backend.local_items()
+            if key.startswith("route_") and isinstance(data, dict) and data.get("coordinates")
+        ]
+        destination_factors, median_factor = eta.road_factors(routes, destinations)
+        road_factor = median_factor or ETA_ROAD_FACTOR
+    return eta.add_eta(
+        df, destinations, speed_kmh=ETA_AVERAGE_SPEED_KMH, road_factor=road_factor,
+        destination_factors=destination_factors, risk_margin_hours=ETA_RISK_MARGIN_HOURS
+    )
+
+def add_inventory_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Derived inventory columns: status categories, then ETAs"""
+    df = add_status_category(df)
+    return add_eta_columns(df) if ETA_ENABLED else df
+
+# Transforms applied to query results before they are cached, by query name
+QUERY_TRANSFORMS = {"inventory_snapshot": add_inventory_columns}
+
+def get_inventory_snapshot(cache_only=False) -> Optional[pd.DataFrame]:
+    """Get the full inventory table with status categories (cached briefly, do not mutate)"""
+    query = queries.bind("inventory_snapshot")
+    if snapshot_store is not None:
+        return get_shared_snapshot("inventory", query, INVENTORY_SNAPSHOT_TTL_SECONDS,
+                                   transform=QUERY_TRANSFORMS["inventory_snapshot"], cache_only=cache_only)
+    return get_databricks_data(
+        query,
+        ttl_seconds=INVENTORY_SNAPSHOT_TTL_SECONDS,
+        transform=QUERY_TRANSFORMS["inventory_snapshot"],
+        cache_only=cache_only
+    )
+
+async def run_in_bulkhead(name: str, func, *args, **kwargs):
+    """Run blocking work in a bulkhead's pool; 503 with Retry-After when the pool is full"""
+    try:
+        return await bulkheads[name].run(func, *args, **kwargs)
+    except BulkheadRejected as e:
+        raise HTTPException(status_code=503, detail=f"Server busy: {e}",
+                            headers={"Retry-After": str(e.retry_after)})
+
+async def cached_or_run(name: str, loader, *args):
+    """
+    Get a loader's cached value without waiting for a pool thread; on a miss
+    run the loader in the named bulkhead.
+
+    loader takes cache_only=True to return None instead of fetching. In-process
+    cache reads run on the event loop, shared cache reads in a default thread.
+    """
+    if cache_backend.nonblocking_reads and snapshot_store is None:
+        data = loader(*args, cache_only=True)
+    else:
+        data = await asyncio.to_thread(loader, *args, cache_only=True)
+    if data is not None:
+        return data
+    return await run_in_bulkhead(name, loader, *args)
+
 # Routes
 @app.get("/api/inventory")
-def get_inventory(
+async def get_inventory(
     product: Optional[str] = None,
     status: Optional[str] = None
 ):
     """Get inventory data with optional filters"""
-    catalog = os.getenv("DATABRICKS_CATALOG", "")
-    schema = os.getenv("DATABRICKS_SCHEMA", "")
-
-    table_name = "inventory_realtime_v1"
-    if catalog and schema:
-        table_name = f"{catalog}.{schema}.{table_name}"
-
-    query = f"SELECT * FROM {table_name}"
-    df = get_databricks_data(query)
-
-    # Add status category for filtering
-    df['status_category'] = df['status'].apply(get_status_category)
+    df = await cached_or_run("warehouse", get_inventory_snapshot)
+    return await run_in_bulkhead("transforms", inventory_records, df, product, status)
 
+def inventory_records(df: pd.DataFrame, product: Optional[str] = None, status: Optional[str] = None):
+    """Filtered inventory rows as JSON-ready records"""
     # Apply filters
     if product:
         df = df[df['product_name'] == product]
     if status:
         df = df[df['status_category'] == status]
 
-    # Replace NaN values with None for JSON serialization
-    df = df.fillna('')
-    # Convert to JSON-safe records
-    records = df.to_dict('records')
-
-    # Replace empty strings back to None for optional fields
-    for record in records:
-        if record.get('expected_arrival_time') == '':
-            record['expected_arrival_time'] = None
-        if record.get('time_remaining_to_destination_hours') == '':
-            record['time_remaining_to_destination_hours'] = None
-
-    return records
+    with stage_timer("serialize", "inventory"):
+        # JSON-safe records: missing values as '', or None for the optional fields
+        return frame_to_records(
+            df, nullable_columns=('expected_arrival_time', 'time_remaining_to_destination_hours') + eta.ETA_COLUMNS
+        )
 
 @app.get("/api/inventory/summary", response_model=StatusSummary)
-def get_inventory_summary():
+async def get_inventory_summary():
     """Get inventory status summary"""
-    catalog = os.getenv("DATABRICKS_CATALOG", "")
-    schema = os.getenv("DATABRICKS_SCHEMA", "")
-
-    table_name = "inventory_realtime_v1"
-    if catalog and schema:
-        table_name = f"{catalog}.{schema}.{table_name}"
-
-    query = f"SELECT * FROM {table_name}"
-    df = get_databricks_data(query)
+    df = await cached_or_run("warehouse", get_inventory_snapshot)
+    return await run_in_bulkhead("transforms", inventory_summary, df)
 
-    # Add status category
-    df['status_category'] = df['status'].apply(get_status_category)
+def inventory_summary(df: pd.DataFrame) -> dict:
+    """Unit counts per status category and in total"""
+    counts = df['status_category'].value_counts()
 
     return {
-        "in_transit": len(df[df['status_category'] == 'In Transit']),
-        "at_dc": len(df[df['status_category'] == 'At DC']),
-        "at_dock": len(df[df['status_category'] == 'At Dock']),
-        "delivered": len(df[df['status_category'] == 'Delivered']),
+        "in_transit": int(counts.get('In Transit', 0)),
+        "at_dc": int(counts.get('At DC', 0)),
+        "at_dock": int(counts.get('At Dock', 0)),
+        "delivered": int(counts.get('Delivered', 0)),
         "total_units": int(df['qty'].sum())
     }
 
+@app.get("/api/inventory/aggregate")
+async def get_inventory_aggregate(
+    group_by: str = "product_name",
+    metrics: str = "qty,value,count",
+    limit: Optional[int] = None
+):
+    """
+    Inventory rolled up by comma-separated group_by columns (product_name,
+    current_location, destination, status_category, status, transit_status),
+    with qty, value and/or count per group, largest first (cached per snapshot)
+    """
+    try:
+        group_columns = parse_fields(group_by, GROUP_COLUMNS, "group_by columns")
+        metric_names = parse_fields(metrics, METRICS, "metrics")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    df = await cached_or_run("warehouse", get_inventory_snapshot)
+    return await run_in_bulkhead("transforms", rollup_response, df, group_columns, metric_names, limit)
+
+def get_products_frame(cache_only=False) -> Optional[pd.DataFrame]:
+    """Get the cached product names as a DataFrame (do not mutate)"""
+    return get_databricks_data(queries.bind("products_list"), ttl_seconds=300, cache_only=cache_only)
+
 @app.get("/api/products")
-def get_products():
+async def get_products():
     """Get list of unique products (cached for 5 minutes)"""
-    catalog = os.getenv("DATABRICKS_CATALOG", "")
-    schema = os.getenv("DATABRICKS_SCHEMA", "")
-
-    table_name = "inventory_realtime_v1"
-    if catalog and schema:
-        table_name = f"{catalog}.{schema}.{table_name}"
-
-    query = f"SELECT DISTINCT product_name FROM {table_name}"
-    df = get_databricks_data(query, cache_key="products_list", ttl_seconds=300)
+    df = await cached_or_run("warehouse", get_products_frame)
+    # A few hundred names at most, sorted on the event loop
+    return product_names(df)
 
+def product_names(df: pd.DataFrame) -> dict:
+    """Product names in alphabetical order"""
     products = sorted(df['product_name'].tolist())
     return {"products": products}
 
@@ -255,70 +793,133 @@ def get_statuses():
         "statuses": ["In Transit", "At DC", "At Dock", "Delivered"]
     }
 
-@app.get("/api/batch/{batch_id}")
-def get_batch_events(batch_id: str):
-    """Get batch tracking events for a specific batch (cached)"""
-    catalog = os.getenv("DATABRICKS_CATALOG", "")
-    schema = os.getenv("DATABRICKS_SCHEMA", "")
-
-    table_name = "batch_events_v1"
-    if catalog and schema:
-        table_name = f"{catalog}.{schema}.{table_name}"
+def get_batch_events_frame(batch_id: str, cache_only=False) -> Optional[pd.DataFrame]:
+    """Get the cached event timeline for a batch as a DataFrame (do not mutate)"""
+    if snapshot_store is not None:
+        # One host-wide snapshot of all events, ordered so each batch's slice is a timeline
+        events = get_shared_snapshot(
+            "batch_events",
+            queries.bind("batch_events_all"),
+            BATCH_EVENTS_SNAPSHOT_TTL_SECONDS,
+            cache_only=cache_only
+        )
+        if events is None:
+            return None
+        df = events[events['batch_id'] == batch_id].reset_index(drop=True)
+        df.attrs['snapshot_version'] = f"{events.attrs.get('snapshot_version')}/{batch_id}"
+        return df
 
-    query = f"SELECT * FROM {table_name} WHERE batch_id = '{batch_id}' ORDER BY event_time_cst"
+    # batch_id is bound as a parameter and is part of the cache key; 5-minute TTL
+    return get_databricks_data(queries.bind("batch_events", batch_id=batch_id), ttl_seconds=300,
+                               cache_only=cache_only)
 
-    # Use cache with batch_id as key, 5-minute TTL
-    df = get_databricks_data(query, cache_key=f"batch_{batch_id}", ttl_seconds=300)
+@app.get("/api/batch/{batch_id}")
+async def get_batch_events(batch_id: str):
+    """Get batch tracking events for a specific batch (cached)"""
+    df = await cached_or_run("warehouse", get_batch_events_frame, batch_id)
+    return await run_in_bulkhead("transforms", batch_event_records, df)
 
+def batch_event_records(df: pd.DataFrame):
+    """A batch's events as JSON-ready records (404 when there are none)"""
     if df.empty:
         raise HTTPException(status_code=404, detail="Batch not found")
 
-    # Replace NaN values
-    df = df.fillna('')
+    with stage_timer("serialize", "batch_events"):
+        return frame_to_records(df)
 
-    return df.to_dict('records')
+def get_batches_frame(cache_only=False) -> Optional[pd.DataFrame]:
+    """Get the cached batch list as a DataFrame (do not mutate)"""
+    # Batches joined with inventory for their transit_status; 5-minute TTL
+    return get_databricks_data(queries.bind("batches_list"), ttl_seconds=300, cache_only=cache_only)
 
 @app.get("/api/batches")
-def get_batches():
+async def get_batches():
     """Get list of unique batch IDs with product names and transit status (cached)"""
-    catalog = os.getenv("DATABRICKS_CATALOG", "")
-    schema = os.getenv("DATABRICKS_SCHEMA", "")
-
-    batch_table = "batch_events_v1"
-    inventory_table = "inventory_realtime_v1"
-    if catalog and schema:
-        batch_table = f"{catalog}.{schema}.{batch_table}"
-        inventory_table = f"{catalog}.{schema}.{inventory_table}"
-
-    # Join with inventory to get transit_status for each batch
-    query = f"""
-        SELECT DISTINCT
-            b.batch_id,
-            b.product_name,
-            COALESCE(i.transit_status, 'On Time') as transit_status
-        FROM {batch_table} b
-        LEFT JOIN {inventory_table} i ON b.batch_id = i.batch_id
+    df = await cached_or_run("warehouse", get_batches_frame)
+    return await run_in_bulkhead("transforms", batch_list, df)
+
+def batch_list(df: pd.DataFrame) -> dict:
+    """Batch rows as JSON-ready records"""
+    with stage_timer("serialize", "batches"):
+        return {"batches": df.to_dict('records')}
+
+# Dwell-time and bottleneck statistics over batch events (see dwell.py). They
+# consume the events added since the last update, at most this often.
+DWELL_REFRESH_SECONDS = float(os.getenv("DWELL_REFRESH_SECONDS", "30"))
+dwell_analytics = DwellAnalytics(float(os.getenv("DWELL_SKETCH_RELATIVE_ACCURACY", "0.01")))
+_dwell_update_lock = threading.Lock()
+
+def _dwell_update_due() -> bool:
+    updated_at = dwell_analytics.updated_at
+    return updated_at is None or time.monotonic() - updated_at >= DWELL_REFRESH_SECONDS
+
+def get_dwell_analytics(cache_only=False) -> Optional[DwellAnalytics]:
+    """Dwell statistics, consuming new batch events first when an update is due (with cache_only, None instead)"""
+    if not _dwell_update_due():
+        return dwell_analytics
+    if cache_only:
+        return None
+    with _dwell_update_lock:
+        if _dwell_update_due():
+            query = queries.bind("batch_events_since", after_record_id=dwell_analytics.last_record_id)
+            try:
+                events = query_warehouse(query)
+            except HTTPException as e:
+                if dwell_analytics.updated_at is None:
+                    raise
+                # Keep serving the statistics as of the last update
+                print(f"Dwell statistics update failed: {e.detail}")
+                mark_stale()
+                return dwell_analytics
+            with stage_timer("transform", "dwell_analytics"):
+                dwell_analytics.ingest(events)
+    return dwell_analytics
+
+@app.get("/api/analytics/dwell")
+async def get_dwell(limit: Optional[int] = None):
     """
+    Time spent at each entity and entity type, and on each leg between
+    entities, as count, mean, p50/p90/p99 and max hours, slowest p90 first
+    """
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    analytics = await cached_or_run("warehouse", get_dwell_analytics)
+    return analytics.summary(limit)
 
-    # Use cache with 5-minute TTL
-    df = get_databricks_data(query, cache_key="batches_list", ttl_seconds=300)
-
-    return {"batches": df.to_dict('records')}
+# OSRM routing service (the public demo server unless overridden)
+OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "http://router.project-osrm.org").rstrip("/")
 
 @app.get("/api/route")
-def get_route(lat1: float, lon1: float, lat2: float, lon2: float):
+async def get_route(lat1: float, lon1: float, lat2: float, lon2: float):
     """Get OSRM driving route between two points (cached)"""
-    import requests as req
+    return await cached_or_run("routing", get_route_coordinates, lat1, lon1, lat2, lon2)
 
+def get_route_coordinates(lat1: float, lon1: float, lat2: float, lon2: float, cache_only=False):
+    """Get a cached route, fetching it from OSRM on a miss (with cache_only, None instead)"""
     # Create cache key for this specific route
     cache_key = f"route_{lat1}_{lon1}_{lat2}_{lon2}"
+    if cache_only:
+        return peek_cache(cache_key)
     cached_route = get_from_cache(cache_key)
     if cached_route is not None:
         return cached_route
 
+    # A refresh keeps the cached geometry if OSRM is unavailable
+    _refreshers[cache_key] = lambda: fetch_route(lat1, lon1, lat2, lon2, fallback=False)
+    return fetch_route(lat1, lon1, lat2, lon2)
+
+def fetch_route(lat1: float, lon1: float, lat2: float, lon2: float, fallback: bool = True):
+    """Fetch a route from OSRM and cache it; a straight line (or None without fallback) if that fails"""
+    import requests as req
+
+    cache_key = f"route_{lat1}_{lon1}_{lat2}_{lon2}"
     try:
-        url = f"http://router.project-osrm.org/route/v1/driving/{lon1},{lat1};{lon2},{lat2}?overview=full&geometries=geojson"
-        response = req.get(url, timeout=5)
+        url = f"{OSRM_BASE_URL}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}?overview=full&geometries=geojson"
+        start = time.perf_counter()
+        try:
+            response = req.get(url, timeout=5)
+        finally:
+            telemetry.OSRM_SECONDS.observe(time.perf_counter() - start)
         if response.status_code == 200:
             data = response.json()
             if data['code'] == 'Ok' and 'routes' in data:
@@ -327,26 +928,123 @@ def get_route(lat1: float, lon1: float, lat2: float, lon2: float):
                 result = {"coordinates": [[c[1], c[0]] for c in coords]}  # Convert [lon, lat] to [lat, lon]
 
                 # Cache route for 10 minutes (routes don't change)
-                set_cache(cache_key, result, ttl_seconds=600)
+                set_cache(cache_key, result, ttl_seconds=600, tags=("route",))
 
+                telemetry.OSRM_REQUESTS.labels("ok").inc()
                 return result
     except:
         pass
 
     # Fallback to straight line
-    fallback = {"coordinates": [[lat1, lon1], [lat2, lon2]]}
-    set_cache(cache_key, fallback, ttl_seconds=600)
-    return fallback
+    telemetry.OSRM_REQUESTS.labels("fallback").inc()
+    if not fallback:
+        return None
+    straight_line = {"coordinates": [[lat1, lon1], [lat2, lon2]]}
+    set_cache(cache_key, straight_line, ttl_seconds=600, tags=("route",))
+    return straight_line
+
+@app.get("/api/cache/memory")
+def get_cache_memory():
+    """Memory of the frames this worker holds, per table, next to their size as fetched"""
+    frames: Dict[str, List[pd.DataFrame]] = {}
+    for key, data in cache_backend.local_items():
+        if isinstance(data, pd.DataFrame):
+            frames.setdefault(telemetry.cache_namespace(key), []).append(data)
+    report = {name: memory_report(group) for name, group in sorted(frames.items())}
+    if snapshot_store is not None:
+        # Mapped from the host's snapshot files rather than held per worker
+        report["arrow_snapshots"] = {
+            name: memory_report([df]) for name, df in snapshot_store.mapped_frames().items()
+        }
+    return report
 
 @app.post("/api/cache/clear")
 def clear_cache_endpoint():
-    """Clear all cache entries"""
+    """Clear all cache entries (POST /api/cache/invalidate drops or refreshes only some)"""
     clear_cache()
+    completion_cache.invalidate()
     return {"message": "Cache cleared successfully"}
 
+@app.post("/api/cache/invalidate")
+def invalidate_cache_endpoint(tags: str, mode: str = "drop"):
+    """
+    Invalidate the cache entries with any of the comma-separated tags
+    (inventory, batch_events, batch:<id>, route, dashboard).
+
+    mode=drop removes them; mode=refresh recomputes them in the background
+    while the current values are still served.
+    """
+    tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    unknown = [
+        tag for tag in tag_list
+        if tag not in CACHE_TAGS and not (tag.startswith("batch:") and len(tag) > len("batch:"))
+    ]
+    if not tag_list or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown cache tags {unknown}; expected {list(CACHE_TAGS)}")
+    if mode not in ("drop", "refresh"):
+        raise HTTPException(status_code=400, detail="mode must be drop or refresh")
+    return invalidate_cache_tags(tag_list, refresh=mode == "refresh")
+
+@app.get("/api/warehouse/status")
+def get_warehouse_status():
+    """Warehouse circuit breaker state and statement timeouts"""
+    return {
+        "circuit": warehouse_breaker.status(),
+        "default_timeout_s": WAREHOUSE_QUERY_TIMEOUT_SECONDS,
+        "query_timeouts_s": {
+            name: query.timeout_seconds for name, query in queries.items() if query.timeout_seconds
+        },
+    }
+
+@app.get("/api/cache/tables")
+def get_table_versions():
+    """Source table versions seen by the table version watcher"""
+    return table_watcher.status()
+
+def databricks_configured() -> bool:
+    """Whether the Databricks connection settings are all set"""
+    return all([os.getenv("DATABRICKS_HOST"), os.getenv("DATABRICKS_TOKEN"), os.getenv("DATABRICKS_HTTP_PATH")])
+
+# Warehouse queries the executive dashboard's live figures are computed from
+DASHBOARD_QUERIES = ("inventory_value_calc", "inventory_levels_calc")
+
+def get_dashboard_frame(name: str, cache_only=False) -> Optional[pd.DataFrame]:
+    """Get one of the dashboard's calculation frames (cached for 5 minutes, do not mutate)"""
+    return get_databricks_data(queries.bind(name), ttl_seconds=300, cache_only=cache_only)
+
 @app.get("/api/dashboard/executive")
-def get_executive_dashboard():
+async def get_executive_dashboard():
     """Get executive dashboard metrics from metrics.yaml with dynamic date adjustments"""
+    frames = {}
+    if databricks_configured():
+        # Query in the warehouse pool; a failed query is reported where its figure is computed
+        results = await asyncio.gather(
+            *(cached_or_run("warehouse", get_dashboard_frame, name) for name in DASHBOARD_QUERIES),
+            cached_or_run("warehouse", get_inventory_snapshot),
+            return_exceptions=True
+        )
+        frames = dict(zip(DASHBOARD_QUERIES + ("inventory_snapshot",), results))
+    return await run_in_bulkhead("transforms", executive_dashboard, frames)
+
+def executive_dashboard(frames: Optional[Dict[str, object]] = None) -> dict:
+    """
+    Build the executive dashboard from metrics.yaml and the live calculation frames.
+
+    frames holds each of DASHBOARD_QUERIES' frame and the inventory snapshot,
+    or the error fetching it; missing ones are fetched here.
+    """
+    import yaml
+
+    frames = frames or {}
+
+    def calculation_frame(name: str) -> pd.DataFrame:
+        frame = frames.get(name)
+        if isinstance(frame, BaseException):
+            raise frame
+        if frame is not None:
+            return frame
+        return get_inventory_snapshot() if name == "inventory_snapshot" else get_dashboard_frame(name)
+
     metrics_path = Path(__file__).parent / "metrics.yaml"
 
     try:
@@ -356,22 +1054,12 @@ def get_executive_dashboard():
         dashboard = metrics.get('executive_dashboard', {})
 
         # Check if Databricks is configured
-        databricks_host = os.getenv("DATABRICKS_HOST")
-        databricks_token = os.getenv("DATABRICKS_TOKEN")
-        databricks_http_path = os.getenv("DATABRICKS_HTTP_PATH")
-        databricks_configured = all([databricks_host, databricks_token, databricks_http_path])
+        configured = databricks_configured()
 
         # Calculate total inventory value from actual data (only if Databricks is configured)
-        catalog = os.getenv("DATABRICKS_CATALOG", "")
-        schema = os.getenv("DATABRICKS_SCHEMA", "")
-        table_name = "inventory_realtime_v1"
-        if catalog and schema:
-            table_name = f"{catalog}.{schema}.{table_name}"
-
-        if databricks_configured:
+        if configured:
             try:
-                query = f"SELECT qty, unit_price FROM {table_name}"
-                df = get_databricks_data(query, cache_key="inventory_value_calc", ttl_seconds=300)
+                df = calculation_frame("inventory_value_calc")
 
                 # Calculate total value (qty * unit_price)
                 total_value = (df['qty'] * df['unit_price']).sum()
@@ -411,10 +1099,9 @@ def get_executive_dashboard():
                         break
 
         # Update inventory levels based on real-time data (only if Databricks is configured)
-        if databricks_configured:
+        if configured:
             try:
-                query = f"SELECT status, qty, unit_price FROM {table_name}"
-                df = get_databricks_data(query, cache_key="inventory_levels_calc", ttl_seconds=300)
+                df = calculation_frame("inventory_levels_calc")
 
                 # Calculate inventory by status
                 inventory_by_status = {}
@@ -461,53 +1148,43 @@ def get_executive_dashboard():
                 # If calculation fails, keep the default value from YAML
                 print(f"Error calculating inventory levels: {e}")
 
-        # Generate last 6 months including current month
-        current_date = datetime.now()
-        months = []
-        for i in range(5, -1, -1):  # 5 months ago to current month
-            month_date = current_date - timedelta(days=i*30)
-            months.append(month_date.strftime("%b"))
+        # Last 6 calendar months including the current one
+        months = last_months(6)
+        month_keys = [key for key, _ in months]
+
+        # The current month comes from the live snapshot until history has a point for it
+        live_point = None
+        if configured:
+            try:
+                snapshot = calculation_frame("inventory_snapshot")
+                if snapshot is not None:
+                    live_point = summary_point(snapshot)
+            except Exception as e:
+                print(f"Error summarising the inventory snapshot: {e}")
+
+        def monthly_trend(metric: str) -> List[dict]:
+            values = history_monthly_values(month_keys, metric)
+            if live_point is not None:
+                values.setdefault(month_keys[-1], live_point[metric])
+            return trend_chart(months, values)
 
         # Update demand_forecasting chart with last 6 months
         if 'demand_forecasting' in dashboard:
             dashboard['demand_forecasting']['period'] = "Last 6 Months"
-            dashboard['demand_forecasting']['chart_data'] = [
-                {"month": months[0], "value": 75},
-                {"month": months[1], "value": 82},
-                {"month": months[2], "value": 70},
-                {"month": months[3], "value": 65},
-                {"month": months[4], "value": 90},
-                {"month": months[5], "value": 78},
-            ]
+            # Units in the pipeline per month (not delivered yet), from the history rollups
+            dashboard['demand_forecasting']['chart_data'] = monthly_trend("active_units")
 
         # Update logistics_transportation charts with last 6 months
         if 'logistics_transportation' in dashboard:
-            import random
-            random.seed(42)  # For consistent random values
-
             # Update expedited_delayed chart
             if 'expedited_delayed' in dashboard['logistics_transportation']:
                 dashboard['logistics_transportation']['expedited_delayed']['period'] = f"Last 6 Months"
-                dashboard['logistics_transportation']['expedited_delayed']['chart_data'] = [
-                    {"month": months[0], "value": 12},
-                    {"month": months[1], "value": 18},
-                    {"month": months[2], "value": 15},
-                    {"month": months[3], "value": 22},
-                    {"month": months[4], "value": 10},
-                    {"month": months[5], "value": 14},
-                ]
+                dashboard['logistics_transportation']['expedited_delayed']['chart_data'] = monthly_trend("delayed_pct")
 
             # Update otif_over_time chart
             if 'otif_over_time' in dashboard['logistics_transportation']:
                 dashboard['logistics_transportation']['otif_over_time']['period'] = f"Last 6 Months"
-                dashboard['logistics_transportation']['otif_over_time']['chart_data'] = [
-                    {"month": months[0], "value": 88},
-                    {"month": months[1], "value": 85},
-                    {"month": months[2], "value": 90},
-                    {"month": months[3], "value": 87},
-                    {"month": months[4], "value": 92},
-                    {"month": months[5], "value": 95},
-                ]
+                dashboard['logistics_transportation']['otif_over_time']['chart_data'] = monthly_trend("on_time_pct")
 
         return dashboard
     except FileNotFoundError:
@@ -515,52 +1192,575 @@ def get_executive_dashboard():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading metrics: {str(e)}")
 
+def history_monthly_values(months: List[str], metric: str) -> Dict[str, float]:
+    """Monthly means of a history metric, for the months that have history (none without a store)"""
+    if history_store is None:
+        return {}
+    try:
+        return history_store.monthly_values(months, metric)
+    except Exception as e:
+        print(f"Error reading history rollups: {e}")
+        return {}
+
+def trend_chart(months: List[tuple], values: Dict[str, float]) -> List[dict]:
+    """Chart points per month from the history rollups; null for months without history"""
+    return [
+        {"month": label, "value": round(values[key], 1) if key in values else None}
+        for key, label in months
+    ]
+
+@app.get("/api/chat/admission")
+def get_chat_admission_stats():
+    """Get upstream chat concurrency, queue depth and wait time per model"""
+    return {model: controller.stats() for model, controller in _admission_controllers.items()}
+
+@app.get("/api/bulkheads")
+def get_bulkhead_stats():
+    """Get workers busy, queue depth, rejections and wait time per bulkhead pool"""
+    return {name: bulkhead.stats() for name, bulkhead in bulkheads.items()}
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    body, content_type = telemetry.render_latest()
+    return Response(content=body, media_type=content_type)
+
+# Startup warm-up: prefetch the hot caches so the first users after a cold
+# start do not pay for imports, the warehouse connection and empty caches
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+STARTUP_WARMUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_WARMUP_TIMEOUT_SECONDS", "60"))
+# Batches (first in the batch list) whose timelines and route legs are prefetched
+STARTUP_WARMUP_ROUTE_BATCHES = int(os.getenv("STARTUP_WARMUP_ROUTE_BATCHES", "5"))
+# Route legs fetched at a time, in the routing pool (OSRM's public server is shared)
+STARTUP_WARMUP_ROUTE_CONCURRENCY = int(os.getenv("STARTUP_WARMUP_ROUTE_CONCURRENCY", "2"))
+
+class StartupWarmup:
+    """
+    Background cache warm-up run from the app lifespan.
+
+    Independent fetches run concurrently in worker threads; a failed step is
+    recorded and does not hold back readiness (its endpoint fetches on demand).
+    """
+
+    def __init__(self, enabled: bool = True, timeout_seconds: float = 60.0):
+        self.enabled = enabled
+        self.timeout_seconds = timeout_seconds
+        self.state = "pending" if enabled else "disabled"
+        self.steps: Dict[str, dict] = {}
+        self.duration_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state not in ("pending", "running")
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait(self):
+        """Wait for the warm-up to finish (without cancelling it on disconnect)"""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _step(self, name: str, func, *args):
+        start = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(func, *args)
+            self.steps[name] = {"status": "ok", "ms": round((time.perf_counter() - start) * 1000, 1)}
+            return result
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            print(f"Warm-up step {name} failed: {detail}")
+            self.steps[name] = {"status": "error", "ms": round((time.perf_counter() - start) * 1000, 1),
+                                "error": str(detail)}
+            return None
+
+    async def _warm_routes(self, batches_task: asyncio.Task):
+        # Route legs of the first batches, as the tracking screen requests them
+        if await batches_task is None:
+            return
+        batch_ids = get_batches_frame()['batch_id'].head(STARTUP_WARMUP_ROUTE_BATCHES).tolist()
+        timelines = await asyncio.gather(*(
+            self._step(f"batch:{batch_id}", get_batch_events_frame, batch_id) for batch_id in batch_ids
+        ))
+        legs = {}
+        for events in timelines:
+            if events is None:
+                continue
+            points = list(zip(events['entity_latitude'].astype(float), events['entity_longitude'].astype(float)))
+            legs.update(dict.fromkeys(zip(points, points[1:])))
+        start = time.perf_counter()
+        limit = asyncio.Semaphore(max(1, STARTUP_WARMUP_ROUTE_CONCURRENCY))
+
+        async def warm_leg(lat1, lon1, lat2, lon2) -> bool:
+            # Through the routing bulkhead, like /api/route; cached legs skip the pool
+            async with limit:
+                try:
+                    await cached_or_run("routing", get_route_coordinates, lat1, lon1, lat2, lon2)
+                    return True
+                except HTTPException as e:
+                    print(f"Warm-up route leg failed: {e.detail}")
+                    return False
+
+        warmed = await asyncio.gather(*(
+            warm_leg(lat1, lon1, lat2, lon2) for (lat1, lon1), (lat2, lon2) in legs
+        ))
+        self.steps["routes"] = {"status": "ok" if all(warmed) else "error",
+                                "ms": round((time.perf_counter() - start) * 1000, 1),
+                                "legs": len(legs), "failed": warmed.count(False)}
+
+    async def _warm_summary(self, snapshot_task: asyncio.Task):
+        snapshot = await snapshot_task
+        if snapshot is not None:
+            await self._step("inventory_summary", inventory_summary, snapshot)
+
+    async def run(self):
+        self.state = "running"
+        start = time.perf_counter()
+        snapshot = asyncio.create_task(self._step("inventory_snapshot", get_inventory_snapshot))
+        batches = asyncio.create_task(self._step("batches", get_batches_frame))
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                snapshot,
+                batches,
+                self._step("products", get_products_frame),
+                self._step("executive_dashboard", executive_dashboard),
+                self._warm_summary(snapshot),
+                self._warm_routes(batches),
+                # The chat client is imported lazily; load it off the request path
+                self._step("openai_import", importlib.import_module, "openai"),
+            ), timeout=self.timeout_seconds)
+            self.state = "ready"
+        except asyncio.TimeoutError:
+            print(f"Warm-up did not finish within {self.timeout_seconds}s; serving with partly warm caches")
+            self.state = "timeout"
+        self.duration_seconds = round(time.perf_counter() - start, 3)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "duration_s": self.duration_seconds,
+            "steps": self.steps,
+        }
+
+warmup = StartupWarmup(STARTUP_WARMUP, STARTUP_WARMUP_TIMEOUT_SECONDS)
+
+class TableVersionWatcher:
+    """
+    Background poll of the source tables' versions (Delta table history).
+
+    When a table's version changes, the cache entries and snapshots derived
+    from it are invalidated by tag, refreshed in place or dropped.
+    """
+
+    def __init__(self, interval_seconds: float = 60.0, refresh: bool = True):
+        self.interval_seconds = interval_seconds
+        self.refresh = refresh
+        self.versions: Dict[str, str] = {}
+        self.checked_at: Optional[str] = None
+        self.invalidations: List[dict] = []
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def check(self) -> List[str]:
+        """Read every table's version; invalidates and returns the tags of the tables that changed"""
+        changed = []
+        for tag, query_name in TABLE_VERSION_QUERIES.items():
+            df = query_warehouse(queries.bind(query_name))
+            version = str(df['version'].iloc[0])
+            previous_version = self.versions.get(tag)
+            self.versions[tag] = version
+            if previous_version is not None and previous_version != version:
+                changed.append(tag)
+        self.checked_at = datetime.now().isoformat(timespec="seconds")
+        if changed:
+            result = invalidate_cache_tags(changed, refresh=self.refresh)
+            self.invalidations = (self.invalidations + [{
+                "at": self.checked_at,
+                "tags": changed,
+                "mode": result["mode"],
+                "keys": len(result["dropped"]) + len(result["refreshing"]),
+            }])[-10:]
+        return changed
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.check)
+                self.last_error = None
+            except Exception as e:
+                detail = str(e.detail if isinstance(e, HTTPException) else e)
+                # Report a failure once, not on every poll
+                if detail != self.last_error:
+                    print(f"Table version check failed: {detail}")
+                self.last_error = detail
+            await asyncio.sleep(self.interval_seconds)
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.interval_seconds > 0,
+            "interval_s": self.interval_seconds,
+            "mode": "refresh" if self.refresh else "drop",
+            "versions": self.versions,
+            "checked_at": self.checked_at,
+            "last_error": self.last_error,
+            "invalidations": self.invalidations,
+        }
+
+table_watcher = TableVersionWatcher(TABLE_VERSION_POLL_SECONDS, refresh=TABLE_VERSION_INVALIDATION != "drop")
+
+# Cache snapshots on local disk for warm restarts (unset disables): the
+# in-process cache is saved this often and on shutdown, and reloaded at startup
+CACHE_PERSIST_DIR = os.getenv("CACHE_PERSIST_DIR", "")
+CACHE_PERSIST_INTERVAL_SECONDS = float(os.getenv("CACHE_PERSIST_INTERVAL_SECONDS", "60"))
+
+def cache_refresher(key: str, ttl_seconds: float) -> Optional[Callable[[], object]]:
+    """
+    How to recompute a cache key from the key alone: a registered query (with
+    the current SQL, matched by fingerprint) or an OSRM route; None otherwise.
+    """
+    if key.startswith("route_"):
+        try:
+            lat1, lon1, lat2, lon2 = (float(part) for part in key[len("route_"):].split("_"))
+        except ValueError:
+            return None
+        return lambda: fetch_route(lat1, lon1, lat2, lon2, fallback=False)
+    fingerprint, _, parameters = key.partition("?")
+    try:
+        query = queries.get(query_name(key))
+    except KeyError:
+        return None
+    if query.fingerprint != fingerprint:
+        # Cached from SQL this deploy no longer runs
+        return None
+    try:
+        bound = query.bind(**dict(parse_qsl(parameters)))
+    except ValueError:
+        return None
+    transform = QUERY_TRANSFORMS.get(query.name)
+    return lambda: query_warehouse(bound, key, ttl_seconds, transform)
+
+class CachePersister:
+    """
+    Periodic, crash-safe snapshots of the in-process cache (cache_persistence.py).
+
+    At startup the last snapshot is reloaded: entries still within their TTL
+    are served at once, expired ones only as the stale fallback. The table
+    versions saved with it are handed to the table version watcher, whose
+    first poll refreshes (or drops) what was read from a table that has
+    changed since; a snapshot saved without table versions is refreshed in
+    full in the background.
+    """
+
+    def __init__(self, directory: str, interval_seconds: float = 60.0):
+        self.store = CachePersistence(Path(directory)) if directory else None
+        self.interval_seconds = interval_seconds
+        self.restored: Optional[dict] = None
+        self.last_save: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self._saved_signature = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        # Shared backends (sqlite, redis) already outlive a restart
+        return self.store is not None and cache_backend.name == "memory"
+
+    def load(self) -> dict:
+        start = time.perf_counter()
+        entries, table_versions = self.store.load()
+        fresh = stale = skipped = 0
+        for entry in entries:
+            refresher = cache_refresher(entry.key, entry.ttl_seconds)
+            if refresher is None:
+                skipped += 1
+                continue
+            _refreshers[entry.key] = refresher
+            remember_last_good(entry.key, entry.data)
+            if entry.remaining_seconds() > 0:
+                cache_backend.set(entry.key, entry.data, entry.ttl_seconds, entry.version, entry.tags,
+                                  expires_at=entry.expires_at)
+                fresh += 1
+            else:
+                stale += 1
+        # Revalidated against the current versions on the watcher's next check
+        for tag, version in table_versions.items():
+            table_watcher.versions.setdefault(tag, version)
+        self._saved_signature = self._signature()
+        return {"fresh": fresh, "stale": stale, "skipped": skipped, "table_versions": table_versions,
+                "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    async def restore(self):
+        if self.store is None:
+            return
+        if not self.enabled:
+            print(f"CACHE_PERSIST_DIR is ignored with the {cache_backend.name} cache backend")
+            return
+        try:
+            self.restored = await asyncio.to_thread(self.load)
+        except Exception as e:
+            print(f"Error restoring the cache snapshot: {e}")
+            self.last_error = str(e)
+
+    def _signature(self):
+        return {key: (item.expires_at, item.version) for key, item, _ in cache_backend.entries()}
+
+    def save(self) -> Optional[dict]:
+        """Save the cache if it changed since the last save; returns the save's stats"""
+        signature = self._signature()
+        if signature == self._saved_signature:
+            return None
+        entries = [
+            PersistedEntry(key, item.data, item.expires_at, item.version, tags, item.ttl_seconds)
+            for key, item, tags in cache_backend.entries()
+            if cache_refresher(key, item.ttl_seconds) is not None
+        ]
+        self.last_save = {**self.store.save(entries, dict(table_watcher.versions)),
+                          "at": datetime.now().isoformat(timespec="seconds")}
+        self._saved_signature = signature
+        return self.last_save
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.enabled:
+            # Final snapshot for the next start
+            await asyncio.to_thread(self._save_reporting_errors)
+
+    async def revalidate(self):
+        """Check the restored entries in the background while they are served"""
+        if not self.restored["table_versions"]:
+            # Saved without table versions: refresh everything restored
+            for key in list(_refreshers):
+                _refresh_executor.submit(refresh_cache_entry, key)
+        elif table_watcher.interval_seconds <= 0:
+            # No polling watcher to compare the versions: check once
+            try:
+                await asyncio.to_thread(table_watcher.check)
+            except Exception as e:
+                print(f"Could not revalidate the restored cache: {e}")
+
+    def _save_reporting_errors(self):
+        try:
+            self.save()
+            self.last_error = None
+        except Exception as e:
+            print(f"Error saving the cache snapshot: {e}")
+            self.last_error = str(e)
+
+    async def run(self):
+        if self.restored and self.restored["fresh"]:
+            await self.revalidate()
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await asyncio.to_thread(self._save_reporting_errors)
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.store.directory) if self.store is not None else None,
+            "interval_s": self.interval_seconds,
+            "restored": self.restored,
+            "last_save": self.last_save,
+            "last_error": self.last_error,
+        }
+
+cache_persister = CachePersister(CACHE_PERSIST_DIR, CACHE_PERSIST_INTERVAL_SECONDS)
+
+@app.get("/api/cache/persistence")
+def get_cache_persistence():
+    """Cache snapshot restored at startup and the last periodic save"""
+    return cache_persister.status()
+
+# Inventory summary history (see history.py): a point every
+# HISTORY_SNAPSHOT_SECONDS in date-partitioned Parquet under HISTORY_DIR, with
+# daily and monthly rollups for the dashboard's trend charts (empty: no history)
+HISTORY_DIR = os.getenv("HISTORY_DIR", str(Path(tempfile.gettempdir()) / "supply_chain_history"))
+HISTORY_SNAPSHOT_SECONDS = float(os.getenv("HISTORY_SNAPSHOT_SECONDS", "300"))
+HISTORY_RAW_RETENTION_DAYS = int(os.getenv("HISTORY_RAW_RETENTION_DAYS", "90"))
+history_store = HistoryStore(Path(HISTORY_DIR), HISTORY_RAW_RETENTION_DAYS) if HISTORY_DIR else None
+
+class HistoryRecorder:
+    """
+    Periodic summary points of the inventory snapshot, appended to the history store.
+
+    Workers sharing the store skip a point when another one recorded within
+    the interval, so there is about one point per interval however many run.
+    """
+
+    def __init__(self, interval_seconds: float = 300.0):
+        self.interval_seconds = interval_seconds
+        self.recorded = 0
+        self.last_recorded_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if history_store is not None and self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def record(self) -> bool:
+        """Append a point from the current snapshot; False if another worker just did"""
+        df = await cached_or_run("warehouse", get_inventory_snapshot)
+        point = await run_in_bulkhead("transforms", summary_point, df)
+        # Half an interval apart at least, so workers started at different times do not both record
+        appended = await asyncio.to_thread(
+            history_store.append, point, datetime.now(), self.interval_seconds / 2
+        )
+        if appended:
+            self.recorded += 1
+            self.last_recorded_at = datetime.now().isoformat(timespec="seconds")
+        return appended
+
+    async def run(self):
+        while True:
+            try:
+                await self.record()
+                self.last_error = None
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                print(f"Error recording inventory history: {detail}")
+                self.last_error = str(detail)
+            await asyncio.sleep(self.interval_seconds)
+
+    def status(self) -> dict:
+        return {
+            "enabled": history_store is not None,
+            "interval_s": self.interval_seconds,
+            "recorded": self.recorded,
+            "last_recorded_at": self.last_recorded_at,
+            "last_error": self.last_error,
+            **(history_store.status() if history_store is not None else {}),
+        }
+
+history_recorder = HistoryRecorder(HISTORY_SNAPSHOT_SECONDS)
+
+@app.get("/api/history/rollups")
+def get_history_rollups(granularity: str = "monthly", limit: Optional[int] = 12):
+    """
+    Daily or monthly rollups of the inventory summary history, oldest first:
+    snapshots, then the mean, min, max and last of each metric per period
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {list(GRANULARITIES)}")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    if history_store is None:
+        raise HTTPException(status_code=404, detail="History is not enabled; set HISTORY_DIR")
+    rollups = history_store.rollups(granularity, limit)
+    return {"granularity": granularity, "periods": frame_to_records(rollups)}
+
+@app.get("/api/history/status")
+def get_history_status():
+    """History recording state and the size of the store"""
+    return history_recorder.status()
+
+@app.get("/api/ready")
+def get_readiness():
+    """Readiness probe: 503 until the startup warm-up has finished"""
+    status = warmup.status()
+    if not warmup.ready:
+        return TimedJSONResponse(status_code=503, content=status)
+    return status
+
+@app.get("/_ah/warmup")
+async def app_engine_warmup():
+    """App Engine warmup request: returns once the caches are warm"""
+    await warmup.wait()
+    return warmup.status()
+
 # Mount static files and serve Flutter web app
-if FLUTTER_BUILD_PATH.exists():
-    # Mount static assets
-    app.mount("/assets", StaticFiles(directory=str(FLUTTER_BUILD_PATH / "assets")), name="assets")
-    app.mount("/canvaskit", StaticFiles(directory=str(FLUTTER_BUILD_PATH / "canvaskit")), name="canvaskit")
-    app.mount("/icons", StaticFiles(directory=str(FLUTTER_BUILD_PATH / "icons")), name="icons")
+if static_assets is not None:
+    # Static asset directories (compressed variants, ETags and cache headers from static_assets)
+    @app.get("/assets/{path:path}")
+    async def assets(path: str, request: Request):
+        return static_assets.response(request, f"assets/{path}")
+
+    @app.get("/canvaskit/{path:path}")
+    async def canvaskit(path: str, request: Request):
+        return static_assets.response(request, f"canvaskit/{path}")
+
+    @app.get("/icons/{path:path}")
+    async def icons(path: str, request: Request):
+        return static_assets.response(request, f"icons/{path}")
 
     # Serve Flutter files at root
     @app.get("/favicon.png")
-    async def favicon():
-        return FileResponse(FLUTTER_BUILD_PATH / "favicon.png")
+    async def favicon(request: Request):
+        return static_assets.response(request, "favicon.png")
 
     @app.get("/flutter.js")
-    async def flutter_js():
-        return FileResponse(FLUTTER_BUILD_PATH / "flutter.js")
+    async def flutter_js(request: Request):
+        return static_assets.response(request, "flutter.js")
 
     @app.get("/flutter_bootstrap.js")
-    async def flutter_bootstrap():
-        return FileResponse(FLUTTER_BUILD_PATH / "flutter_bootstrap.js")
+    async def flutter_bootstrap(request: Request):
+        return static_assets.response(request, "flutter_bootstrap.js")
 
     @app.get("/main.dart.js")
-    async def main_dart_js():
-        return FileResponse(FLUTTER_BUILD_PATH / "main.dart.js")
+    async def main_dart_js(request: Request):
+        return static_assets.response(request, "main.dart.js")
 
     @app.get("/manifest.json")
-    async def manifest():
-        return FileResponse(FLUTTER_BUILD_PATH / "manifest.json")
+    async def manifest(request: Request):
+        return static_assets.response(request, "manifest.json")
 
     @app.get("/version.json")
-    async def version():
-        return FileResponse(FLUTTER_BUILD_PATH / "version.json")
+    async def version(request: Request):
+        return static_assets.response(request, "version.json")
 
     @app.get("/flutter_service_worker.js")
-    async def service_worker():
-        return FileResponse(FLUTTER_BUILD_PATH / "flutter_service_worker.js")
+    async def service_worker(request: Request):
+        return static_assets.response(request, "flutter_service_worker.js")
 
-    # Serve index.html for root and any other path (SPA routing)
+    # Serve index.html (held in memory) for root and any other path (SPA routing)
     @app.get("/")
-    async def serve_app():
-        return FileResponse(FLUTTER_BUILD_PATH / "index.html")
+    async def serve_app(request: Request):
+        return static_assets.response(request, "index.html")
 
     @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
+    async def serve_spa(full_path: str, request: Request):
         # If the path doesn't start with /api, serve the Flutter app
         if not full_path.startswith("api/"):
-            return FileResponse(FLUTTER_BUILD_PATH / "index.html")
+            return static_assets.response(request, "index.html")
         # Otherwise let FastAPI handle 404
         raise HTTPException(status_code=404, detail="Not found")
 
@@ -586,8 +1786,176 @@ class ChatResponse(BaseModel):
     response: str
     model: str
 
+class ChatSessionCreateRequest(BaseModel):
+    context: str  # "executiveDashboard", "realtimeSnapshot", "shipmentTracking"
+    selected_batch_id: Optional[str] = None
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
+    context: str
+
+class ChatSessionMessageRequest(BaseModel):
+    content: str
+    selected_batch_id: Optional[str] = None  # Set to switch the batch in focus ("" clears it)
+
+
+# Client-facing context names mapped to the chat contexts used internally
+CHAT_SESSION_CONTEXTS = {
+    "executiveDashboard": "executive",
+    "realtimeSnapshot": "realtime",
+    "shipmentTracking": "shipment",
+}
+
+# Server-side chat sessions (bounded; old turns are trimmed into a short recap).
+# Sessions live in the memory of the worker that created them: with several
+# workers or instances, route each client to one of them (sticky sessions),
+# or a session's messages reach workers that answer 404
+chat_sessions = ChatSessionStore(
+    max_sessions=int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "1000")),
+    idle_ttl_seconds=int(os.getenv("CHAT_SESSION_IDLE_TTL_SECONDS", "3600")),
+    max_messages=int(os.getenv("CHAT_SESSION_MAX_MESSAGES", "20")),
+    max_history_tokens=int(os.getenv("CHAT_SESSION_MAX_HISTORY_TOKENS", "6000"))
+)
+
+
+# Time budget (seconds) for each chat context source. A source that does not
+# answer in time is dropped from the prompt instead of delaying the first token.
+# Override per source with CHAT_CONTEXT_TIMEOUT_<SOURCE>, e.g. CHAT_CONTEXT_TIMEOUT_INVENTORY.
+CHAT_CONTEXT_TIMEOUT_SECONDS = float(os.getenv("CHAT_CONTEXT_TIMEOUT_SECONDS", "3.0"))
+
+
+def get_chat_context_timeout(source: str) -> float:
+    """Get the time budget for a chat context source"""
+    override = os.getenv(f"CHAT_CONTEXT_TIMEOUT_{source.upper()}")
+    return float(override) if override else CHAT_CONTEXT_TIMEOUT_SECONDS
+
 
-async def generate_chat_stream_completions(messages: List[dict], model: str, endpoint: str, token: str):
+# Token budget for data-backed system prompts (CHAT_PROMPT_TOKEN_BUDGET, or
+# CHAT_PROMPT_TOKEN_BUDGET_<ENDPOINT> for REALTIME / SHIPMENT). The system prompt
+# shrinks as the conversation grows so that system prompt + history stays within
+# CHAT_INPUT_TOKEN_BUDGET, but never below a quarter of its own budget.
+CHAT_INPUT_TOKEN_BUDGET = int(os.getenv("CHAT_INPUT_TOKEN_BUDGET", "16000"))
+PROMPT_BUDGET_STEP = 250
+
+
+def get_prompt_token_budget(endpoint: str, history: List[dict]) -> int:
+    """Get the system prompt token budget for an endpoint given the conversation so far"""
+    budget = int(os.getenv(
+        f"CHAT_PROMPT_TOKEN_BUDGET_{endpoint.upper()}",
+        os.getenv("CHAT_PROMPT_TOKEN_BUDGET", DEFAULT_PROMPT_TOKEN_BUDGET)
+    ))
+    available = CHAT_INPUT_TOKEN_BUDGET - estimate_message_tokens(history)
+    budget = max(budget // 4, min(budget, available))
+    # Round down to a step so the memoized prompt is reused across turns
+    return max(PROMPT_BUDGET_STEP, budget - budget % PROMPT_BUDGET_STEP)
+
+
+async def fetch_chat_context(source: str, func, *args, default=None):
+    """
+    Run a blocking context fetch within the source's time budget: cache hits
+    directly, misses in the warehouse bulkhead.
+
+    Args:
+        source: Name of the context source (used for the timeout override and logging)
+        func: Blocking callable that fetches the data, taking cache_only
+        *args: Arguments passed to func
+        default: Value returned when the source fails or exceeds its budget
+
+    Returns:
+        The fetched data, or default
+    """
+    timeout = get_chat_context_timeout(source)
+    try:
+        return await asyncio.wait_for(cached_or_run("warehouse", func, *args), timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"Chat context source '{source}' exceeded its {timeout}s budget, continuing without it")
+    except Exception as e:
+        print(f"Error fetching {source} for chat context: {e}")
+    return default
+
+
+# Upstream LLM admission control: per-model concurrency limit with a bounded,
+# per-client fair wait queue. Override the limit per model with
+# CHAT_MAX_CONCURRENT_STREAMS_<MODEL> (non-alphanumerics as "_", upper case).
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", "5000"))
+_admission_controllers: Dict[str, ModelAdmissionController] = {}
+telemetry.register_collector(telemetry.AdmissionCollector(lambda: _admission_controllers))
+
+
+def get_admission_controller(model: str) -> ModelAdmissionController:
+    """Get (or create) the admission controller for a model"""
+    controller = _admission_controllers.get(model)
+    if controller is None:
+        model_suffix = re.sub(r"[^A-Za-z0-9]", "_", model).upper()
+        controller = ModelAdmissionController(
+            max_concurrent=int(os.getenv(
+                f"CHAT_MAX_CONCURRENT_STREAMS_{model_suffix}",
+                os.getenv("CHAT_MAX_CONCURRENT_STREAMS", "8")
+            )),
+            max_queue=int(os.getenv("CHAT_MAX_QUEUED_STREAMS", "32")),
+            max_queue_per_client=int(os.getenv("CHAT_MAX_QUEUED_PER_CLIENT", "4")),
+            default_retry_after=int(os.getenv("CHAT_RETRY_AFTER_SECONDS", "5"))
+        )
+        _admission_controllers[model] = controller
+    return controller
+
+
+def get_client_id(http_request: Request) -> str:
+    """Identify the client for queue fairness (X-Client-Id header, else remote address)"""
+    client_id = http_request.headers.get("X-Client-Id")
+    if client_id:
+        return client_id
+    return http_request.client.host if http_request.client else "anonymous"
+
+
+def admit_chat_request(model: str, http_request: Request) -> AdmissionTicket:
+    """Take a place for an upstream call, or fail fast with 429 + Retry-After when the queue is full"""
+    try:
+        return get_admission_controller(model).request(get_client_id(http_request))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+
+async def admitted_stream(model: str, ticket: AdmissionTicket, stream):
+    """
+    Wrap an SSE generator so it only starts once the ticket is granted.
+
+    While waiting, yields {"queued": true, "position": N} events whenever the
+    position changes. The slot is released when the stream ends; the response
+    must also release it when it closes, as the stream may never start.
+    """
+    controller = get_admission_controller(model)
+    try:
+        last_position = None
+        while not ticket.is_granted:
+            position = controller.position(ticket)
+            if position != last_position:
+                yield f"data: {json.dumps({'queued': True, 'position': position})}\n\n"
+                last_position = position
+            await controller.wait(ticket, timeout=1.0)
+        async for event in stream:
+            yield event
+    finally:
+        controller.release(ticket)
+        await stream.aclose()
+
+
+def chat_completion_cache_key(messages: List[dict], model: str, endpoint: str, namespace: Optional[str]) -> Optional[str]:
+    """Completion cache key for a request, or None if it is not cacheable"""
+    if not namespace or not completion_cache.enabled or not messages or messages[0]["role"] != "system":
+        return None
+    return CompletionCache.make_key(model, endpoint, namespace, messages[0]["content"], messages[1:])
+
+
+async def generate_chat_stream_completions(
+    messages: List[dict],
+    model: str,
+    endpoint: str,
+    token: str,
+    cache_namespace: Optional[str] = None,
+    on_complete=None,
+    cached_text: Optional[str] = None
+):
     """
     Reusable async generator for streaming chat responses from Databricks.
 
@@ -596,36 +1964,65 @@ async def generate_chat_stream_completions(messages: List[dict], model: str, end
         model: The Databricks model name to use
         endpoint: The Databricks serving endpoint URL
         token: Databricks API token
+        cache_namespace: Optional - chat context name; when given, answers are
+            cached per system prompt and history
+        on_complete: Optional - called with the full answer text once it has
+            been streamed (live or from cache)
+        cached_text: Optional - a cached answer to replay instead of calling
+            the model (looked up by chat_streaming_response)
 
     Yields:
         SSE-formatted strings with JSON payloads containing 'content', 'done', or 'error'
     """
-    import asyncio
-    from openai import OpenAI
+    from openai import AsyncOpenAI
+
+    if cached_text is not None:
+        for chunk in iter_replay_chunks(cached_text):
+            yield f"data: {json.dumps({'content': chunk})}\n\n"
+            await asyncio.sleep(0)
+        if on_complete is not None:
+            on_complete(cached_text)
+        yield f"data: {json.dumps({'done': True, 'cached': True})}\n\n"
+        return
+
+    cache_key = chat_completion_cache_key(messages, model, endpoint, cache_namespace)
 
+    timer = LLMStreamTimer(model)
     try:
-        client = OpenAI(
+        client = AsyncOpenAI(
             api_key=token,
             base_url=endpoint
         )
 
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=model,
             messages=messages,
-            max_tokens=5000,
+            max_tokens=CHAT_MAX_TOKENS,
             stream=True
         )
 
-        for chunk in response:
+        content_parts = []
+        async for chunk in response:
             if chunk.choices and len(chunk.choices) > 0:
                 delta = chunk.choices[0].delta
                 if delta and delta.content:
+                    timer.first_token()
+                    content_parts.append(delta.content)
                     yield f"data: {json.dumps({'content': delta.content})}\n\n"
-                    await asyncio.sleep(0)
+
+        answer = "".join(content_parts)
+        timer.finish(estimate_tokens(answer))
+
+        # Only complete answers are cached
+        if cache_key and content_parts:
+            completion_cache.set(cache_key, answer, cache_namespace)
+        if on_complete is not None:
+            on_complete(answer)
 
         yield f"data: {json.dumps({'done': True})}\n\n"
 
     except Exception as e:
+        timer.finish(outcome="error")
         print(f"Chat stream error: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -635,7 +2032,6 @@ async def generate_chat_stream_completions(messages: List[dict], model: str, end
 @app.get("/api/test/stream")
 async def test_stream():
     """Test streaming endpoint to diagnose buffering issues"""
-    import asyncio
 
     async def generate_test_stream():
         # Send a simple counter stream
@@ -656,10 +2052,9 @@ async def test_stream():
     )
 
 @app.post("/api/chat/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(request: ChatRequest, http_request: Request):
     """Chat with Databricks model endpoint using streaming"""
-    import asyncio
-    from openai import OpenAI
+    from openai import AsyncOpenAI
 
     databricks_token = os.getenv("DATABRICKS_TOKEN")
     chat_endpoint = os.getenv("DATABRICKS_CHAT_ENDPOINT")
@@ -671,10 +2066,15 @@ async def chat_stream(request: ChatRequest):
             detail="Chat endpoint not configured. Please set DATABRICKS_TOKEN, DATABRICKS_CHAT_ENDPOINT, and DATABRICKS_CHAT_MODEL in .env"
         )
 
+    controller = get_admission_controller(chat_model)
+    ticket = admit_chat_request(chat_model, http_request)
+
     async def generate_stream():
+        timer = LLMStreamTimer(chat_model)
+        output_parts = []
         try:
             # Initialize OpenAI client with Databricks endpoint
-            client = OpenAI(
+            client = AsyncOpenAI(
                 api_key=databricks_token,
                 base_url=chat_endpoint
             )
@@ -686,45 +2086,48 @@ async def chat_stream(request: ChatRequest):
             ]
 
             # Make the streaming chat completion request (Databricks responses API)
-            response = client.responses.create(
+            response = await client.responses.create(
                 model=chat_model,
                 input=messages,
                 stream=True  # Boolean: True for streaming, False for non-streaming
             )
 
             # Stream the response chunks
-            for chunk in response:
+            async for chunk in response:
                 # Databricks uses chunk.delta for streaming text
                 if hasattr(chunk, 'delta') and chunk.delta:
+                    timer.first_token()
+                    output_parts.append(chunk.delta)
                     # Yield the delta content directly
                     yield f"data: {json.dumps({'content': chunk.delta})}\n\n"
-                    # Allow other async tasks to run
-                    await asyncio.sleep(0)
+
+            timer.finish(estimate_tokens("".join(output_parts)))
 
             # Send done signal
             yield f"data: {json.dumps({'done': True})}\n\n"
 
         except Exception as e:
+            timer.finish(outcome="error")
             print(f"Stream error: {str(e)}")
             import traceback
             traceback.print_exc()
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
-    return StreamingResponse(
-        generate_stream(),
+    return ClosingStreamingResponse(
+        admitted_stream(chat_model, ticket, generate_stream()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
             "Transfer-Encoding": "chunked"
-        }
+        },
+        on_close=[lambda: controller.release(ticket)]
     )
 
 
-@app.post("/api/chat/executive-dashboard/stream")
-async def chat_executive_dashboard_stream(request: ChatRequest):
-    """Chat with executive dashboard context - streaming response with metrics.yaml data"""
+def get_general_chat_config():
+    """Get (token, endpoint, model) for the context-aware chat endpoints"""
     databricks_token = os.getenv("DATABRICKS_TOKEN")
     chat_endpoint = os.getenv("DATABRICKS_CHAT_ENDPOINT")
     chat_model = os.getenv("DATABRICKS_GENERAL_MODEL")
@@ -734,114 +2137,233 @@ async def chat_executive_dashboard_stream(request: ChatRequest):
             status_code=500,
             detail="Chat endpoint not configured. Please set DATABRICKS_TOKEN, DATABRICKS_CHAT_ENDPOINT, and DATABRICKS_GENERAL_MODEL in .env"
         )
+    return databricks_token, chat_endpoint, chat_model
 
-    # Build messages with executive dashboard system prompt
-    messages = [{"role": "system", "content": build_executive_dashboard_system_prompt()}]
-    messages.extend({"role": msg.role, "content": msg.content} for msg in request.messages)
 
-    return StreamingResponse(
-        generate_chat_stream_completions(messages, chat_model, chat_endpoint, databricks_token),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "Transfer-Encoding": "chunked"
-        }
+async def build_realtime_chat_prompt(token_budget: int) -> str:
+    """Build the realtime snapshot system prompt from the current inventory snapshot"""
+    # Fetch the current inventory snapshot off the event loop
+    inventory_df = await fetch_chat_context("inventory", get_inventory_snapshot)
+
+    # Memoized per snapshot version
+    return await run_in_bulkhead(
+        "transforms",
+        build_realtime_snapshot_system_prompt,
+        inventory_df,
+        snapshot_version=inventory_df.attrs.get('snapshot_version') if inventory_df is not None else None,
+        token_budget=token_budget
     )
 
 
-@app.post("/api/chat/realtime-snapshot/stream")
-async def chat_realtime_snapshot_stream(request: ChatRequest):
-    """Chat with real-time inventory snapshot context - streaming response with live inventory data"""
-    databricks_token = os.getenv("DATABRICKS_TOKEN")
-    chat_endpoint = os.getenv("DATABRICKS_CHAT_ENDPOINT")
-    chat_model = os.getenv("DATABRICKS_GENERAL_MODEL")
+# Slowest entities and legs listed in the shipment prompt's bottleneck tables
+DWELL_PROMPT_ROWS = int(os.getenv("DWELL_PROMPT_ROWS", "15"))
 
-    if not all([databricks_token, chat_endpoint, chat_model]):
-        raise HTTPException(
-            status_code=500,
-            detail="Chat endpoint not configured. Please set DATABRICKS_TOKEN, DATABRICKS_CHAT_ENDPOINT, and DATABRICKS_GENERAL_MODEL in .env"
-        )
 
-    # Fetch current inventory data
-    try:
-        inventory_data = get_inventory()
-    except Exception as e:
-        print(f"Error fetching inventory for chat context: {e}")
-        inventory_data = []
+async def build_shipment_chat_prompt(selected_batch_id: Optional[str], token_budget: int) -> str:
+    """Build the shipment tracking system prompt from the batch list and selected batch"""
+    # Fetch the batch list, dwell statistics and the selected batch's events concurrently, off the event loop
+    batches_task = fetch_chat_context("batches", get_batches_frame)
+    dwell_task = fetch_chat_context("dwell", get_dwell_analytics)
+    if selected_batch_id:
+        events_task = fetch_chat_context("batch_events", get_batch_events_frame, selected_batch_id)
+        batches_df, analytics, batch_events = await asyncio.gather(batches_task, dwell_task, events_task)
+    else:
+        (batches_df, analytics), batch_events = await asyncio.gather(batches_task, dwell_task), None
+    dwell_stats = analytics.summary(DWELL_PROMPT_ROWS) if analytics is not None else None
+
+    # The prompt is memoized per (batch list version, events version, dwell version, selected batch)
+    snapshot_version = None
+    if batches_df is not None:
+        events_version = batch_events.attrs.get('snapshot_version') if batch_events is not None else None
+        dwell_version = dwell_stats['version'] if dwell_stats is not None else None
+        snapshot_version = f"{batches_df.attrs.get('snapshot_version')}/{events_version}/{dwell_version}"
+
+    return await run_in_bulkhead(
+        "transforms",
+        build_shipment_tracking_system_prompt,
+        batches_data=batches_df,
+        selected_batch_id=selected_batch_id,
+        batch_events=batch_events,
+        dwell_stats=dwell_stats,
+        snapshot_version=snapshot_version,
+        token_budget=token_budget
+    )
 
-    # Build messages with realtime snapshot system prompt
-    messages = [{"role": "system", "content": build_realtime_snapshot_system_prompt(inventory_data)}]
-    messages.extend({"role": msg.role, "content": msg.content} for msg in request.messages)
 
-    return StreamingResponse(
-        generate_chat_stream_completions(messages, chat_model, chat_endpoint, databricks_token),
+async def build_chat_system_prompt(context: str, token_budget: int, selected_batch_id: Optional[str] = None) -> str:
+    """Build the system prompt for a chat context ("executive", "realtime" or "shipment")"""
+    if context == "realtime":
+        return await build_realtime_chat_prompt(token_budget)
+    if context == "shipment":
+        return await build_shipment_chat_prompt(selected_batch_id, token_budget)
+    return await asyncio.to_thread(build_executive_dashboard_system_prompt)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    A streaming response that runs on_close callbacks once it has been sent,
+    failed or been cancelled. Unlike a generator's finally, this also runs
+    when the body iterator is never started (the client left first).
+    """
+
+    def __init__(self, *args, on_close=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = list(on_close)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            for callback in self.on_close:
+                callback()
+
+
+def chat_streaming_response(messages: List[dict], model: str, endpoint: str, token: str,
+                            cache_namespace: Optional[str], http_request: Request,
+                            on_complete=None, on_close=()) -> StreamingResponse:
+    """
+    Stream a chat completion (see generate_chat_stream_completions) in a
+    response that reports the prompt size.
+
+    The completion cache is consulted once, here: cached answers are replayed
+    without admission control; all others wait for an upstream slot (or get a
+    429), which is released when the response closes. on_close callbacks run
+    however the response ends.
+    """
+    cached_text = None
+    cache_key = chat_completion_cache_key(messages, model, endpoint, cache_namespace)
+    if cache_key:
+        cached_text = completion_cache.get(cache_key)
+        record_cache_event(f"chat_{cache_namespace}", "hit" if cached_text is not None else "miss")
+    stream = generate_chat_stream_completions(
+        messages, model, endpoint, token, cache_namespace=cache_namespace,
+        on_complete=on_complete, cached_text=cached_text
+    )
+    on_close = list(on_close)
+    if cached_text is None:
+        controller = get_admission_controller(model)
+        ticket = admit_chat_request(model, http_request)
+        on_close.append(lambda: controller.release(ticket))
+        stream = admitted_stream(model, ticket, stream)
+    return ClosingStreamingResponse(
+        stream,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
-            "Transfer-Encoding": "chunked"
-        }
+            "Transfer-Encoding": "chunked",
+            "X-Prompt-Tokens": str(estimate_message_tokens(messages))
+        },
+        on_close=on_close
     )
 
 
+@app.post("/api/chat/executive-dashboard/stream")
+async def chat_executive_dashboard_stream(request: ChatRequest, http_request: Request):
+    """Chat with executive dashboard context - streaming response with metrics.yaml data"""
+    databricks_token, chat_endpoint, chat_model = get_general_chat_config()
+
+    # Build messages with executive dashboard system prompt
+    history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    system_prompt = await build_chat_system_prompt("executive", get_prompt_token_budget("executive", history))
+    messages = [{"role": "system", "content": system_prompt}] + history
+
+    return chat_streaming_response(messages, chat_model, chat_endpoint, databricks_token, "executive", http_request)
+
+
+@app.post("/api/chat/realtime-snapshot/stream")
+async def chat_realtime_snapshot_stream(request: ChatRequest, http_request: Request):
+    """Chat with real-time inventory snapshot context - streaming response with live inventory data"""
+    databricks_token, chat_endpoint, chat_model = get_general_chat_config()
+
+    # Build messages with realtime snapshot system prompt
+    history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    system_prompt = await build_chat_system_prompt("realtime", get_prompt_token_budget("realtime", history))
+    messages = [{"role": "system", "content": system_prompt}] + history
+
+    return chat_streaming_response(messages, chat_model, chat_endpoint, databricks_token, "realtime", http_request)
+
+
 @app.post("/api/chat/shipment-tracking/stream")
-async def chat_shipment_tracking_stream(request: ShipmentTrackingChatRequest):
+async def chat_shipment_tracking_stream(request: ShipmentTrackingChatRequest, http_request: Request):
     """Chat with shipment tracking context - streaming response with batch tracking data"""
-    databricks_token = os.getenv("DATABRICKS_TOKEN")
-    chat_endpoint = os.getenv("DATABRICKS_CHAT_ENDPOINT")
-    chat_model = os.getenv("DATABRICKS_GENERAL_MODEL")
+    databricks_token, chat_endpoint, chat_model = get_general_chat_config()
 
-    if not all([databricks_token, chat_endpoint, chat_model]):
+    # Build messages with shipment tracking system prompt
+    history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    system_prompt = await build_chat_system_prompt(
+        "shipment", get_prompt_token_budget("shipment", history), request.selected_batch_id
+    )
+    messages = [{"role": "system", "content": system_prompt}] + history
+
+    return chat_streaming_response(messages, chat_model, chat_endpoint, databricks_token, "shipment", http_request)
+
+
+@app.post("/api/chat/sessions", response_model=ChatSessionResponse)
+async def create_chat_session(request: ChatSessionCreateRequest):
+    """Create a server-side chat session for one of the context-aware chats"""
+    context = CHAT_SESSION_CONTEXTS.get(request.context)
+    if context is None:
         raise HTTPException(
-            status_code=500,
-            detail="Chat endpoint not configured. Please set DATABRICKS_TOKEN, DATABRICKS_CHAT_ENDPOINT, and DATABRICKS_GENERAL_MODEL in .env"
+            status_code=400,
+            detail=f"Unknown chat context '{request.context}'. Use one of: {', '.join(CHAT_SESSION_CONTEXTS)}"
         )
+    session = chat_sessions.create(context, request.selected_batch_id)
+    return ChatSessionResponse(session_id=session.session_id, context=request.context)
+
+
+@app.post("/api/chat/sessions/{session_id}/messages")
+async def chat_session_message_stream(session_id: str, request: ChatSessionMessageRequest, http_request: Request):
+    """Send the next user message of a session - streaming response like the context chat endpoints"""
+    databricks_token, chat_endpoint, chat_model = get_general_chat_config()
+
+    session = chat_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    if session.in_flight:
+        raise HTTPException(status_code=409, detail="A message is already being answered in this session")
+    # Claimed before the first await, so a concurrent post gets the 409; released
+    # when the response ends, or here if it is never built
+    session.in_flight = True
+
+    def release_session():
+        session.in_flight = False
 
-    # Fetch batches data
     try:
-        batches_response = get_batches()
-        batches_data = batches_response.get('batches', [])
-    except Exception as e:
-        print(f"Error fetching batches for chat context: {e}")
-        batches_data = []
+        if request.selected_batch_id is not None:
+            session.selected_batch_id = request.selected_batch_id or None
+
+        # Sessions use the endpoint's full budget rather than shrinking it as the
+        # conversation grows, so the system prompt only changes when the data does
+        # and upstream prefix caching can apply. History is bounded by trimming.
+        system_prompt = await build_chat_system_prompt(
+            session.context, get_prompt_token_budget(session.context, []), session.selected_batch_id
+        )
+        messages = [{"role": "system", "content": system_prompt}] + session.history(request.content)
 
-    # Fetch batch events if a specific batch is selected
-    batch_events = None
-    if request.selected_batch_id:
-        try:
-            batch_events = get_batch_events(request.selected_batch_id)
-        except Exception as e:
-            print(f"Error fetching batch events for {request.selected_batch_id}: {e}")
-            batch_events = None
+        return chat_streaming_response(
+            messages, chat_model, chat_endpoint, databricks_token, session.context, http_request,
+            on_complete=lambda text: chat_sessions.record_turn(session, request.content, text),
+            on_close=[release_session]
+        )
+    except BaseException:
+        release_session()
+        raise
 
-    # Build messages with shipment tracking system prompt
-    system_prompt = build_shipment_tracking_system_prompt(
-        batches_data=batches_data,
-        selected_batch_id=request.selected_batch_id,
-        batch_events=batch_events
-    )
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend({"role": msg.role, "content": msg.content} for msg in request.messages)
 
-    return StreamingResponse(
-        generate_chat_stream_completions(messages, chat_model, chat_endpoint, databricks_token),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "Transfer-Encoding": "chunked"
-        }
-    )
+@app.delete("/api/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    """Delete a chat session and its history"""
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return {"message": "Chat session deleted"}
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Chat with Databricks model endpoint using OpenAI SDK (non-streaming)"""
-    from openai import OpenAI
+    from openai import AsyncOpenAI
 
     databricks_token = os.getenv("DATABRICKS_TOKEN")
     chat_endpoint = os.getenv("DATABRICKS_CHAT_ENDPOINT")
@@ -853,9 +2375,17 @@ async def chat(request: ChatRequest):
             detail="Chat endpoint not configured. Please set DATABRICKS_TOKEN, DATABRICKS_CHAT_ENDPOINT, and DATABRICKS_CHAT_MODEL in .env"
         )
 
+    # Wait for an upstream slot (the queue is bounded, so this fails fast with 429 when full)
+    controller = get_admission_controller(chat_model)
+    ticket = admit_chat_request(chat_model, http_request)
+    timer = None
+
     try:
+        while not ticket.is_granted:
+            await controller.wait(ticket, timeout=1.0)
+
         # Initialize OpenAI client with Databricks endpoint
-        client = OpenAI(
+        client = AsyncOpenAI(
             api_key=databricks_token,
             base_url=chat_endpoint
         )
@@ -867,13 +2397,15 @@ async def chat(request: ChatRequest):
         ]
 
         # Make the chat completion request using responses.create (Databricks format)
-        response = client.responses.create(
+        timer = LLMStreamTimer(chat_model)
+        response = await client.responses.create(
             model=chat_model,
             input=messages
         )
 
         # Extract the response text from Databricks format
         response_text = response.output[0].content[0].text
+        timer.finish()
 
         return ChatResponse(
             response=response_text,
@@ -881,7 +2413,11 @@ async def chat(request: ChatRequest):
         )
 
     except Exception as e:
+        if timer is not None:
+            timer.finish(outcome="error")
         raise HTTPException(
             status_code=500,
             detail=f"Error calling chat endpoint: {str(e)}"
         )
+    finally:
+        controller.release(ticket)
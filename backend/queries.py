@@ -0,0 +1,208 @@
+"""
+Named, parameterized warehouse queries.
+Every query the API runs is registered here once. Table names are resolved
+against DATABRICKS_CATALOG / DATABRICKS_SCHEMA when the registry is built,
+and values are bound as :name parameters instead of being formatted into the
+SQL, so each query is sent with the same text every time (letting the
+warehouse reuse its plan and result caches) and user input never becomes SQL.
+
+Each query has a fingerprint, its name plus a hash of its normalized SQL,
+which is the cache key (with the bound values appended) and the metrics label.
+Its cache tags name the tables and entities the result is derived from.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+import hashlib
+import re
+
+INVENTORY_TABLE = "inventory_realtime_v1"
+BATCH_EVENTS_TABLE = "batch_events_v1"
+
+# name -> SQL, with {inventory_table} / {batch_events_table} for the resolved table names
+QUERIES = {
+    "inventory_snapshot": "SELECT * FROM {inventory_table}",
+    "products_list": "SELECT DISTINCT product_name FROM {inventory_table}",
+    "batch_events": """
+        SELECT * FROM {batch_events_table}
+        WHERE batch_id = :batch_id
+        ORDER BY event_time_cst
+    """,
+    "batch_events_all": "SELECT * FROM {batch_events_table} ORDER BY batch_id, event_time_cst",
+    # Events added since the last one consumed, for incremental analytics
+    "batch_events_since": "SELECT * FROM {batch_events_table} WHERE record_id > :after_record_id ORDER BY record_id",
+    # Join with inventory to get transit_status for each batch
+    "batches_list": """
+        SELECT DISTINCT
+            b.batch_id,
+            b.product_name,
+            COALESCE(i.transit_status, 'On Time') as transit_status
+        FROM {batch_events_table} b
+        LEFT JOIN {inventory_table} i ON b.batch_id = i.batch_id
+    """,
+    "inventory_value_calc": "SELECT qty, unit_price FROM {inventory_table}",
+    "inventory_levels_calc": "SELECT status, qty, unit_price FROM {inventory_table}",
+    # Latest version of each source table (Delta table history)
+    "inventory_version": "DESCRIBE HISTORY {inventory_table} LIMIT 1",
+    "batch_events_version": "DESCRIBE HISTORY {batch_events_table} LIMIT 1",
+}
+
+# name -> cache tags of its results, formatted with the bound parameters
+QUERY_TAGS = {
+    "inventory_snapshot": ("inventory",),
+    "products_list": ("inventory",),
+    "batch_events": ("batch_events", "batch:{batch_id}"),
+    "batch_events_all": ("batch_events",),
+    "batch_events_since": ("batch_events",),
+    "batches_list": ("batch_events", "inventory"),
+    "inventory_value_calc": ("inventory", "dashboard"),
+    "inventory_levels_calc": ("inventory", "dashboard"),
+}
+
+# Statement timeouts (seconds) of queries that differ from the default
+QUERY_TIMEOUTS = {
+    # Metadata lookups; a slow one should not hold a poll up
+    "inventory_version": 15,
+    "batch_events_version": 15,
+}
+
+# Tag of a source table -> the query of its latest version
+TABLE_VERSION_QUERIES = {
+    "inventory": "inventory_version",
+    "batch_events": "batch_events_version",
+}
+# Entity tags ("batch:<id>") -> the tag of the table the entity lives in
+ENTITY_TABLE_TAGS = {
+    "batch": "batch_events",
+}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# :name markers, but not :: casts
+_PARAMETER_MARKER = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def qualified_table(table: str, catalog: str = "", schema: str = "") -> str:
+    """catalog.schema.table when both are set, otherwise the bare table name"""
+    return f"{catalog}.{schema}.{table}" if catalog and schema else table
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL with whitespace collapsed and any trailing semicolon removed"""
+    return " ".join(sql.split()).rstrip(";").rstrip()
+
+
+def table_tag(tag: str) -> str:
+    """The table tag covering a tag: batch:<id> -> batch_events, table tags as they are"""
+    entity, separator, _ = tag.partition(":")
+    return ENTITY_TABLE_TAGS.get(entity, tag) if separator else tag
+
+
+def query_name(cache_key: str) -> str:
+    """The query name a cache key was built from (keys of other data are returned as is)"""
+    return cache_key.split("@", 1)[0]
+
+
+def parse_timeouts(spec: str) -> Dict[str, float]:
+    """Per-query timeouts from "name=seconds,name=seconds" """
+    timeouts = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class Query:
+    """A registered query: resolved SQL, its parameter names and fingerprint"""
+
+    def __init__(self, name: str, sql: str, tags=(), timeout_seconds: Optional[float] = None):
+        self.name = name
+        self.sql = normalize_sql(sql)
+        self.tags = tuple(tags)
+        # None: the caller's default statement timeout
+        self.timeout_seconds = timeout_seconds
+        self.parameters = frozenset(_PARAMETER_MARKER.findall(_STRING_LITERAL.sub("''", self.sql)))
+        digest = hashlib.sha256(self.sql.encode()).hexdigest()[:12]
+        self.fingerprint = f"{name}@{digest}"
+
+    def bind(self, **parameters) -> "BoundQuery":
+        """Bind values to every parameter marker of the query"""
+        missing = self.parameters - parameters.keys()
+        unexpected = parameters.keys() - self.parameters
+        if missing or unexpected:
+            raise ValueError(
+                f"Query {self.name} takes parameters {sorted(self.parameters)}, "
+                f"got {sorted(parameters)}"
+            )
+        return BoundQuery(self, parameters)
+
+
+class BoundQuery:
+    """A query with its parameter values, ready to execute"""
+
+    def __init__(self, query: Query, parameters: Dict[str, Any]):
+        self.query = query
+        self.parameters = parameters
+
+    @property
+    def sql(self) -> str:
+        return self.query.sql
+
+    @property
+    def name(self) -> str:
+        return self.query.name
+
+    @property
+    def fingerprint(self) -> str:
+        return self.query.fingerprint
+
+    @property
+    def timeout_seconds(self) -> Optional[float]:
+        return self.query.timeout_seconds
+
+    @property
+    def cache_key(self) -> str:
+        """The fingerprint, plus the bound values for parameterized queries"""
+        if not self.parameters:
+            return self.query.fingerprint
+        return f"{self.query.fingerprint}?{urlencode(sorted(self.parameters.items()))}"
+
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        return tuple(tag.format(**self.parameters) for tag in self.query.tags)
+
+    def execute(self, cursor):
+        """Execute on a DB-API cursor, passing the values as named parameters"""
+        if self.parameters:
+            return cursor.execute(self.sql, self.parameters)
+        return cursor.execute(self.sql)
+
+
+class QueryRegistry:
+    """
+    The registered queries, with table names resolved once for a catalog and schema.
+
+    timeouts overrides QUERY_TIMEOUTS per query name.
+    """
+
+    def __init__(self, catalog: str = "", schema: str = "", queries: Dict[str, str] = QUERIES,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.tables = {
+            "inventory_table": qualified_table(INVENTORY_TABLE, catalog, schema),
+            "batch_events_table": qualified_table(BATCH_EVENTS_TABLE, catalog, schema),
+        }
+        timeouts = {**QUERY_TIMEOUTS, **(timeouts or {})}
+        self._queries = {
+            name: Query(name, sql.format(**self.tables), QUERY_TAGS.get(name, ()), timeouts.get(name))
+            for name, sql in queries.items()
+        }
+
+    def get(self, name: str) -> Query:
+        return self._queries[name]
+
+    def items(self):
+        return self._queries.items()
+
+    def bind(self, name: str, **parameters) -> BoundQuery:
+        """Look up a query and bind its parameters"""
+        return self._queries[name].bind(**parameters)
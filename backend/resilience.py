@@ -0,0 +1,245 @@
+"""
+Keeping warehouse trouble from taking the API down.
+
+- Statement timeouts: a running statement is cancelled on the warehouse
+  (cursor.cancel) once its timeout passes.
+- Client disconnects: RequestScopeMiddleware notices when the client of an
+  /api request goes away and cancels the statements the request is running.
+- Circuit breaker: after repeated warehouse failures, queries fail fast for a
+  while instead of tying up request threads; the API serves the last good
+  result, marked stale, where it has one.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+import asyncio
+import threading
+import time
+
+# Headers of responses built from stale data
+STALE_HEADERS = [
+    (b"x-data-stale", b"true"),
+    (b"warning", b'110 - "Response is Stale"'),
+]
+
+
+class RequestScope:
+    """Per-request state shared with the threads serving the request"""
+
+    def __init__(self):
+        self.disconnected = False
+        self.stale = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def on_disconnect(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call callback when the client disconnects (at once if it already has); returns an unregister function"""
+        with self._lock:
+            if not self.disconnected:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def disconnect(self) -> List[Callable[[], None]]:
+        """Mark the client gone; returns the callbacks to run"""
+        with self._lock:
+            self.disconnected = True
+            callbacks, self._callbacks = self._callbacks, []
+        return callbacks
+
+
+_current_scope: ContextVar[Optional[RequestScope]] = ContextVar("request_scope", default=None)
+
+
+def current_scope() -> Optional[RequestScope]:
+    return _current_scope.get()
+
+
+def mark_stale():
+    """Flag the current request's response as built from stale data (no-op outside a request)"""
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.stale = True
+
+
+class RequestScopeMiddleware:
+    """
+    Plain ASGI middleware giving /api requests a RequestScope.
+
+    Incoming messages are read by a background task and handed on to the app,
+    so a disconnect is seen while the endpoint is still running; cancel
+    callbacks then run in the thread pool. Responses built from stale data
+    get X-Data-Stale and Warning headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        request_scope = RequestScope()
+        scope_token = _current_scope.set(request_scope)
+        messages: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        async def pump():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    for callback in request_scope.disconnect():
+                        loop.run_in_executor(None, callback)
+                    await messages.put(message)
+                    return
+                await messages.put(message)
+
+        async def receive_wrapper():
+            # Once the client is gone, every further read reports the disconnect
+            if request_scope.disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and request_scope.stale:
+                message = {**message, "headers": list(message.get("headers", [])) + STALE_HEADERS}
+            await send(message)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            pump_task.cancel()
+            _current_scope.reset(scope_token)
+
+
+class StatementGuard:
+    """Cancels a running statement once, recording why (timeout or disconnect)"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.reason: Optional[str] = None
+        self._done = False
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str):
+        with self._lock:
+            if self._done or self.reason is not None:
+                return
+            self.reason = reason
+        try:
+            self.cursor.cancel()
+        except Exception as e:
+            print(f"Error cancelling warehouse statement ({reason}): {e}")
+
+    def finish(self):
+        with self._lock:
+            self._done = True
+
+
+@contextmanager
+def guarded_statement(cursor, timeout_seconds: Optional[float]) -> Iterator[StatementGuard]:
+    """
+    Run a statement with a timeout and cancellation on client disconnect.
+
+    Check guard.reason when the statement raises: "timeout" or "disconnect"
+    if it was cancelled here.
+    """
+    guard = StatementGuard(cursor)
+    timer = None
+    if timeout_seconds:
+        timer = threading.Timer(timeout_seconds, guard.cancel, args=("timeout",))
+        timer.daemon = True
+        timer.start()
+    scope = _current_scope.get()
+    unregister = scope.on_disconnect(lambda: guard.cancel("disconnect")) if scope is not None else None
+    try:
+        yield guard
+    finally:
+        guard.finish()
+        if timer is not None:
+            timer.cancel()
+        if unregister is not None:
+            unregister()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Warehouse circuit open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls go through. After failure_threshold failures in a row it
+    opens: calls fail fast with CircuitOpenError for reset_seconds. Then it is
+    half-open: one trial call goes through, and its outcome closes or reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that neither succeeded nor failed against the warehouse (e.g. cancelled)"""
+        with self._lock:
+            self._trial_running = False
+
+    def status(self) -> dict:
+        with self._lock:
+            retry_after = None
+            if self.state == "open":
+                retry_after = round(max(0.0, self.opened_at + self.reset_seconds - time.monotonic()), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_s": self.reset_seconds,
+                "retry_after_s": retry_after,
+                "times_opened": self.times_opened,
+            }
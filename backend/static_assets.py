@@ -0,0 +1,235 @@
+"""
+Serving the Flutter web build with compression and HTTP caching.
+
+At startup every file of the build is indexed from its stat alone: the
+ETag comes from its size and modification time, so nothing is read or
+hashed before the app can listen. Compressible files get gzip and brotli variants next to them
+(<file>.gz, <file>.br): variants shipped with the build are used as they
+are, missing or outdated ones are generated once in the background. Brotli
+variants are only generated when the brotli package is installed.
+
+Requests get the preferred variant (brotli, then gzip) their Accept-Encoding allows. Files with a
+content hash in their name are cached as immutable for a year; all others
+are revalidated on use (a matching If-None-Match gets a 304). index.html,
+served for every SPA route, is held in memory with its variants once first
+requested.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import gzip
+import mimetypes
+import os
+import re
+import threading
+import uuid
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Suffixes worth compressing (images and fonts other than otf/ttf already are)
+COMPRESSIBLE_SUFFIXES = {
+    ".js", ".mjs", ".css", ".html", ".json", ".wasm", ".svg", ".txt", ".map",
+    ".otf", ".ttf", ".symbols", ".frag",
+}
+# Smaller files gain too little to be worth a variant
+MIN_COMPRESS_BYTES = 1024
+# Variant suffix per content coding, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# The codings this process can compress to
+GENERATED_ENCODINGS = tuple(encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None)
+
+# A hash of at least 8 hex digits as a name component: main.3f9a2c1b.js, chunk-0a1b2c3d4e.css
+_HASHED_NAME = re.compile(r"[.\-_][0-9a-f]{8,}\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Content codings from an Accept-Encoding header with their q-values"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _etag_matches(if_none_match: str, etags: List[str]) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    return brotli.compress(data) if encoding == "br" else gzip.compress(data, 9, mtime=0)
+
+
+def _write_atomically(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+class StaticAsset:
+    """One file of the build: its ETag, cache policy and compressed variants"""
+
+    def __init__(self, path: Path, relative_path: str, stat: os.stat_result):
+        self.path = path
+        self.relative_path = relative_path
+        self.size = stat.st_size
+        self.media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        # Size and mtime change with the content of a build file, without reading it
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if _HASHED_NAME.search(path.name) else REVALIDATE_CACHE_CONTROL
+        )
+        # encoding -> variant file
+        self.variants: Dict[str, Path] = {}
+        # Set for assets held in memory: identity and encoded bodies, read and compressed on first use
+        self.bodies: Optional[Dict[str, bytes]] = None
+
+    @property
+    def compressible(self) -> bool:
+        return self.path.suffix.lower() in COMPRESSIBLE_SUFFIXES and self.size >= MIN_COMPRESS_BYTES
+
+    def variant_etag(self, encoding: Optional[str]) -> str:
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+    def all_etags(self) -> List[str]:
+        return [self.etag] + [self.variant_etag(encoding) for encoding in ENCODINGS]
+
+    def held_body(self, encoding: Optional[str]) -> bytes:
+        """The body of an asset held in memory in a coding (None: identity)"""
+        key = encoding or "identity"
+        if key not in self.bodies:
+            if "identity" not in self.bodies:
+                self.bodies["identity"] = self.path.read_bytes()
+            self.bodies[key] = _compress(self.bodies["identity"], encoding)
+        return self.bodies[key]
+
+
+class StaticAssetServer:
+    """
+    The files of a web build, indexed at startup and served with negotiated compression.
+
+    in_memory names the files (relative to the root) whose bodies are held in memory.
+    """
+
+    def __init__(self, root: Path, in_memory: Tuple[str, ...] = ("index.html",), generate: bool = True):
+        self.root = Path(root)
+        self.in_memory = in_memory
+        self.generate = generate
+        self.assets: Dict[str, StaticAsset] = {}
+        # Set on shutdown to end generate_variants after the file it is writing
+        self._stop_generating = threading.Event()
+        self.discover()
+
+    def discover(self):
+        """Index the build's files and the variants already next to them"""
+        variant_suffixes = tuple(ENCODINGS.values())
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.name.endswith(variant_suffixes) or path.name.startswith("."):
+                continue
+            relative_path = path.relative_to(self.root).as_posix()
+            stat = path.stat()
+            asset = StaticAsset(path, relative_path, stat)
+            if asset.compressible:
+                for encoding, suffix in ENCODINGS.items():
+                    variant = path.with_name(path.name + suffix)
+                    # A variant older than its file is left over from a previous build
+                    if variant.exists() and variant.stat().st_mtime >= stat.st_mtime:
+                        asset.variants[encoding] = variant
+            if relative_path in self.in_memory:
+                asset.bodies = {}
+            self.assets[relative_path] = asset
+
+    def missing_variants(self) -> List[Tuple[StaticAsset, str]]:
+        """(asset, encoding) of the variants that can be generated but do not exist yet"""
+        return [
+            (asset, encoding)
+            for asset in self.assets.values()
+            if asset.compressible and asset.bodies is None
+            for encoding in GENERATED_ENCODINGS
+            if encoding not in asset.variants
+        ]
+
+    def generate_variants(self) -> int:
+        """Write the missing variants next to their files (blocking); returns how many were written"""
+        if not self.generate:
+            return 0
+        written = 0
+        for asset, encoding in self.missing_variants():
+            if self._stop_generating.is_set():
+                break
+            data = asset.path.read_bytes()
+            compressed = _compress(data, encoding)
+            if len(compressed) >= len(data):
+                continue
+            variant = asset.path.with_name(asset.path.name + ENCODINGS[encoding])
+            try:
+                _write_atomically(variant, compressed)
+            except OSError as e:
+                # A read-only build directory: serve the files uncompressed
+                print(f"Cannot write compressed static files: {e}")
+                break
+            asset.variants[encoding] = variant
+            written += 1
+        if written:
+            print(f"Compressed {written} static file variants")
+        return written
+
+    def stop_generating(self):
+        """Make a running generate_variants return before its next file"""
+        self._stop_generating.set()
+
+    def response(self, request: Request, relative_path: str) -> Response:
+        """The response for a build file (404 if the build has no such file)"""
+        asset = self.assets.get(relative_path)
+        if asset is None:
+            return Response(status_code=404)
+
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        if asset.bodies is not None:
+            available = GENERATED_ENCODINGS if asset.compressible else ()
+        else:
+            available = asset.variants.keys()
+        encoding = next(
+            (encoding for encoding in ENCODINGS if encoding in available and accepted.get(encoding, 0) > 0),
+            None
+        )
+        headers = {
+            "etag": asset.variant_etag(encoding),
+            "cache-control": asset.cache_control,
+        }
+        if asset.compressible:
+            headers["vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, asset.all_etags()):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        if asset.bodies is not None:
+            return Response(asset.held_body(encoding), media_type=asset.media_type, headers=headers)
+        path = asset.variants[encoding] if encoding is not None else asset.path
+        return FileResponse(path, media_type=asset.media_type, headers=headers)
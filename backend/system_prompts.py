@@ -3,9 +3,268 @@ System prompts for AI chat endpoints.
 Each function builds a context-aware system prompt with relevant data.
 """
 
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Any
-import yaml
+from typing import List, Dict, Any, Optional, Union
+import threading
+import pandas as pd
+
+from aggregates import delayed_mask, rollup
+
+
+# Rendered prompts keyed by (builder, snapshot version, ...). Builders are only
+# memoized when the caller passes a snapshot version, so an unchanged snapshot
+# never pays for aggregation and rendering twice.
+PROMPT_CACHE_MAX_ENTRIES = 64
+_prompt_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_prompt_cache_lock = threading.Lock()
+
+
+def _get_cached_prompt(key: tuple) -> Optional[str]:
+    """Get a rendered prompt from the memo cache"""
+    with _prompt_cache_lock:
+        prompt = _prompt_cache.get(key)
+        if prompt is not None:
+            _prompt_cache.move_to_end(key)
+        return prompt
+
+
+def _set_cached_prompt(key: tuple, prompt: str):
+    """Store a rendered prompt, evicting the least recently used entries"""
+    with _prompt_cache_lock:
+        _prompt_cache[key] = prompt
+        _prompt_cache.move_to_end(key)
+        while len(_prompt_cache) > PROMPT_CACHE_MAX_ENTRIES:
+            _prompt_cache.popitem(last=False)
+
+
+def clear_prompt_cache():
+    """Drop all memoized prompts"""
+    with _prompt_cache_lock:
+        _prompt_cache.clear()
+
+
+def _to_frame(data: Union[pd.DataFrame, List[Dict[str, Any]], None]) -> pd.DataFrame:
+    """Accept either a DataFrame or a list of records"""
+    if isinstance(data, pd.DataFrame):
+        return data
+    return pd.DataFrame.from_records(data or [])
+
+
+def _text_column(df: pd.DataFrame, name: str, default: str = '') -> pd.Series:
+    """Get a string column with missing values replaced by a default"""
+    if name not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    column = df[name]
+    if not column.hasnans:
+        return column
+    return column.astype(object).where(column.notna(), default)
+
+
+def _numeric_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Get a numeric column with missing values treated as zero"""
+    if name not in df.columns:
+        return pd.Series(0, index=df.index)
+    return pd.to_numeric(df[name], errors='coerce').fillna(0)
+
+
+def _unknown_for_missing(summary: pd.DataFrame) -> pd.DataFrame:
+    """A rollup with its missing group label shown as 'Unknown'"""
+    if not summary.index.hasnans:
+        return summary
+    summary = summary.copy()
+    summary.index = summary.index.astype(object).fillna('Unknown')
+    return summary
+
+
+def aggregate_inventory(inventory_data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Compute every rollup the realtime snapshot prompt needs in one vectorized pass.
+
+    Args:
+        inventory_data: Inventory snapshot as a DataFrame or list of records
+
+    Returns:
+        Dict with totals, status counts, per-product and per-location summaries,
+        delayed rows and a sample of rows
+    """
+    df = _to_frame(inventory_data)
+    qty = _numeric_column(df, 'qty')
+    value = qty * _numeric_column(df, 'unit_price')
+    if 'status_category' in df.columns:
+        status = _text_column(df, 'status_category', 'Unknown')
+    else:
+        status = _text_column(df, 'status', 'Unknown')
+    product = _text_column(df, 'product_name', 'Unknown')
+    location = _text_column(df, 'current_location', 'Unknown')
+    destination = _text_column(df, 'destination')
+    delayed = delayed_mask(df)
+
+    # Shared with /api/inventory/aggregate, memoized per snapshot version
+    product_summary = _unknown_for_missing(rollup(df, ('product_name',), ('qty', 'value', 'count')))
+    location_summary = _unknown_for_missing(rollup(df, ('current_location',), ('qty', 'count')))
+
+    return {
+        'total_records': len(df),
+        'total_units': int(qty.sum()),
+        'total_value': float(value.sum()),
+        'status_counts': status.value_counts(sort=True).to_dict(),
+        'delayed_count': int(delayed.sum()),
+        'unique_products': int(product[product != ''].nunique()),
+        'unique_locations': int(location[location != ''].nunique()),
+        'unique_destinations': int(destination[destination != ''].nunique()),
+        'product_summary': product_summary,
+        'location_summary': location_summary,
+        'delayed_items': df[delayed],
+        'sample': df.head(MAX_SECTION_ROWS),
+    }
+
+
+def aggregate_batches(batches_data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Compute every rollup the shipment tracking prompt needs in one vectorized pass.
+
+    Args:
+        batches_data: Batches as a DataFrame or list of records
+
+    Returns:
+        Dict with totals, per-product batch counts and delayed batches
+    """
+    df = _to_frame(batches_data)
+    delayed = delayed_mask(df)
+    product = _text_column(df, 'product_name', 'Unknown')
+
+    products_summary = (
+        pd.DataFrame({'product': product, 'delayed': delayed.astype(int)})
+        .groupby('product', sort=False)
+        .agg(total=('delayed', 'size'), delayed=('delayed', 'sum'))
+        .sort_values('total', ascending=False, kind='stable')
+    )
+
+    return {
+        'total_batches': len(df),
+        'delayed_mask': delayed,
+        'delayed_batches': df[delayed],
+        'products_summary': products_summary,
+    }
+
+
+def _records(df: pd.DataFrame, fill: Any = None) -> List[Dict[str, Any]]:
+    """Convert a (small) frame to records with missing values replaced by fill"""
+    return df.astype(object).where(df.notna(), fill).to_dict('records')
+
+
+# Default token budget for a data-backed system prompt, and the most candidate
+# rows any one section renders before the budget is applied
+DEFAULT_PROMPT_TOKEN_BUDGET = 3000
+MAX_SECTION_ROWS = 500
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate (~4 characters per token for English and tables)"""
+    return (len(text) + 3) // 4
+
+
+def estimate_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimate tokens for chat messages, including per-message framing overhead"""
+    return sum(estimate_tokens(str(m.get('content', ''))) + 4 for m in messages)
+
+
+def _table_row(*values: Any) -> str:
+    """Render one compact pipe-separated table row"""
+    return "|".join('' if v is None else str(v).replace('|', '/') for v in values)
+
+
+class PromptSection:
+    """
+    A titled block of prompt rows that can be shortened to fit a token budget.
+
+    Budget is handed out in two rounds: first every section gets up to
+    min_rows rows, then the rest goes to sections in priority order (lower
+    number first). Rows that do not fit are dropped and summarized by a
+    trailer line. keep='head' keeps the
+    leading rows; keep='ends' keeps the first row and as many of the latest
+    rows as fit (for timelines). Required sections are always rendered in full.
+    """
+
+    def __init__(self, title: str, rows: List[str], priority: int = 0, label: str = 'more rows',
+                 header: Optional[str] = None, total: Optional[int] = None, keep: str = 'head',
+                 required: bool = False, min_rows: int = 0):
+        self.title = title
+        self.rows = rows
+        self.priority = priority
+        self.label = label
+        self.header = header
+        self.total = len(rows) if total is None else total
+        self.keep = keep
+        self.required = required
+        self.min_rows = min_rows
+
+    def fixed_lines(self) -> List[str]:
+        return [self.title] + ([self.header] if self.header else [])
+
+
+def render_sections(preamble: List[str], sections: List[PromptSection], footer: List[str],
+                    token_budget: int) -> str:
+    """
+    Render prompt sections within a token budget.
+
+    The preamble, footer, section titles and required sections are always
+    kept; the remaining budget is handed to optional sections one row at a
+    time (see PromptSection).
+    """
+    fixed = list(preamble) + list(footer)
+    for section in sections:
+        fixed.extend(section.fixed_lines())
+        if section.required:
+            fixed.extend(section.rows)
+    remaining = token_budget - estimate_tokens("\n".join(fixed))
+
+    ordered = sorted(sections, key=lambda sec: sec.priority)
+    taken: Dict[int, List[int]] = {}
+    for section in ordered:
+        if section.required:
+            taken[id(section)] = list(range(len(section.rows)))
+        else:
+            taken[id(section)] = []
+            if len(section.rows) < section.total:
+                remaining -= 10  # trailer line
+
+    for first_round in (True, False):
+        for section in ordered:
+            rows = taken[id(section)]
+            if section.required or len(rows) == len(section.rows):
+                continue
+            if section.keep == 'ends':
+                order = [0] + list(range(len(section.rows) - 1, 0, -1))
+            else:
+                order = list(range(len(section.rows)))
+            limit = section.min_rows if first_round else len(order)
+            for index in order[len(rows):limit]:
+                cost = estimate_tokens(section.rows[index]) + 1
+                if cost > remaining:
+                    break
+                rows.append(index)
+                remaining -= cost
+
+    kept = {key: sorted(rows) for key, rows in taken.items()}
+
+    prompt_parts = list(preamble)
+    for section in sections:
+        prompt_parts.extend(section.fixed_lines())
+        indices = kept[id(section)]
+        omitted = section.total - len(indices)
+        if section.keep == 'ends' and omitted and indices:
+            # Omitted rows sit between the first row and the latest ones
+            prompt_parts.append(section.rows[indices[0]])
+            prompt_parts.append(f"  ... {omitted} {section.label} omitted")
+            prompt_parts.extend(section.rows[i] for i in indices[1:])
+        else:
+            prompt_parts.extend(section.rows[i] for i in indices)
+            if omitted:
+                prompt_parts.append(f"  ... and {omitted} {section.label}")
+    prompt_parts.extend(footer)
+    return "\n".join(prompt_parts)
 
 
 def build_executive_dashboard_system_prompt() -> str:
@@ -13,6 +272,14 @@ def build_executive_dashboard_system_prompt() -> str:
     metrics_path = Path(__file__).parent / "metrics.yaml"
 
     try:
+        # metrics.yaml only changes on deploy/edit, so its mtime versions the prompt
+        cache_key = ('executive', metrics_path.stat().st_mtime_ns)
+        cached_prompt = _get_cached_prompt(cache_key)
+        if cached_prompt is not None:
+            return cached_prompt
+
+        import yaml
+
         with open(metrics_path, 'r') as f:
             metrics = yaml.safe_load(f)
 
@@ -120,30 +387,49 @@ def build_executive_dashboard_system_prompt() -> str:
         prompt_parts.append("- Highlight risks and areas of concern")
         prompt_parts.append("- Provide actionable recommendations when appropriate")
 
-        return "\n".join(prompt_parts)
+        prompt = "\n".join(prompt_parts)
+        _set_cached_prompt(cache_key, prompt)
+        return prompt
 
     except Exception as e:
         return f"You are a Supply Chain Assistant. Note: Dashboard data could not be loaded ({str(e)}). Please answer general supply chain questions."
 
 
-def build_realtime_snapshot_system_prompt(inventory_data: List[Dict[str, Any]]) -> str:
+def build_realtime_snapshot_system_prompt(
+    inventory_data: Union[pd.DataFrame, List[Dict[str, Any]], None],
+    snapshot_version: Optional[str] = None,
+    token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET
+) -> str:
     """
     Build a system prompt with real-time inventory snapshot data.
 
+    Delayed shipments get budget first, then product and location rollups,
+    then individual shipment rows.
+
     Args:
-        inventory_data: List of inventory records from the database
+        inventory_data: Inventory snapshot as a DataFrame or list of records
+        snapshot_version: Optional - version of the snapshot; when given, the
+            rendered prompt is memoized under it and the token budget
+        token_budget: Approximate token budget for the whole system prompt
 
     Returns:
         System prompt string with inventory context
     """
-    if not inventory_data:
+    if snapshot_version is not None:
+        cache_key = ('realtime', snapshot_version, token_budget)
+        cached_prompt = _get_cached_prompt(cache_key)
+        if cached_prompt is not None:
+            return cached_prompt
+
+    inventory_df = _to_frame(inventory_data)
+    if inventory_df.empty:
         return (
             "You are a Supply Chain Inventory Assistant. "
             "Note: No inventory data is currently available. "
             "Please answer general inventory and supply chain questions."
         )
 
-    prompt_parts = [
+    preamble = [
         "You are a helpful Supply Chain Inventory Assistant with access to real-time inventory data.",
         "Answer questions based on the following inventory snapshot.",
         "Be specific, cite numbers, locations, and product details when appropriate.",
@@ -151,253 +437,306 @@ def build_realtime_snapshot_system_prompt(inventory_data: List[Dict[str, Any]])
         "IF the user says yes or explicitly asks for the reason why something is delayed or disrupted, then you should use information in your context to make an extremely plausible reason.",
         "you are being used as a part of a demo. Don't reveal that you are a demo.",
         "Indicate that the user can consult the planning agent incase any mitigation or if any action is needed and say this is intentional since you are meant to only provide information but not act like a planner.",
+        "Tables are pipe-separated with the column names in parentheses.",
         "",
         "=== REAL-TIME INVENTORY SNAPSHOT ===",
     ]
 
     # Calculate summary statistics
-    total_records = len(inventory_data)
-    total_units = sum(item.get('qty', 0) for item in inventory_data)
-    total_value = sum(item.get('qty', 0) * item.get('unit_price', 0) for item in inventory_data)
-
-    # Count by status category
-    status_counts = {}
-    for item in inventory_data:
-        status = item.get('status_category', item.get('status', 'Unknown'))
-        status_counts[status] = status_counts.get(status, 0) + 1
-
-    # Count delayed shipments
-    delayed_count = sum(
-        1 for item in inventory_data
-        if 'delay' in str(item.get('transit_status', '')).lower()
-    )
-
-    # Get unique products
-    products = set(item.get('product_name', '') for item in inventory_data if item.get('product_name'))
-
-    # Get unique locations
-    locations = set(item.get('current_location', '') for item in inventory_data if item.get('current_location'))
-
-    # Get unique destinations
-    destinations = set(item.get('destination', '') for item in inventory_data if item.get('destination'))
+    stats = aggregate_inventory(inventory_df)
+    total_records = stats['total_records']
+    delayed_count = stats['delayed_count']
 
     # Summary section
-    prompt_parts.append("\n## Summary Statistics:")
-    prompt_parts.append(f"- Total Shipments: {total_records}")
-    prompt_parts.append(f"- Total Units: {total_units:,}")
-    prompt_parts.append(f"- Total Value: ${total_value:,.2f}")
-    prompt_parts.append(f"- Delayed Shipments: {delayed_count}")
-    prompt_parts.append(f"- Unique Products: {len(products)}")
-    prompt_parts.append(f"- Unique Locations: {len(locations)}")
+    preamble.append("\n## Summary Statistics:")
+    preamble.append(f"- Total Shipments: {total_records}")
+    preamble.append(f"- Total Units: {stats['total_units']:,}")
+    preamble.append(f"- Total Value: ${stats['total_value']:,.2f}")
+    preamble.append(f"- Delayed Shipments: {delayed_count}")
+    preamble.append(f"- Unique Products: {stats['unique_products']}")
+    preamble.append(f"- Unique Locations: {stats['unique_locations']}")
 
     # Status breakdown
-    prompt_parts.append("\n## Status Breakdown:")
-    for status, count in sorted(status_counts.items(), key=lambda x: -x[1]):
-        prompt_parts.append(f"- {status}: {count} shipments")
+    preamble.append("\n## Status Breakdown:")
+    for status, count in stats['status_counts'].items():
+        preamble.append(f"- {status}: {count} shipments")
 
-    # Product inventory summary
-    prompt_parts.append("\n## Inventory by Product:")
-    product_summary = {}
-    for item in inventory_data:
-        product = item.get('product_name', 'Unknown')
-        if product not in product_summary:
-            product_summary[product] = {'qty': 0, 'value': 0, 'count': 0}
-        product_summary[product]['qty'] += item.get('qty', 0)
-        product_summary[product]['value'] += item.get('qty', 0) * item.get('unit_price', 0)
-        product_summary[product]['count'] += 1
-
-    for product, data in sorted(product_summary.items(), key=lambda x: -x[1]['qty']):
-        prompt_parts.append(
-            f"- {product}: {data['qty']:,} units, ${data['value']:,.2f} value, {data['count']} shipments"
-        )
-
-    # Location summary
-    prompt_parts.append("\n## Inventory by Current Location:")
-    location_summary = {}
-    for item in inventory_data:
-        location = item.get('current_location', 'Unknown')
-        if location not in location_summary:
-            location_summary[location] = {'qty': 0, 'count': 0}
-        location_summary[location]['qty'] += item.get('qty', 0)
-        location_summary[location]['count'] += 1
-
-    for location, data in sorted(location_summary.items(), key=lambda x: -x[1]['qty'])[:15]:
-        prompt_parts.append(f"- {location}: {data['qty']:,} units, {data['count']} shipments")
-
-    if len(location_summary) > 15:
-        prompt_parts.append(f"  ... and {len(location_summary) - 15} more locations")
+    sections = []
 
     # Delayed shipments detail (if any)
     if delayed_count > 0:
-        prompt_parts.append("\n## Delayed Shipments:")
-        delayed_items = [
-            item for item in inventory_data
-            if 'delay' in str(item.get('transit_status', '')).lower()
-        ]
-        for item in delayed_items[:10]:  # Limit to first 10
-            prompt_parts.append(
-                f"- {item.get('product_name', 'Unknown')} (Ref: {item.get('reference_number', 'N/A')}): "
-                f"{item.get('qty', 0)} units at {item.get('current_location', 'Unknown')} "
-                f"→ {item.get('destination', 'Unknown')}"
-            )
-        if len(delayed_items) > 10:
-            prompt_parts.append(f"  ... and {len(delayed_items) - 10} more delayed shipments")
-
-    # Sample of detailed records (for specific queries)
-    prompt_parts.append("\n## Sample Shipment Details (first 20 records):")
-    for item in inventory_data[:20]:
-        eta_info = ""
-        if item.get('expected_arrival_time'):
-            eta_info = f", ETA: {item.get('expected_arrival_time')}"
-        if item.get('time_remaining_to_destination_hours'):
-            hours = item.get('time_remaining_to_destination_hours')
-            eta_info += f" ({hours:.1f}h remaining)"
-
-        transit_status = item.get('transit_status', 'On Time')
-        delay_marker = " [DELAYED]" if 'delay' in transit_status.lower() else ""
-
-        prompt_parts.append(
-            f"- Ref {item.get('reference_number', 'N/A')}: {item.get('product_name', 'Unknown')} | "
-            f"{item.get('qty', 0)} units @ ${item.get('unit_price', 0):.2f} | "
-            f"{item.get('current_location', '?')} → {item.get('destination', '?')} | "
-            f"Status: {item.get('status', '?')}{delay_marker}{eta_info}"
-        )
+        sections.append(PromptSection(
+            "\n## Delayed Shipments (ref|product|qty|at|to):",
+            [
+                _table_row(item.get('reference_number') or 'N/A', item.get('product_name') or 'Unknown',
+                           item.get('qty') or 0, item.get('current_location') or 'Unknown',
+                           item.get('destination') or 'Unknown')
+                for item in _records(stats['delayed_items'].head(MAX_SECTION_ROWS))
+            ],
+            priority=0, label='more delayed shipments', total=delayed_count, min_rows=10
+        ))
 
-    if len(inventory_data) > 20:
-        prompt_parts.append(f"\n... and {len(inventory_data) - 20} more shipments in the system")
+    # Product inventory summary
+    product_summary = stats['product_summary']
+    sections.append(PromptSection(
+        "\n## Inventory by Product (product|units|value|shipments):",
+        [
+            _table_row(product, int(row['qty']), f"${row['value']:,.2f}", int(row['count']))
+            for product, row in product_summary.head(MAX_SECTION_ROWS).iterrows()
+        ],
+        priority=1, label='more products', total=len(product_summary), min_rows=10
+    ))
 
-    prompt_parts.append("\n=== END INVENTORY DATA ===")
-    prompt_parts.append("")
-    prompt_parts.append("When answering questions:")
-    prompt_parts.append("- Reference specific shipments by reference number when relevant")
-    prompt_parts.append("- Provide counts and totals from the summary data")
-    prompt_parts.append("- Highlight delayed shipments and potential issues")
-    prompt_parts.append("- Suggest actions for inventory optimization when appropriate")
-    prompt_parts.append("- If asked about a specific product or location, use the detailed data above")
+    # Location summary
+    location_summary = stats['location_summary']
+    sections.append(PromptSection(
+        "\n## Inventory by Current Location (location|units|shipments):",
+        [
+            _table_row(location, int(row['qty']), int(row['count']))
+            for location, row in location_summary.head(MAX_SECTION_ROWS).iterrows()
+        ],
+        priority=2, label='more locations', total=len(location_summary), min_rows=10
+    ))
+
+    # Detailed records (for specific queries)
+    shipment_rows = []
+    for item in _records(stats['sample']):
+        hours = item.get('time_remaining_to_destination_hours')
+        transit_status = str(item.get('transit_status') or 'On Time')
+        shipment_rows.append(_table_row(
+            item.get('reference_number') or 'N/A', item.get('product_name') or 'Unknown',
+            item.get('qty') or 0, f"{item.get('unit_price') or 0:.2f}",
+            item.get('current_location') or '?', item.get('destination') or '?',
+            item.get('status') or '?', 'Y' if 'delay' in transit_status.lower() else '',
+            item.get('expected_arrival_time') or '', f"{hours:.1f}" if hours else ''
+        ))
+    sections.append(PromptSection(
+        "\n## Shipment Details (ref|product|qty|unit_price|at|to|status|delayed|eta|hours_left):",
+        shipment_rows, priority=3, label='more shipments in the system', total=total_records
+    ))
+
+    footer = [
+        "\n=== END INVENTORY DATA ===",
+        "",
+        "When answering questions:",
+        "- Reference specific shipments by reference number when relevant",
+        "- Provide counts and totals from the summary data",
+        "- Highlight delayed shipments and potential issues",
+        "- Suggest actions for inventory optimization when appropriate",
+        "- If asked about a specific product or location, use the detailed data above",
+    ]
 
-    return "\n".join(prompt_parts)
+    prompt = render_sections(preamble, sections, footer, token_budget)
+    if snapshot_version is not None:
+        _set_cached_prompt(cache_key, prompt)
+    return prompt
+
+
+def _dwell_sections(dwell_stats: Dict[str, Any]) -> List[PromptSection]:
+    """Prompt sections for the slowest entities and legs of the dwell statistics"""
+    def hours(row, name):
+        value = row.get(f"{name}_hours")
+        return '' if value is None else f"{value:.1f}"
+
+    sections = []
+    entity_types = dwell_stats.get('entity_types') or []
+    entities = dwell_stats.get('entities') or []
+    if entities:
+        title = ["\n## Bottlenecks - Time at Entities, slowest first (entity|type|stops|p50 h|p90 h|p99 h):"]
+        if entity_types:
+            title.append("By type: " + "; ".join(
+                f"{row.get('entity_involved')} p50 {hours(row, 'p50')}h / p90 {hours(row, 'p90')}h"
+                for row in entity_types
+            ))
+        sections.append(PromptSection(
+            "\n".join(title),
+            [
+                _table_row(row.get('entity_name'), row.get('entity_involved'), row.get('count'),
+                           hours(row, 'p50'), hours(row, 'p90'), hours(row, 'p99'))
+                for row in entities
+            ],
+            priority=2, label='more entities', min_rows=5
+        ))
+    legs = dwell_stats.get('legs') or []
+    if legs:
+        sections.append(PromptSection(
+            "\n## Transit Legs, slowest first (from|to|trips|p50 h|p90 h|p99 h):",
+            [
+                _table_row(row.get('from_entity'), row.get('to_entity'), row.get('count'),
+                           hours(row, 'p50'), hours(row, 'p90'), hours(row, 'p99'))
+                for row in legs
+            ],
+            priority=2, label='more legs', min_rows=5
+        ))
+    return sections
 
 
 def build_shipment_tracking_system_prompt(
-    batches_data: List[Dict[str, Any]],
+    batches_data: Union[pd.DataFrame, List[Dict[str, Any]], None],
     selected_batch_id: str = None,
-    batch_events: List[Dict[str, Any]] = None
+    batch_events: Union[pd.DataFrame, List[Dict[str, Any]], None] = None,
+    dwell_stats: Optional[Dict[str, Any]] = None,
+    snapshot_version: Optional[str] = None,
+    token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET
 ) -> str:
     """
     Build a system prompt with shipment tracking data for batch-level tracking.
 
+    The selected batch's timeline gets budget first (keeping its origin and
+    latest events), then delayed batches, then product rollups, bottleneck
+    statistics and the remaining batch list.
+
     Args:
-        batches_data: List of all batches with batch_id, product_name, transit_status
+        batches_data: All batches with batch_id, product_name, transit_status
         selected_batch_id: Optional - the currently selected batch for detailed context
         batch_events: Optional - event timeline for the selected batch
+        dwell_stats: Optional - dwell and leg time statistics, as returned by
+            DwellAnalytics.summary (slowest first)
+        snapshot_version: Optional - combined version of the batch list, the
+            selected batch's events and the dwell statistics; when given, the
+            rendered prompt is memoized under it, selected_batch_id and the token budget
+        token_budget: Approximate token budget for the whole system prompt
 
     Returns:
         System prompt string with shipment tracking context
     """
-    if not batches_data:
+    if snapshot_version is not None:
+        cache_key = ('shipment', snapshot_version, selected_batch_id, token_budget)
+        cached_prompt = _get_cached_prompt(cache_key)
+        if cached_prompt is not None:
+            return cached_prompt
+
+    batches_df = _to_frame(batches_data)
+    if batches_df.empty:
         return (
             "You are a Supply Chain Shipment Tracking Assistant. "
             "Note: No shipment data is currently available. "
             "Please answer general shipment tracking and logistics questions."
         )
 
-    prompt_parts = [
+    if isinstance(batch_events, pd.DataFrame):
+        batch_events = _records(batch_events, fill='')
+
+    preamble = [
         "You are a helpful Supply Chain Shipment Tracking Assistant with access to real-time batch tracking data.",
         "Answer questions based on the following shipment tracking information.",
         "Be specific about batch IDs, products, locations, and timelines when appropriate.",
         "When asked about delays, provide plausible reasons based on the journey data (e.g., port congestion, customs clearance, weather).",
         "You are being used as part of a demo. Don't reveal that you are a demo.",
         "If the user needs mitigation actions or planning, direct them to the Planning tab.",
+        "Tables are pipe-separated with the column names in parentheses.",
         "",
         "=== SHIPMENT TRACKING DATA ===",
     ]
 
     # Calculate summary statistics
-    total_batches = len(batches_data)
-    delayed_batches = [b for b in batches_data if 'delay' in str(b.get('transit_status', '')).lower()]
-    on_time_batches = total_batches - len(delayed_batches)
-
-    # Group by product
-    products_summary = {}
-    for batch in batches_data:
-        product = batch.get('product_name', 'Unknown')
-        if product not in products_summary:
-            products_summary[product] = {'total': 0, 'delayed': 0}
-        products_summary[product]['total'] += 1
-        if 'delay' in str(batch.get('transit_status', '')).lower():
-            products_summary[product]['delayed'] += 1
+    stats = aggregate_batches(batches_df)
+    total_batches = stats['total_batches']
+    delayed_batches = stats['delayed_batches']
+    delayed_total = len(delayed_batches)
+    on_time_batches = total_batches - delayed_total
+    products_summary = stats['products_summary']
 
     # Summary section
-    prompt_parts.append("\n## Summary Statistics:")
-    prompt_parts.append(f"- Total Batches Being Tracked: {total_batches}")
-    prompt_parts.append(f"- On-Time Batches: {on_time_batches} ({100 * on_time_batches / total_batches:.1f}%)" if total_batches > 0 else "- On-Time Batches: 0")
-    prompt_parts.append(f"- Delayed Batches: {len(delayed_batches)} ({100 * len(delayed_batches) / total_batches:.1f}%)" if total_batches > 0 else "- Delayed Batches: 0")
-    prompt_parts.append(f"- Unique Products: {len(products_summary)}")
+    preamble.append("\n## Summary Statistics:")
+    preamble.append(f"- Total Batches Being Tracked: {total_batches}")
+    preamble.append(f"- On-Time Batches: {on_time_batches} ({100 * on_time_batches / total_batches:.1f}%)" if total_batches > 0 else "- On-Time Batches: 0")
+    preamble.append(f"- Delayed Batches: {delayed_total} ({100 * delayed_total / total_batches:.1f}%)" if total_batches > 0 else "- Delayed Batches: 0")
+    preamble.append(f"- Unique Products: {len(products_summary)}")
+
+    sections = []
 
     # Products breakdown
-    prompt_parts.append("\n## Batches by Product:")
-    for product, data in sorted(products_summary.items(), key=lambda x: -x[1]['total']):
-        delay_info = f" ({data['delayed']} delayed)" if data['delayed'] > 0 else ""
-        prompt_parts.append(f"- {product}: {data['total']} batches{delay_info}")
+    sections.append(PromptSection(
+        "\n## Batches by Product (product|batches|delayed):",
+        [
+            _table_row(product, int(data['total']), int(data['delayed']))
+            for product, data in products_summary.head(MAX_SECTION_ROWS).iterrows()
+        ],
+        priority=2, label='more products', total=len(products_summary), min_rows=10
+    ))
 
     # Delayed batches detail
-    if delayed_batches:
-        prompt_parts.append("\n## Delayed Batches (ATTENTION REQUIRED):")
-        for batch in delayed_batches:
-            prompt_parts.append(
-                f"- Batch {batch.get('batch_id', 'Unknown')}: {batch.get('product_name', 'Unknown')} "
-                f"[{batch.get('transit_status', 'Delayed')}]"
-            )
+    if delayed_total:
+        sections.append(PromptSection(
+            "\n## Delayed Batches - ATTENTION REQUIRED (batch|product|status):",
+            [
+                _table_row(batch.get('batch_id') or 'Unknown', batch.get('product_name') or 'Unknown',
+                           batch.get('transit_status') or 'Delayed')
+                for batch in _records(delayed_batches.head(MAX_SECTION_ROWS))
+            ],
+            priority=1, label='more delayed batches', total=delayed_total, min_rows=10
+        ))
+
+    # Bottlenecks: time spent at entities and on legs between them
+    if dwell_stats:
+        sections.extend(_dwell_sections(dwell_stats))
 
     # All batches list
-    prompt_parts.append("\n## All Batches:")
-    for batch in batches_data[:50]:  # Limit to first 50
-        status_marker = " [DELAYED]" if 'delay' in str(batch.get('transit_status', '')).lower() else ""
-        prompt_parts.append(
-            f"- {batch.get('batch_id', 'Unknown')}: {batch.get('product_name', 'Unknown')}{status_marker}"
-        )
-    if len(batches_data) > 50:
-        prompt_parts.append(f"  ... and {len(batches_data) - 50} more batches")
+    delayed_rows = stats['delayed_mask']
+    sections.append(PromptSection(
+        "\n## All Batches (batch|product|delayed):",
+        [
+            _table_row(batch.get('batch_id') or 'Unknown', batch.get('product_name') or 'Unknown',
+                       'Y' if is_delayed else '')
+            for batch, is_delayed in zip(_records(batches_df.head(MAX_SECTION_ROWS)), delayed_rows.head(MAX_SECTION_ROWS))
+        ],
+        priority=3, label='more batches', total=total_batches
+    ))
 
     # Selected batch details (if provided)
     if selected_batch_id and batch_events:
-        prompt_parts.append(f"\n## SELECTED BATCH DETAILS: {selected_batch_id}")
+        title = [f"\n## SELECTED BATCH DETAILS: {selected_batch_id}"]
 
         # Find batch info
-        selected_batch = next((b for b in batches_data if b.get('batch_id') == selected_batch_id), None)
-        if selected_batch:
-            prompt_parts.append(f"- Product: {selected_batch.get('product_name', 'Unknown')}")
-            prompt_parts.append(f"- Transit Status: {selected_batch.get('transit_status', 'On Time')}")
-
-        prompt_parts.append("\n### Event Timeline (chronological):")
-        for event in batch_events:
-            prompt_parts.append(
-                f"  {event.get('event_time_cst_readable', 'Unknown time')}: "
-                f"{event.get('event', 'Unknown event')} at {event.get('entity_name', 'Unknown')} "
-                f"({event.get('entity_involved', '')})"
-            )
-            prompt_parts.append(f"    Location: {event.get('entity_location', 'Unknown')}")
+        if 'batch_id' in batches_df.columns:
+            selected_rows = _records(batches_df[batches_df['batch_id'] == selected_batch_id].head(1))
+            if selected_rows:
+                selected_batch = selected_rows[0]
+                title.append(f"- Product: {selected_batch.get('product_name') or 'Unknown'}")
+                title.append(f"- Transit Status: {selected_batch.get('transit_status') or 'On Time'}")
+
+        title.append("\n### Event Timeline, chronological (time|event|entity|entity_type|location):")
+        sections.append(PromptSection(
+            "\n".join(title),
+            [
+                _table_row(event.get('event_time_cst_readable', 'Unknown time'), event.get('event', 'Unknown event'),
+                           event.get('entity_name', 'Unknown'), event.get('entity_involved', ''),
+                           event.get('entity_location', 'Unknown'))
+                for event in batch_events
+            ],
+            priority=0, label='intermediate events', keep='ends', min_rows=10
+        ))
 
         # Journey summary
-        if batch_events:
-            first_event = batch_events[0]
-            last_event = batch_events[-1]
-            prompt_parts.append("\n### Journey Summary:")
-            prompt_parts.append(f"- Origin: {first_event.get('entity_name', 'Unknown')} ({first_event.get('entity_location', '')})")
-            prompt_parts.append(f"- Current/Last Location: {last_event.get('entity_name', 'Unknown')} ({last_event.get('entity_location', '')})")
-            prompt_parts.append(f"- Total Events: {len(batch_events)}")
-
-            # Entity types encountered
-            entities = set(e.get('entity_involved', '') for e in batch_events if e.get('entity_involved'))
-            prompt_parts.append(f"- Entities Involved: {', '.join(sorted(entities))}")
-
-    prompt_parts.append("\n=== END SHIPMENT TRACKING DATA ===")
-    prompt_parts.append("")
-    prompt_parts.append("When answering questions:")
-    prompt_parts.append("- Reference specific batch IDs when discussing shipments")
-    prompt_parts.append("- Highlight delayed batches and provide context on potential causes")
-    prompt_parts.append("- Use the event timeline to explain shipment journey and identify bottlenecks")
-    prompt_parts.append("- If a batch is delayed, suggest checking with the relevant entity (supplier, dock, DC)")
-    prompt_parts.append("- For mitigation or planning actions, direct users to the Planning tab")
+        first_event = batch_events[0]
+        last_event = batch_events[-1]
+        entities = set(e.get('entity_involved', '') for e in batch_events if e.get('entity_involved'))
+        sections.append(PromptSection(
+            "\n### Journey Summary:",
+            [
+                f"- Origin: {first_event.get('entity_name', 'Unknown')} ({first_event.get('entity_location', '')})",
+                f"- Current/Last Location: {last_event.get('entity_name', 'Unknown')} ({last_event.get('entity_location', '')})",
+                f"- Total Events: {len(batch_events)}",
+                f"- Entities Involved: {', '.join(sorted(entities))}",
+            ],
+            required=True
+        ))
+
+    footer = [
+        "\n=== END SHIPMENT TRACKING DATA ===",
+        "",
+        "When answering questions:",
+        "- Reference specific batch IDs when discussing shipments",
+        "- Highlight delayed batches and provide context on potential causes",
+        "- Use the event timeline to explain shipment journey and identify bottlenecks",
+        "- If a batch is delayed, suggest checking with the relevant entity (supplier, dock, DC)",
+        "- For mitigation or planning actions, direct users to the Planning tab",
+    ]
+    if dwell_stats:
+        footer.insert(-1, "- Name bottlenecks from the dwell and leg time tables: a high p90 relative to p50 means some shipments wait far longer than usual")
 
-    return "\n".join(prompt_parts)
+    prompt = render_sections(preamble, sections, footer, token_budget)
+    if snapshot_version is not None:
+        _set_cached_prompt(cache_key, prompt)
+    return prompt
@@ -0,0 +1,443 @@
+"""
+Request telemetry for the API.
+Prometheus metrics cover route latency, cache effectiveness, warehouse
+queries, pandas work, OSRM routing and upstream LLM streams; they are exposed
+by main.py at /metrics. Per-request timing spans feed the Server-Timing
+header and the slow-request log.
+
+Set PROMETHEUS_MULTIPROC_DIR when running several worker processes so the
+endpoint aggregates across all of them.
+"""
+
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+import os
+import time
+
+from fastapi.responses import JSONResponse
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from queries import query_name
+
+
+# Buckets in seconds; routes and queries span cache hits (sub-ms) to cold warehouse reads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+ROUTE_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time to complete an HTTP request, by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_EVENTS = Counter(
+    "cache_events_total",
+    "Data cache lookups and evictions by key namespace",
+    ["namespace", "event"],
+)
+WAREHOUSE_QUERY_SECONDS = Histogram(
+    "warehouse_query_duration_seconds",
+    "Databricks SQL connect, execute and Arrow fetch time",
+    ["query"],
+    buckets=LATENCY_BUCKETS,
+)
+WAREHOUSE_ROWS = Histogram(
+    "warehouse_query_rows",
+    "Rows returned per warehouse query",
+    ["query"],
+    buckets=(1, 10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+WAREHOUSE_ARROW_BYTES = Histogram(
+    "warehouse_query_arrow_bytes",
+    "Arrow result size per warehouse query",
+    ["query"],
+    buckets=(1 << 10, 1 << 14, 1 << 17, 1 << 20, 1 << 23, 1 << 26, 1 << 29),
+)
+WAREHOUSE_FAILURES = Counter(
+    "warehouse_query_failures_total",
+    "Warehouse queries that did not complete, by reason (error, timeout, disconnect, circuit_open)",
+    ["query", "reason"],
+)
+STALE_RESPONSES = Counter(
+    "warehouse_stale_fallbacks_total",
+    "Last good results served in place of a failed warehouse query",
+    ["namespace"],
+)
+PANDAS_SECONDS = Histogram(
+    "pandas_stage_duration_seconds",
+    "Time spent in pandas conversion, transforms and serialization",
+    ["stage", "name"],
+    buckets=LATENCY_BUCKETS,
+)
+OSRM_SECONDS = Histogram(
+    "osrm_request_duration_seconds",
+    "OSRM routing call latency",
+    buckets=LATENCY_BUCKETS,
+)
+OSRM_REQUESTS = Counter(
+    "osrm_requests_total",
+    "OSRM routing calls by outcome (ok or straight-line fallback)",
+    ["outcome"],
+)
+COMPRESSION_BYTES = Counter(
+    "response_compression_bytes_total",
+    "Response body bytes before (in) and after (out) compression, by route and content coding",
+    ["route", "encoding", "direction"],
+)
+COMPRESSION_SECONDS = Histogram(
+    "response_compression_duration_seconds",
+    "CPU time compressing a response body (cache misses only)",
+    ["route", "encoding"],
+    buckets=LATENCY_BUCKETS,
+)
+COMPRESSION_CACHE_EVENTS = Counter(
+    "response_compression_cache_events_total",
+    "Compressed body cache hits and misses",
+    ["event"],
+)
+LLM_TTFT_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from sending a chat request upstream to the first streamed token",
+    ["model"],
+    buckets=LLM_BUCKETS,
+)
+LLM_STREAM_SECONDS = Histogram(
+    "llm_stream_duration_seconds",
+    "Total upstream chat call duration",
+    ["model", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second",
+    "Estimated output tokens per second after the first token",
+    ["model"],
+    buckets=(1, 5, 10, 20, 40, 60, 80, 120, 200, 400),
+)
+
+# Cache keys with an id or coordinates in them are grouped by prefix
+_CACHE_KEY_PREFIXES = ("route_",)
+
+
+def cache_namespace(key: str) -> str:
+    """Map a cache key to a low-cardinality namespace label"""
+    # Warehouse results: the query name, without the SQL digest (which changes
+    # with the query text) or the bound parameter values
+    if "?" in key or "@" in key:
+        return query_name(key.split("?", 1)[0])
+    for prefix in _CACHE_KEY_PREFIXES:
+        if key.startswith(prefix):
+            return prefix + "*"
+    return key
+
+
+def record_cache_event(key: str, event: str):
+    """Count a cache hit, miss, evict or coalesced (served by another request's refresh) for a key"""
+    CACHE_EVENTS.labels(cache_namespace(key), event).inc()
+
+
+class Span:
+    """One timed step of a request; spans nest to form the request's span tree"""
+
+    __slots__ = ("name", "detail", "start", "duration", "children")
+
+    def __init__(self, name: str, detail: Optional[str] = None):
+        self.name = name
+        self.detail = detail
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.children: List["Span"] = []
+
+    def walk(self, depth: int = 0):
+        """Yield (depth, span) for this span and all descendants"""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+# Innermost open span of the request being handled. Context is copied into
+# threadpool workers, so sync endpoints record into the same tree.
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class span:
+    """
+    Context manager timing one step of the current request.
+
+    A no-op outside a request, e.g. span("db_query", "inventory_snapshot").
+    """
+
+    __slots__ = ("_span", "_parent", "_token")
+
+    def __init__(self, name: str, detail: Optional[str] = None):
+        self._parent = _current_span.get()
+        self._span = Span(name, detail) if self._parent is not None else None
+
+    def __enter__(self):
+        if self._span is not None:
+            self._span.start = time.perf_counter()
+            self._token = _current_span.set(self._span)
+        return self
+
+    def __exit__(self, *exc):
+        if self._span is not None:
+            self._span.duration = time.perf_counter() - self._span.start
+            _current_span.reset(self._token)
+            self._parent.children.append(self._span)
+        return False
+
+
+def mark_span(name: str, detail: Optional[str] = None):
+    """Record a zero-length span, e.g. for a cache hit or miss"""
+    parent = _current_span.get()
+    if parent is not None:
+        parent.children.append(Span(name, detail))
+
+
+class stage_timer(span):
+    """Time one pandas stage as both a metric and a span, e.g. stage_timer("serialize", "inventory")"""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, stage: str, name: str):
+        super().__init__(stage, name)
+        self._child = PANDAS_SECONDS.labels(stage, name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return super().__exit__(*exc)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records JSON encoding as a serialize span"""
+
+    def render(self, content) -> bytes:
+        with span("serialize", "json"):
+            return super().render(content)
+
+
+class LLMStreamTimer:
+    """Tracks time to first token, throughput and duration of one upstream call"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def first_token(self):
+        """Mark the first streamed token; later calls are ignored"""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            LLM_TTFT_SECONDS.labels(self.model).observe(self.first_token_at - self.started_at)
+
+    def finish(self, output_tokens: int = 0, outcome: str = "ok"):
+        """Record the call duration and, for streams, estimated tokens per second"""
+        finished_at = time.perf_counter()
+        LLM_STREAM_SECONDS.labels(self.model, outcome).observe(finished_at - self.started_at)
+        if self.first_token_at is not None and output_tokens > 0:
+            generation_seconds = finished_at - self.first_token_at
+            if generation_seconds > 0:
+                LLM_TOKENS_PER_SECOND.labels(self.model).observe(output_tokens / generation_seconds)
+
+
+class AdmissionCollector:
+    """Exposes chat admission controller state, read at scrape time"""
+
+    def __init__(self, get_controllers: Callable[[], Dict]):
+        self._get_controllers = get_controllers
+
+    def collect(self):
+        active = GaugeMetricFamily("chat_admission_active_streams", "Upstream chat streams in progress", labels=["model"])
+        queued = GaugeMetricFamily("chat_admission_queued_streams", "Chat requests waiting for a slot", labels=["model"])
+        admitted = CounterMetricFamily("chat_admission_admitted", "Chat requests granted a slot", labels=["model"])
+        rejected = CounterMetricFamily("chat_admission_rejected", "Chat requests rejected with 429", labels=["model"])
+        wait = CounterMetricFamily("chat_admission_wait_seconds", "Total time spent waiting for a slot", labels=["model"])
+        for model, controller in list(self._get_controllers().items()):
+            stats = controller.stats()
+            active.add_metric([model], stats["active"])
+            queued.add_metric([model], stats["queued"])
+            admitted.add_metric([model], stats["admitted_total"])
+            rejected.add_metric([model], stats["rejected_total"])
+            wait.add_metric([model], stats["wait_seconds_total"])
+        yield from (active, queued, admitted, rejected, wait)
+
+
+class BulkheadCollector:
+    """Exposes bulkhead pool state, read at scrape time"""
+
+    def __init__(self, get_bulkheads: Callable[[], Dict]):
+        self._get_bulkheads = get_bulkheads
+
+    def collect(self):
+        active = GaugeMetricFamily("bulkhead_active", "Pool workers busy", labels=["pool"])
+        queued = GaugeMetricFamily("bulkhead_queued", "Calls waiting for a pool worker", labels=["pool"])
+        completed = CounterMetricFamily("bulkhead_completed", "Calls run in the pool", labels=["pool"])
+        rejected = CounterMetricFamily("bulkhead_rejected", "Calls rejected with 503 by a saturated pool", labels=["pool"])
+        wait = CounterMetricFamily("bulkhead_wait_seconds", "Total time calls waited for a pool worker", labels=["pool"])
+        for name, bulkhead in list(self._get_bulkheads().items()):
+            stats = bulkhead.stats()
+            active.add_metric([name], stats["active"])
+            queued.add_metric([name], stats["queued"])
+            completed.add_metric([name], stats["completed_total"])
+            rejected.add_metric([name], stats["rejected_total"])
+            wait.add_metric([name], stats["wait_seconds_total"])
+        yield from (active, queued, completed, rejected, wait)
+
+
+# Collectors of live in-process state, also added to the multiprocess registry
+_custom_collectors: List = []
+
+
+def register_collector(collector):
+    """Register a custom collector with the default registry"""
+    REGISTRY.register(collector)
+    _custom_collectors.append(collector)
+
+
+def render_latest():
+    """
+    Render all metrics in the Prometheus text format; returns (body, content_type).
+
+    With PROMETHEUS_MULTIPROC_DIR, counters and histograms are aggregated
+    over all workers, while the custom collectors (admission and bulkhead
+    state) report the worker that serves the scrape.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _custom_collectors:
+            registry.register(collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def server_timing_header(root: Span, total: float) -> str:
+    """
+    Build a Server-Timing header value, summing spans that share a name.
+
+    Cache spans report hit/miss counts in their description.
+    """
+    durations: Dict[str, float] = {}
+    cache_events: Dict[str, int] = {}
+    for depth, node in root.walk():
+        if depth == 0:
+            continue
+        durations[node.name] = durations.get(node.name, 0.0) + node.duration
+        if node.name == "cache" and node.detail:
+            cache_events[node.detail] = cache_events.get(node.detail, 0) + 1
+
+    entries = []
+    for name, duration in durations.items():
+        if name == "cache":
+            desc = " ".join(f"{event}={count}" for event, count in cache_events.items())
+            entries.append(f'cache;desc="{desc}";dur={duration * 1000:.2f}')
+        else:
+            entries.append(f"{name};dur={duration * 1000:.2f}")
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def format_span_tree(root: Span, total: float) -> str:
+    """Render a span tree as indented lines with offsets from the request start"""
+    lines = [f"{root.name} {total * 1000:.1f}ms"]
+    for depth, node in root.walk():
+        if depth == 0:
+            continue
+        label = f"{node.name} ({node.detail})" if node.detail else node.name
+        offset = (node.start - root.start) * 1000
+        lines.append(f"{'  ' * depth}{label} {node.duration * 1000:.1f}ms @+{offset:.1f}ms")
+    return "\n".join(lines)
+
+
+class ServerTimingMiddleware:
+    """
+    Plain ASGI middleware collecting timing spans for /api requests.
+
+    Adds a Server-Timing header with the time spent per span name, and when
+    slow_request_ms is set, prints the full span tree of non-streaming
+    requests that take longer than that.
+    """
+
+    def __init__(self, app, slow_request_ms: float = 0):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(f"{scope['method']} {scope['path']}")
+        current_token = _current_span.set(root)
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                for name, value in headers:
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+                header = server_timing_header(root, time.perf_counter() - root.start)
+                headers.append((b"server-timing", header.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_span.reset(current_token)
+            total = time.perf_counter() - root.start
+            root.duration = total
+            if self.slow_request_ms and not streaming and total * 1000 >= self.slow_request_ms:
+                print(f"Slow request:\n{format_span_tree(root, total)}")
+
+
+class RouteMetricsMiddleware:
+    """
+    Plain ASGI middleware recording request latency per route template.
+
+    The route label comes from the matched route (e.g. /api/batch/{batch_id}),
+    so ids in the path do not create new series. Latency runs until the last
+    body chunk is sent, which for SSE routes is the whole stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            ROUTE_LATENCY.labels(scope["method"], route_path, str(status_code)).observe(
+                time.perf_counter() - start
+            )
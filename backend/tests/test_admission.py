@@ -0,0 +1,147 @@
+"""Tests for the per-model chat admission controller"""
+
+import asyncio
+
+import pytest
+
+import admission
+from admission import AdmissionRejected, ModelAdmissionController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", fake)
+    return fake
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_grants_immediately_while_slots_are_free():
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=2, max_queue=4, max_queue_per_client=2)
+        first, second = controller.request("a"), controller.request("b")
+        third = controller.request("c")
+        return controller, first, second, third
+
+    controller, first, second, third = run(scenario())
+    assert first.is_granted and second.is_granted
+    assert not third.is_granted
+    assert controller.active == 2 and controller.queued == 1
+
+
+def test_free_slots_go_to_clients_round_robin():
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=1, max_queue=10, max_queue_per_client=5)
+        running = controller.request("a")
+        a1, a2, b1, c1 = (controller.request(client) for client in ("a", "a", "b", "c"))
+        positions = [controller.position(ticket) for ticket in (a1, b1, c1, a2)]
+        order = []
+        current = running
+        for _ in range(4):
+            controller.release(current)
+            current = next(ticket for ticket in (a1, a2, b1, c1) if ticket.is_granted and ticket not in order)
+            order.append(current)
+        return positions, order, (a1, b1, c1, a2)
+
+    positions, order, expected = run(scenario())
+    # One busy client cannot go twice before the others had a turn
+    assert order == list(expected)
+    # Positions predict the grant order
+    assert positions == [1, 2, 3, 4]
+
+
+def test_position_is_zero_once_granted_or_released():
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=1, max_queue=10, max_queue_per_client=5)
+        running = controller.request("a")
+        waiting = controller.request("b")
+        leaving = controller.request("c")
+        before = controller.position(leaving)
+        controller.release(leaving)
+        controller.release(leaving)
+        after_leaving = controller.position(leaving)
+        controller.release(running)
+        return controller, before, after_leaving, controller.position(waiting)
+
+    controller, before, after_leaving, granted = run(scenario())
+    assert before == 2
+    assert after_leaving == 0
+    assert granted == 0
+    assert controller.active == 1 and controller.queued == 0
+
+
+def test_rejects_when_the_queue_or_a_client_share_is_full():
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=1, max_queue=3, max_queue_per_client=2)
+        controller.request("a")
+        controller.request("a")
+        controller.request("a")
+        with pytest.raises(AdmissionRejected, match="this client"):
+            controller.request("a")
+        controller.request("b")
+        with pytest.raises(AdmissionRejected, match="queue is full"):
+            controller.request("c")
+        return controller
+
+    controller = run(scenario())
+    assert controller.rejected_total == 2
+    assert controller.queued == 3
+
+
+def test_retry_after_follows_the_average_stream_duration(clock):
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=2, max_queue=10, max_queue_per_client=10,
+                                              default_retry_after=7)
+        no_history = controller.retry_after()
+        first, second = controller.request("a"), controller.request("b")
+        clock.now += 10
+        controller.release(first)
+        controller.release(second)
+        # Two streams of 10 s each; with 3 queued and 2 slots, the 4th waits about 20 s
+        for client in ("a", "b", "c", "d", "e"):
+            controller.request(client)
+        return no_history, controller.queued, controller.retry_after()
+
+    no_history, queued, retry_after = run(scenario())
+    assert no_history == 7
+    assert queued == 3
+    assert retry_after == 20
+
+
+def test_retry_after_is_bounded(clock):
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=1, max_queue=10, max_queue_per_client=10)
+        short = controller.request("a")
+        controller.release(short)
+        quick = controller.retry_after()
+        long = controller.request("a")
+        clock.now += 10_000
+        controller.release(long)
+        return quick, controller.retry_after()
+
+    quick, slow = run(scenario())
+    assert quick == 1
+    assert slow == 60
+
+
+def test_wait_returns_when_the_ticket_is_granted():
+    async def scenario():
+        controller = ModelAdmissionController(max_concurrent=1, max_queue=10, max_queue_per_client=5)
+        running = controller.request("a")
+        waiting = controller.request("b")
+        asyncio.get_running_loop().call_later(0.01, controller.release, running)
+        await controller.wait(waiting, timeout=5)
+        return waiting
+
+    assert run(scenario()).is_granted
@@ -0,0 +1,64 @@
+"""Tests for the bulkhead thread pools"""
+
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from bulkheads import Bulkhead, BulkheadRejected
+
+
+def test_rejects_once_workers_and_queue_are_taken():
+    async def scenario():
+        bulkhead = Bulkhead("w", max_workers=1, max_queue=1)
+        release = threading.Event()
+        running = asyncio.ensure_future(bulkhead.run(release.wait))
+        queued = asyncio.ensure_future(bulkhead.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(BulkheadRejected):
+            await bulkhead.run(lambda: "rejected")
+        release.set()
+        results = await asyncio.gather(running, queued)
+        return bulkhead, results
+
+    bulkhead, results = asyncio.run(scenario())
+    assert results == [True, "queued"]
+    stats = bulkhead.stats()
+    assert stats["active"] == 0 and stats["queued"] == 0
+    assert stats["completed_total"] == 2 and stats["rejected_total"] == 1
+
+
+def test_cancelled_waits_give_back_their_queue_slot():
+    async def scenario():
+        bulkhead = Bulkhead("w", max_workers=1, max_queue=2)
+        release = threading.Event()
+        running = asyncio.ensure_future(bulkhead.run(release.wait))
+        await asyncio.sleep(0.05)
+        # Callers that give up before a worker picks their call up
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(bulkhead.run(lambda: "never"), timeout=0.05)
+        queued_after_timeouts = bulkhead.stats()["queued"]
+        third = asyncio.ensure_future(bulkhead.run(lambda: "third"))
+        await asyncio.sleep(0.05)
+        release.set()
+        return bulkhead, queued_after_timeouts, await running, await third
+
+    bulkhead, queued_after_timeouts, running, third = asyncio.run(scenario())
+    assert queued_after_timeouts == 0
+    assert (running, third) == (True, "third")
+    stats = bulkhead.stats()
+    assert stats["queued"] == 0 and stats["active"] == 0
+    assert stats["completed_total"] == 2
+
+
+def test_runs_with_the_callers_context_variables():
+    request_id = contextvars.ContextVar("request_id", default=None)
+
+    async def scenario():
+        bulkhead = Bulkhead("w", max_workers=2, max_queue=2)
+        request_id.set("r-1")
+        return await bulkhead.run(request_id.get)
+
+    assert asyncio.run(scenario()) == "r-1"
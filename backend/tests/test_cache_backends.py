@@ -0,0 +1,201 @@
+"""
+Tests for the data cache backends: refresh locks and tag invalidation.
+
+The Redis backend is tested against TEST_REDIS_URL (e.g. redis://localhost:6379/15)
+when it is set and the redis package is installed; its keys use a per-test prefix.
+"""
+
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+import cache_backends
+from cache_backends import MemoryCacheBackend, RedisCacheBackend, SQLiteCacheBackend
+
+
+def redis_backend(prefix: str, **kwargs) -> RedisCacheBackend:
+    url = os.getenv("TEST_REDIS_URL")
+    if not url:
+        pytest.skip("TEST_REDIS_URL is not set")
+    pytest.importorskip("redis")
+    return RedisCacheBackend(url, prefix=prefix, **kwargs)
+
+
+@pytest.fixture
+def make_backend(request, tmp_path):
+    """Factory of backend instances sharing one store, like the workers of a host"""
+    prefix = f"test-{uuid.uuid4().hex[:8]}:"
+    created = []
+
+    def make(**kwargs):
+        if request.param == "sqlite":
+            backend = SQLiteCacheBackend(tmp_path / "cache.db", **kwargs)
+        else:
+            backend = redis_backend(prefix, **kwargs)
+        created.append(backend)
+        return backend
+
+    yield make
+    if request.param == "redis" and created:
+        client = created[0].client
+        for key in client.scan_iter(match=f"{prefix}*"):
+            client.delete(key)
+
+
+shared = pytest.mark.parametrize("make_backend", ["sqlite", "redis"], indirect=True)
+
+
+@shared
+def test_value_written_by_one_worker_is_read_by_another(make_backend):
+    writer, reader = make_backend(), make_backend()
+    assert writer.set("products@1", {"rows": 1}, ttl_seconds=60, version="v1") is None
+    assert reader.get("products@1").data == {"rows": 1}
+    assert reader.set("products@1", {"rows": 2}, ttl_seconds=60, version="v2") == "v1"
+    item = writer.get("products@1")
+    assert item.data == {"rows": 2}
+    assert item.version == "v2"
+
+
+@shared
+def test_refresh_lock_is_exclusive_across_workers(make_backend):
+    first, second = make_backend(), make_backend()
+    with first.refresh_lock("inventory", timeout=0) as acquired:
+        assert acquired
+        with second.refresh_lock("inventory", timeout=0.1) as other:
+            assert not other
+        # Other keys are independent
+        with second.refresh_lock("batches", timeout=0) as other_key:
+            assert other_key
+    with second.refresh_lock("inventory", timeout=0) as acquired:
+        assert acquired
+
+
+@shared
+def test_waiter_gets_the_lock_once_the_holder_releases(make_backend):
+    holder, waiter = make_backend(), make_backend()
+    acquired_at = []
+
+    def wait_for_lock():
+        with waiter.refresh_lock("inventory", timeout=5) as acquired:
+            acquired_at.append((acquired, time.monotonic()))
+
+    with holder.refresh_lock("inventory", timeout=0):
+        thread = threading.Thread(target=wait_for_lock)
+        thread.start()
+        time.sleep(0.2)
+        released_at = time.monotonic()
+    thread.join(5)
+    assert acquired_at and acquired_at[0][0]
+    assert acquired_at[0][1] >= released_at
+
+
+@shared
+def test_lock_of_a_dead_worker_expires(make_backend):
+    crashed, survivor = make_backend(lock_ttl_seconds=0.2), make_backend(lock_ttl_seconds=0.2)
+    lock = crashed.refresh_lock("inventory", timeout=0)
+    assert lock.__enter__()
+    # Never released: taken over once its expiry passes
+    with survivor.refresh_lock("inventory", timeout=2) as acquired:
+        assert acquired
+
+
+@pytest.fixture
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryCacheBackend()
+    elif request.param == "sqlite":
+        yield SQLiteCacheBackend(tmp_path / "cache.db")
+    else:
+        prefix = f"test-{uuid.uuid4().hex[:8]}:"
+        redis = redis_backend(prefix)
+        yield redis
+        for key in redis.client.scan_iter(match=f"{prefix}*"):
+            redis.client.delete(key)
+
+
+every = pytest.mark.parametrize("backend", ["memory", "sqlite", "redis"], indirect=True)
+
+
+@every
+def test_keys_are_found_and_dropped_by_tag(backend):
+    backend.set("batch_events@1?batch_id=B1", "events", tags=("batch_events", "batch:B1"))
+    backend.set("batch_events@1?batch_id=B2", "events", tags=("batch_events", "batch:B2"))
+    backend.set("inventory_snapshot@1", "rows", tags=("inventory",))
+    assert backend.keys_with_tags(["batch:B1"]) == ["batch_events@1?batch_id=B1"]
+    assert backend.keys_with_tags(["batch_events", "inventory"]) == [
+        "batch_events@1?batch_id=B1", "batch_events@1?batch_id=B2", "inventory_snapshot@1"
+    ]
+
+    assert backend.drop(backend.keys_with_tags(["batch_events"])) == [
+        "batch_events@1?batch_id=B1", "batch_events@1?batch_id=B2"
+    ]
+    assert backend.get("batch_events@1?batch_id=B1") is None
+    assert backend.get("inventory_snapshot@1").data == "rows"
+    assert backend.keys_with_tags(["batch_events", "batch:B2"]) == []
+    assert backend.keys_with_tags(["inventory"]) == ["inventory_snapshot@1"]
+
+
+@every
+def test_drop_skips_missing_keys(backend):
+    backend.set("products@1", "rows", tags=("products",))
+    assert backend.drop(["products@1", "missing@1"]) == ["products@1"]
+    assert backend.drop(["products@1"]) == []
+
+
+@every
+def test_clear_removes_entries_and_tags(backend):
+    backend.set("products@1", "rows", tags=("products",))
+    backend.set("route_1_2_3_4", {"coordinates": []}, tags=("route",))
+    assert sorted(backend.clear()) == ["products@1", "route_1_2_3_4"]
+    assert backend.keys_with_tags(["products", "route"]) == []
+    assert backend.get("products@1") is None
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"], indirect=True)
+def test_evict_only_removes_expired_entries(backend, monkeypatch):
+    backend.set("products@1", "rows", ttl_seconds=10, tags=("products",))
+    assert not backend.evict("products@1")
+    later = time.time() + 11
+    monkeypatch.setattr(cache_backends.time, "time", lambda: later)
+    assert backend.evict("products@1")
+    assert backend.get("products@1") is None
+    assert backend.keys_with_tags(["products"]) == []
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"], indirect=True)
+def test_rewrite_replaces_the_tags_of_a_key(backend):
+    backend.set("batch_events@1?batch_id=B1", "events", tags=("batch:B1",))
+    backend.set("batch_events@1?batch_id=B1", "events", tags=("batch:B9",))
+    assert backend.keys_with_tags(["batch:B1"]) == []
+    assert backend.keys_with_tags(["batch:B9"]) == ["batch_events@1?batch_id=B1"]
+
+
+def test_refresh_locks_are_removed_once_released():
+    backend = MemoryCacheBackend()
+    waited = []
+
+    def wait():
+        with backend.refresh_lock("route_1_2_3_4", timeout=0.05) as acquired:
+            waited.append(acquired)
+
+    with backend.refresh_lock("route_1_2_3_4", timeout=1) as acquired:
+        assert acquired
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        waiter.join()
+    assert waited == [False]
+    assert backend._locks == {}
+
+
+@pytest.mark.parametrize("make_backend", ["sqlite", "redis"], indirect=True)
+def test_expired_local_copies_are_pruned(make_backend, monkeypatch):
+    backend = make_backend()
+    backend.set("route_1_2_3_4", {"coordinates": []}, ttl_seconds=10)
+    backend.set("products@1", "rows", ttl_seconds=60)
+    later = time.time() + 11
+    monkeypatch.setattr(cache_backends.time, "time", lambda: later)
+    backend.set("route_5_6_7_8", {"coordinates": []}, ttl_seconds=10)
+    assert sorted(key for key, _ in backend.local_items()) == ["products@1", "route_5_6_7_8"]
@@ -0,0 +1,60 @@
+"""Tests for the response compression middleware"""
+
+import asyncio
+import gzip
+
+from compression import CompressionMiddleware
+
+BODY = b'{"rows": [' + b'{"status": "In Transit"},' * 200 + b'{}]}'
+
+
+def respond(headers):
+    """An ASGI app sending BODY in one message with the given extra headers"""
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")] + headers,
+        })
+        await send({"type": "http.response.body", "body": BODY})
+    return app
+
+
+def call(app, accept_encoding=b"gzip"):
+    """Run a request through the middleware; the start message's headers (as a list) and the body"""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.request"}
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding)]}
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    return messages[0]["headers"], messages[1]["body"]
+
+
+def test_compresses_and_tags_the_encoded_representation():
+    headers, body = call(respond([(b"etag", b'"abc"')]))
+    assert gzip.decompress(body) == BODY
+    assert (b"content-encoding", b"gzip") in headers
+    assert (b"etag", b'"abc-gzip"') in headers
+    assert (b"vary", b"Accept-Encoding") in headers
+
+
+def test_keeps_other_vary_values_and_does_not_repeat_accept_encoding():
+    headers, _ = call(respond([(b"vary", b"Origin")]))
+    assert [value for name, value in headers if name == b"vary"] == [b"Origin, Accept-Encoding"]
+
+    headers, _ = call(respond([(b"vary", b"accept-encoding")]))
+    assert [value for name, value in headers if name == b"vary"] == [b"accept-encoding"]
+
+
+def test_passes_through_responses_that_negotiated_their_own_encoding():
+    # A static file sent uncompressed to a zstd-only client keeps the ETag its 304s match
+    static = [(b"etag", b'"abc"'), (b"vary", b"Accept-Encoding")]
+    headers, body = call(respond(static), b"zstd")
+    assert body == BODY
+    assert (b"etag", b'"abc"') in headers
+    assert not any(name == b"content-encoding" for name, _ in headers)
@@ -0,0 +1,145 @@
+"""Tests for the quantile sketch and the incremental dwell/leg statistics"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dwell import DwellAnalytics, QuantileSketch
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(mean=2.0, sigma=1.2, size=50_000)
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.add(values)
+    for q in (0.01, 0.25, 0.5, 0.9, 0.99, 0.999):
+        exact = np.quantile(values, q, method="lower")
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+    assert sketch.count == len(values)
+    assert sketch.min == values.min() and sketch.max == values.max()
+
+
+def test_merge_matches_adding_everything_to_one_sketch():
+    rng = np.random.default_rng(3)
+    first, second = rng.exponential(5, 1000), rng.exponential(50, 1000)
+    merged = QuantileSketch()
+    merged.add(first)
+    other = QuantileSketch()
+    other.add(second)
+    merged.merge(other)
+    single = QuantileSketch()
+    single.add(np.concatenate([first, second]))
+    assert merged.buckets == single.buckets
+    assert merged.summary() == single.summary()
+
+
+def test_zero_and_tiny_values_count_as_zero():
+    sketch = QuantileSketch()
+    sketch.add([0.0, 0.0005, 0.0, 4.0])
+    assert sketch.zero_count == 3
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(4.0, rel=0.01)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_collapse_keeps_the_bucket_limit_and_the_high_quantiles():
+    values = np.geomspace(0.01, 10_000, 5_000)
+    sketch = QuantileSketch(relative_accuracy=0.01, max_buckets=64)
+    sketch.add(values)
+    assert len(sketch.buckets) <= 64
+    assert sum(sketch.buckets.values()) + sketch.zero_count == sketch.count
+    # Only the lowest buckets are merged: the quantiles above them keep their accuracy
+    for q in (0.99, 0.999):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(values, q, method="lower"), rel=0.01)
+    # Values in the collapsed buckets are reported high, never low
+    for q in (0.0, 0.5, 0.9):
+        assert sketch.quantile(q) >= np.quantile(values, q, method="lower")
+
+
+def test_collapse_merges_the_lowest_buckets_into_one():
+    sketch = QuantileSketch(max_buckets=3)
+    sketch.buckets = {1: 1, 2: 2, 3: 3, 4: 4, 5: 5}
+    sketch._collapse()
+    assert sketch.buckets == {3: 6, 4: 4, 5: 5}
+
+
+def events(rows):
+    """Batch events from (record_id, batch, event, time, entity type, entity name) tuples"""
+    return pd.DataFrame(rows, columns=[
+        "record_id", "batch_id", "event", "event_time_cst", "entity_involved", "entity_name"
+    ]).assign(event_time_cst=lambda df: pd.to_datetime(df["event_time_cst"]))
+
+
+JOURNEY = [
+    (1, "B1", "Shipped", "2026-10-01 00:00", "Supplier", "Acme"),
+    (2, "B2", "Shipped", "2026-10-01 00:00", "Supplier", "Acme"),
+    (3, "B1", "At Dock", "2026-10-01 10:00", "Port", "Houston"),
+    (4, "B1", "In Transit to DC", "2026-10-01 14:00", "Port", "Houston"),
+    (5, "B2", "At Dock", "2026-10-01 20:00", "Port", "Houston"),
+    (6, "B1", "At DC", "2026-10-02 02:00", "DC", "Dallas"),
+    (7, "B1", "Delivered", "2026-10-02 08:00", "Customer", "Store 9"),
+]
+
+
+def stats(analytics, group):
+    return {tuple(v for k, v in row.items() if k in ("entity_name", "from_entity", "to_entity")): row
+            for row in analytics.summary()[group]}
+
+
+def test_single_ingest_splits_dwells_and_legs():
+    analytics = DwellAnalytics()
+    assert analytics.ingest(events(JOURNEY)) == 5
+    dwells = stats(analytics, "entities")
+    assert dwells[("Houston",)]["count"] == 1
+    assert dwells[("Houston",)]["p50_hours"] == pytest.approx(4.0, rel=0.01)
+    legs = stats(analytics, "legs")
+    assert legs[("Acme", "Houston")]["count"] == 2
+    assert legs[("Acme", "Houston")]["max_hours"] == 20.0
+    assert legs[("Houston", "Dallas")]["p50_hours"] == pytest.approx(12.0, rel=0.01)
+    assert legs[("Dallas", "Store 9")]["count"] == 1
+    # B1 was delivered; B2 waits at the port for its next event
+    assert analytics.summary()["batches_in_progress"] == 1
+    assert analytics.last_record_id == 7
+
+
+def test_predecessor_is_carried_across_chunks():
+    whole = DwellAnalytics()
+    whole.ingest(events(JOURNEY))
+    chunked = DwellAnalytics()
+    for start in range(0, len(JOURNEY), 2):
+        chunked.ingest(events(JOURNEY[start:start + 2]))
+    assert chunked.intervals == whole.intervals == 5
+    for group in ("entities", "entity_types", "legs", "leg_types"):
+        assert chunked.summary()[group] == whole.summary()[group]
+    assert chunked.events_consumed == len(JOURNEY)
+    assert chunked.version == whole.version
+
+
+def test_events_within_a_chunk_are_ordered_by_time():
+    shuffled = DwellAnalytics()
+    shuffled.ingest(events(list(reversed(JOURNEY))))
+    ordered = DwellAnalytics()
+    ordered.ingest(events(JOURNEY))
+    assert shuffled.summary()["legs"] == ordered.summary()["legs"]
+    assert shuffled.out_of_order == 0
+
+
+def test_late_event_older_than_the_latest_is_counted_not_paired():
+    analytics = DwellAnalytics()
+    analytics.ingest(events(JOURNEY[:4]))
+    before = analytics.intervals
+    # Arrives in a later chunk but happened before B1's latest event (14:00)
+    analytics.ingest(events([(8, "B1", "At Dock", "2026-10-01 12:00", "Port", "Houston")]))
+    assert analytics.out_of_order == 1
+    assert analytics.intervals == before
+    # The batch's latest event is still the 14:00 one
+    analytics.ingest(events([(9, "B1", "At DC", "2026-10-02 02:00", "DC", "Dallas")]))
+    assert stats(analytics, "legs")[("Houston", "Dallas")]["p50_hours"] == pytest.approx(12.0, rel=0.01)
+
+
+def test_empty_chunk_updates_only_the_timestamp():
+    analytics = DwellAnalytics()
+    assert analytics.ingest(None) == 0
+    assert analytics.ingest(events([])) == 0
+    assert analytics.updated_at is not None
+    assert analytics.version == "-1:0"
@@ -0,0 +1,139 @@
+"""Tests for the Parquet history store and its rollups"""
+
+from datetime import date, datetime
+import shutil
+
+import pandas as pd
+import pytest
+
+from history import METRICS, HistoryStore, last_months, summary_point
+
+
+def point(**values):
+    """A summary point with every metric 0 except the given ones"""
+    return {metric: values.get(metric, 0) for metric in METRICS}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(tmp_path / "history")
+
+
+def test_append_writes_a_day_partition_and_its_rollups(store):
+    assert store.append(point(units=10), datetime(2026, 10, 1, 8, 0))
+    assert store.append(point(units=30), datetime(2026, 10, 1, 20, 0))
+    assert store.append(point(units=50), datetime(2026, 10, 2, 8, 0))
+
+    partition = store.raw_directory / "date=2026-10-01" / "points.parquet"
+    assert len(pd.read_parquet(partition)) == 2
+    daily = store.rollups("daily").set_index("period")
+    assert list(daily.index) == ["2026-10-01", "2026-10-02"]
+    assert daily.loc["2026-10-01", "snapshots"] == 2
+    assert daily.loc["2026-10-01", "units_mean"] == 20
+    assert daily.loc["2026-10-01", "units_min"] == 10
+    assert daily.loc["2026-10-01", "units_last"] == 30
+    assert store.status()["last_snapshot_at"] == "2026-10-02T08:00:00"
+
+
+def test_points_arriving_out_of_order_are_sorted(store):
+    store.append(point(units=30), datetime(2026, 10, 1, 20, 0))
+    store.append(point(units=10), datetime(2026, 10, 1, 8, 0))
+    daily = store.rollups("daily").iloc[0]
+    assert daily["units_last"] == 30
+    assert daily["first_at"] == pd.Timestamp("2026-10-01 08:00")
+
+
+def test_min_interval_skips_points_another_worker_recorded(store):
+    assert store.append(point(), datetime(2026, 10, 1, 8, 0), min_interval_seconds=150)
+    assert not store.append(point(), datetime(2026, 10, 1, 8, 2), min_interval_seconds=150)
+    assert store.append(point(), datetime(2026, 10, 1, 8, 3), min_interval_seconds=150)
+    assert store.rollups("daily").iloc[0]["snapshots"] == 2
+
+
+def test_reappending_a_day_upserts_its_rollups(store):
+    store.append(point(units=10), datetime(2026, 10, 1, 8, 0))
+    store.append(point(units=20), datetime(2026, 10, 1, 9, 0))
+    assert len(store.rollups("daily")) == 1
+    assert len(store.rollups("monthly")) == 1
+    assert store.rollups("monthly").iloc[0]["snapshots"] == 2
+
+
+def test_monthly_means_are_weighted_by_snapshots(store):
+    # Day 1: three points averaging 10; day 2: one point of 50
+    for hour, units in ((1, 0), (2, 10), (3, 20)):
+        store.append(point(units=units), datetime(2026, 10, 1, hour))
+    store.append(point(units=50), datetime(2026, 10, 2, 1))
+    store.append(point(units=99), datetime(2026, 11, 1, 1))
+
+    monthly = store.rollups("monthly").set_index("period")
+    october = monthly.loc["2026-10"]
+    assert october["snapshots"] == 4
+    assert october["units_mean"] == pytest.approx((0 + 10 + 20 + 50) / 4)
+    assert october["units_min"] == 0
+    assert october["units_max"] == 50
+    assert october["units_last"] == 50
+    assert store.monthly_values(["2026-09", "2026-10", "2026-11"], "units") == {
+        "2026-10": pytest.approx(20.0), "2026-11": 99.0
+    }
+
+
+def test_rebuild_recomputes_missing_rollups_from_raw_points(tmp_path):
+    directory = tmp_path / "history"
+    original = HistoryStore(directory)
+    for day, units in ((1, 10), (2, 20), (2, 40)):
+        original.append(point(units=units), datetime(2026, 10, day, 8 + units // 10))
+    expected_daily = original.rollups("daily")
+    expected_monthly = original.rollups("monthly")
+
+    shutil.rmtree(directory / "rollups")
+    rebuilt = HistoryStore(directory)
+    pd.testing.assert_frame_equal(rebuilt.rollups("daily"), expected_daily, check_dtype=False)
+    pd.testing.assert_frame_equal(rebuilt.rollups("monthly"), expected_monthly, check_dtype=False)
+
+
+def test_another_workers_append_is_seen(tmp_path):
+    first, second = HistoryStore(tmp_path / "history"), HistoryStore(tmp_path / "history")
+    first.append(point(units=10), datetime(2026, 10, 1, 8))
+    assert second.monthly_values(["2026-10"], "units") == {"2026-10": 10.0}
+    second.append(point(units=30), datetime(2026, 10, 1, 9))
+    assert first.monthly_values(["2026-10"], "units") == {"2026-10": 20.0}
+
+
+def test_old_raw_partitions_are_pruned_but_rollups_kept(tmp_path):
+    store = HistoryStore(tmp_path / "history", raw_retention_days=30)
+    store.append(point(units=5), datetime(2026, 8, 1, 8))
+    store.append(point(units=7), datetime(2026, 10, 1, 8))
+    assert [path.name for path in store.raw_directory.iterdir()] == ["date=2026-10-01"]
+    assert list(store.rollups("monthly")["period"]) == ["2026-08", "2026-10"]
+
+
+def test_summary_point_counts_categories_delays_and_risk():
+    df = pd.DataFrame({
+        "qty": [10, 20, 30, 40],
+        "unit_price": [1.0, 2.0, 3.0, 4.0],
+        "status_category": ["In Transit", "In Transit", "At DC", "Delivered"],
+        "transit_status": ["Delayed", "On Time", "Delayed", "Delayed"],
+        "at_risk_of_delay": [False, True, False, False],
+    })
+    result = summary_point(df)
+    assert result["shipments"] == 4
+    assert result["value"] == 300.0
+    assert result["in_transit"] == 2 and result["delivered"] == 1
+    assert result["active_units"] == 60
+    # Delivered rows are neither delayed nor at risk any more
+    assert result["delayed_shipments"] == 2
+    assert result["at_risk_shipments"] == 1
+    assert result["on_time_pct"] == 0.0
+
+
+def test_summary_point_counts_any_delay_status():
+    df = pd.DataFrame({
+        "qty": [1, 1, 1, 1],
+        "status_category": ["In Transit"] * 4,
+        "transit_status": ["Delayed - Weather", "delayed", "On Time", None],
+    })
+    assert summary_point(df)["delayed_shipments"] == 2
+
+
+def test_last_months_spans_year_boundaries():
+    assert last_months(3, date(2026, 2, 15)) == [("2025-12", "Dec"), ("2026-01", "Jan"), ("2026-02", "Feb")]
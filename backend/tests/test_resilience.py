@@ -0,0 +1,94 @@
+"""Tests for the warehouse circuit breaker"""
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_stays_closed_below_the_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    # A success resets the count of consecutive failures
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.failures == 1
+
+
+def test_opens_after_consecutive_failures_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    open_breaker(breaker)
+    assert breaker.state == "open"
+    assert breaker.times_opened == 1
+    clock[0] += 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == pytest.approx(20)
+    assert breaker.status()["retry_after_s"] == pytest.approx(20)
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Everyone else still fails fast while the trial runs
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_trial_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock[0] += 31
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_for_another_period(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock[0] += 31
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    clock[0] += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock[0] += 1
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+
+def test_released_trial_lets_the_next_call_try(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=5)
+    open_breaker(breaker)
+    clock[0] += 5
+    breaker.before_call()
+    # Cancelled by a client disconnect: says nothing about the warehouse
+    breaker.release()
+    assert breaker.state == "half_open"
+    breaker.before_call()
@@ -46,7 +46,8 @@ mkdir -p "$DEPLOY_FRONTEND"
 
 # Copy backend files
 echo -e "${GREEN}Copying backend files...${NC}"
-cp "$BACKEND_SRC/main.py" "$DEPLOY_BACKEND/"
+cp "$BACKEND_SRC/"*.py "$DEPLOY_BACKEND/"
+cp "$BACKEND_SRC/metrics.yaml" "$DEPLOY_BACKEND/"
 cp "$BACKEND_SRC/requirements.txt" "$DEPLOY_BACKEND/"
 cp "$BACKEND_SRC/.env.example" "$DEPLOY_BACKEND/"
 
@@ -104,7 +105,14 @@ env_variables:
   DATABRICKS_CATALOG: "$DB_CATALOG"
   DATABRICKS_SCHEMA: "$DB_SCHEMA"
 
+inbound_services:
+  - warmup
+
 handlers:
+  # Warmup requests return once the startup cache warm-up has finished
+  - url: /_ah/warmup
+    script: auto
+
   # Serve static frontend files
   - url: /
     static_files: frontend/index.html
@@ -132,7 +140,8 @@ echo -e "Directory structure:"
 echo -e "  ${DEPLOY_DIR}/"
 echo -e "    ├── app.yaml"
 echo -e "    ├── backend/"
-echo -e "    │   ├── main.py"
+echo -e "    │   ├── *.py"
+echo -e "    │   ├── metrics.yaml"
 echo -e "    │   ├── requirements.txt"
 echo -e "    │   └── .env"
 if [ "$SKIP_FRONTEND" != true ]; then
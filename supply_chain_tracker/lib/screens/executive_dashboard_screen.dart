@@ -443,11 +443,16 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
   Widget _buildDemandForecasting(Map<String, dynamic> forecastData) {
     final chartData = forecastData['chart_data'] as List<dynamic>? ?? [];
 
-    // Transform data for fl_chart
+    // Transform data for fl_chart; units in the pipeline per month, null without history
     final chartDataList = chartData.map((item) => {
       'month': item['month']?.toString() ?? '',
-      'value': (item['value'] ?? 0).toDouble(),
+      'value': (item['value'] as num?)?.toDouble(),
     }).toList();
+    // Scale the axis to the data with five grid lines
+    final chartValues = chartDataList.map((e) => e['value'] as double?).whereType<double>();
+    final chartPeak = chartValues.isEmpty ? 0.0 : chartValues.reduce((a, b) => a > b ? a : b);
+    final chartMaxY = chartPeak > 0 ? chartPeak * 1.2 : 100.0;
+    final chartInterval = chartMaxY / 5;
 
     return ShadCard(
       padding: const EdgeInsets.all(20),
@@ -535,7 +540,7 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
                     gridData: FlGridData(
                       show: true,
                       drawVerticalLine: false,
-                      horizontalInterval: 20,
+                      horizontalInterval: chartInterval,
                       getDrawingHorizontalLine: (value) {
                         return FlLine(
                           color: gridColor,
@@ -577,10 +582,10 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
                         sideTitles: SideTitles(
                           showTitles: true,
                           reservedSize: 40,
-                          interval: 20,
+                          interval: chartInterval,
                           getTitlesWidget: (double value, TitleMeta meta) {
                             return Text(
-                              value.toInt().toString(),
+                              value >= 1000 ? '${(value / 1000).toStringAsFixed(0)}k' : value.toInt().toString(),
                               style: TextStyle(
                                 color: textColor,
                                 fontSize: 12,
@@ -594,14 +599,14 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
                     minX: 0,
                     maxX: (chartDataList.length - 1).toDouble(),
                     minY: 0,
-                    maxY: 100,
+                    maxY: chartMaxY,
                     lineBarsData: [
                       LineChartBarData(
                         spots: chartDataList.asMap().entries.map((entry) {
-                          return FlSpot(
-                            entry.key.toDouble(),
-                            entry.value['value'] as double,
-                          );
+                          final value = entry.value['value'] as double?;
+                          // Gap in the line for months without history
+                          if (value == null) return FlSpot.nullSpot;
+                          return FlSpot(entry.key.toDouble(), value);
                         }).toList(),
                         isCurved: true,
                         color: const Color(0xFF3B82F6),
@@ -1422,15 +1427,15 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
     final expeditedChartData = expeditedDelayed['chart_data'] as List<dynamic>? ?? [];
     final otifChartData = otifOverTime['chart_data'] as List<dynamic>? ?? [];
 
-    // Transform data for fl_chart
+    // Transform data for fl_chart; months without history have a null value
     final expeditedDataList = expeditedChartData.map((item) => {
       'month': item['month']?.toString() ?? '',
-      'value': (item['value'] ?? 0).toDouble(),
+      'value': (item['value'] as num?)?.toDouble(),
     }).toList();
 
     final otifDataList = otifChartData.map((item) => {
       'month': item['month']?.toString() ?? '',
-      'value': (item['value'] ?? 0).toDouble(),
+      'value': (item['value'] as num?)?.toDouble(),
     }).toList();
 
     return ShadCard(
@@ -1552,10 +1557,10 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
                               lineBarsData: [
                                 LineChartBarData(
                                   spots: expeditedDataList.asMap().entries.map((entry) {
-                                    return FlSpot(
-                                      entry.key.toDouble(),
-                                      entry.value['value'] as double,
-                                    );
+                                    final value = entry.value['value'] as double?;
+                                    // Gap in the line for months without history
+                                    if (value == null) return FlSpot.nullSpot;
+                                    return FlSpot(entry.key.toDouble(), value);
                                   }).toList(),
                                   isCurved: true,
                                   color: const Color(0xFFF97316),
@@ -1684,10 +1689,10 @@ class _ExecutiveDashboardScreenState extends ConsumerState<ExecutiveDashboardScr
                               lineBarsData: [
                                 LineChartBarData(
                                   spots: otifDataList.asMap().entries.map((entry) {
-                                    return FlSpot(
-                                      entry.key.toDouble(),
-                                      entry.value['value'] as double,
-                                    );
+                                    final value = entry.value['value'] as double?;
+                                    // Gap in the line for months without history
+                                    if (value == null) return FlSpot.nullSpot;
+                                    return FlSpot(entry.key.toDouble(), value);
                                   }).toList(),
                                   isCurved: true,
                                   color: const Color(0xFF10B981),
@@ -45,6 +45,9 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
   final TextEditingController _textController = TextEditingController();
   bool _isLoading = false;
 
+  // Server-side chat session; only the new message is sent on each turn
+  String? _sessionId;
+
   // Animation state
   bool _isExpanded = false;
   late AnimationController _animationController;
@@ -111,6 +114,7 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
 
   @override
   void dispose() {
+    _deleteSession();
     _animationController.dispose();
     _textController.dispose();
     super.dispose();
@@ -128,15 +132,52 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
     }
   }
 
-  /// Get the API endpoint URL based on context
-  String get _chatApiEndpoint {
-    switch (widget.context) {
-      case ChatContext.executiveDashboard:
-        return '${ApiService.baseUrl}/api/chat/executive-dashboard/stream';
-      case ChatContext.realtimeSnapshot:
-        return '${ApiService.baseUrl}/api/chat/realtime-snapshot/stream';
-      case ChatContext.shipmentTracking:
-        return '${ApiService.baseUrl}/api/chat/shipment-tracking/stream';
+  /// Create a server-side chat session for this widget's context
+  Future<String> _createSession() async {
+    final response = await http.post(
+      Uri.parse('${ApiService.baseUrl}/api/chat/sessions'),
+      headers: {'Content-Type': 'application/json'},
+      body: json.encode({
+        'context': widget.context.name,
+        if (widget.context == ChatContext.shipmentTracking &&
+            widget.selectedBatchId != null)
+          'selected_batch_id': widget.selectedBatchId,
+      }),
+    );
+    if (response.statusCode != 200) {
+      throw Exception('Failed to create chat session');
+    }
+    return json.decode(response.body)['session_id'] as String;
+  }
+
+  /// Post the new user message to the session and return the SSE response
+  Future<http.StreamedResponse> _postSessionMessage(String userMessage) async {
+    _sessionId ??= await _createSession();
+
+    final request = http.Request(
+      'POST',
+      Uri.parse('${ApiService.baseUrl}/api/chat/sessions/$_sessionId/messages'),
+    );
+    request.headers['Content-Type'] = 'application/json';
+
+    // Include selected_batch_id so the session follows the batch in focus
+    final Map<String, dynamic> requestBody = {'content': userMessage};
+    if (widget.context == ChatContext.shipmentTracking) {
+      requestBody['selected_batch_id'] = widget.selectedBatchId ?? '';
+    }
+    request.body = json.encode(requestBody);
+
+    return request.send();
+  }
+
+  /// Delete the server-side session (fire and forget)
+  void _deleteSession() {
+    final sessionId = _sessionId;
+    _sessionId = null;
+    if (sessionId != null) {
+      http
+          .delete(Uri.parse('${ApiService.baseUrl}/api/chat/sessions/$sessionId'))
+          .catchError((_) => http.Response('', 500));
     }
   }
 
@@ -171,34 +212,14 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
     });
 
     try {
-      // Build conversation history for context
-      final conversationMessages = _messages.reversed
-          .where((msg) => msg.id != messageId)
-          .map((msg) {
-        return {
-          'role': msg.author.id == _user.id ? 'user' : 'assistant',
-          'content': (msg as types.TextMessage).text,
-        };
-      }).toList();
-
-      // Make streaming API call
-      final request = http.Request(
-        'POST',
-        Uri.parse(_chatApiEndpoint),
-      );
-      request.headers['Content-Type'] = 'application/json';
-
-      // Build request body - include selected_batch_id for shipment tracking context
-      final Map<String, dynamic> requestBody = {
-        'messages': conversationMessages,
-      };
-      if (widget.context == ChatContext.shipmentTracking &&
-          widget.selectedBatchId != null) {
-        requestBody['selected_batch_id'] = widget.selectedBatchId;
-      }
-      request.body = json.encode(requestBody);
+      // Make streaming API call; the server keeps the conversation history
+      var streamedResponse = await _postSessionMessage(userMessage);
 
-      final streamedResponse = await request.send();
+      // Session expired or was evicted - start a new one and retry once
+      if (streamedResponse.statusCode == 404) {
+        _sessionId = null;
+        streamedResponse = await _postSessionMessage(userMessage);
+      }
 
       if (!mounted) return;
 
@@ -226,6 +247,10 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
                 } else if (data['error'] != null) {
                   _handleError(messageId, data['error']);
                   return;
+                } else if (data['queued'] == true) {
+                  // Waiting for a free upstream slot
+                  _updateStreamingMessage(
+                      messageId, 'Waiting in queue (position ${data['position']})...');
                 } else if (data['content'] != null) {
                   accumulatedText += data['content'];
                   _updateStreamingMessage(messageId, accumulatedText);
@@ -240,6 +265,10 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
         setState(() {
           _isLoading = false;
         });
+      } else if (streamedResponse.statusCode == 429) {
+        final retryAfter = streamedResponse.headers['retry-after'] ?? '5';
+        _handleError(messageId,
+            'The assistant is busy right now. Please try again in $retryAfter seconds.');
       } else {
         _handleError(messageId, 'Server error: ${streamedResponse.statusCode}');
       }
@@ -281,6 +310,7 @@ class _FloatingChatWidgetState extends State<FloatingChatWidget>
   }
 
   void _clearChat() {
+    _deleteSession();
     setState(() {
       _messages.clear();
     });